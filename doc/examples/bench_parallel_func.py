@@ -0,0 +1,14 @@
+#!/usr/bin/env python3
+import pyperf
+
+
+def func():
+    # CPU-bound workload
+    total = 0
+    for i in range(10_000):
+        total += i * i
+    return total
+
+
+runner = pyperf.Runner()
+runner.bench_parallel_func('sum_squares', func)
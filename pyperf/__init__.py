@@ -16,5 +16,11 @@ __all__.append('format_metadata')
 from pyperf._bench import Run, Benchmark, BenchmarkSuite, add_runs  # noqa
 __all__.extend(('Run', 'Benchmark', 'BenchmarkSuite', 'add_runs'))
 
+from pyperf._group import BenchmarkGroup  # noqa
+__all__.append('BenchmarkGroup')
+
+from pyperf._latency import LatencyHistogram  # noqa
+__all__.append('LatencyHistogram')
+
 from pyperf._runner import Runner   # noqa
 __all__.append('Runner')
@@ -12,12 +12,17 @@ from pyperf._cli import (format_metadata, empty_line,
                          catch_broken_pipe_error)
 from pyperf._formatter import format_timedelta, format_seconds, format_datetime
 from pyperf._cpu_utils import parse_cpu_list
+from pyperf._runner import strictly_positive, positive_or_nul, comma_separated
 from pyperf._timeit_cli import TimeitRunner
 from pyperf._utils import parse_run_list
 
 
 def add_cmdline_args(cmd, args):
     cmd.extend(('--name', args.name))
+    if args.cache:
+        cmd.extend(('--cache', args.cache))
+    for path in args.cache_files:
+        cmd.extend(('--cache-file', path))
     cmd.append(args.program)
     if args.program_args:
         cmd.extend(args.program_args)
@@ -35,6 +40,15 @@ class CommandRunner(pyperf.Runner):
 
         cmd.add_argument('--name', type=parse_name, default='command',
                          help='Benchmark name (default: command)')
+        cmd.add_argument('--cache', choices=('warm', 'cold'),
+                         help='Page cache state of input files before each '
+                              'value: warm (read files) or cold (evict files '
+                              'from the page cache)')
+        cmd.add_argument('--cache-file', metavar='PATH', dest='cache_files',
+                         action='append', default=[],
+                         help='Input file or directory of the command, '
+                              'used by --cache. Can be specified multiple '
+                              'times.')
         cmd.add_argument('program',
                          help='Program path')
         cmd.add_argument('program_args', nargs=argparse.REMAINDER,
@@ -46,13 +60,17 @@ def create_parser():
                                      prog='-m pyperf')
     subparsers = parser.add_subparsers(dest='action')
 
-    def input_filenames(cmd, name=True):
+    def input_filenames(cmd, name=True, nargs='+'):
         if name:
             cmd.add_argument('-b', '--benchmark', metavar='NAME',
                              dest='benchmarks', action='append',
                              help='only display the benchmark called NAME')
+        cmd.add_argument('-j', '--jobs', type=positive_or_nul, default=1,
+                         help='Number of processes used to load files '
+                              'in parallel, 0 means the number of CPUs '
+                              '(default: 1)')
         cmd.add_argument('filenames', metavar='file.json',
-                         type=str, nargs='+',
+                         type=str, nargs=nargs,
                          help='Benchmark file')
 
     def display_options(cmd):
@@ -94,6 +112,9 @@ def create_parser():
     cmd.add_argument('-n', '--bins', type=int, default=None,
                      help='Number of histogram bars (default: 25, or less '
                           'depeding on the terminal size)')
+    cmd.add_argument('--latency', action="store_true",
+                     help='Render the histogram of the latency of each call '
+                          '(benchmarks run with --latency)')
     display_options(cmd)
 
     # compare_to
@@ -108,13 +129,49 @@ def create_parser():
                      help='Absolute minimum of speed in percent to '
                           'consider that a benchmark is significant '
                           '(default: 0%%)')
+    cmd.add_argument('--test', default='bootstrap',
+                     choices=['bootstrap', 'mannwhitney', 'permutation'],
+                     help='Significance test (default: bootstrap)')
+    cmd.add_argument('--correction', choices=['holm', 'bh'],
+                     help='Correct p-values for multiple comparisons: '
+                          'Holm-Bonferroni (holm) or Benjamini-Hochberg '
+                          '(bh) (default: no correction)')
     cmd.add_argument('--table', action="store_true",
                      help='Render a table')
+    cmd.add_argument('--matrix', action="store_true",
+                     help='Compare all pairs of files: render a matrix '
+                          'per benchmark and rank files by speed')
+    cmd.add_argument('--normalize-host', action="store_true",
+                     help='Normalize results to the host of the first file '
+                          'using the host_calibration metadata')
+    cmd.add_argument('--by-host', action="store_true",
+                     help='Compare results collected on multiple hosts: '
+                          'each file argument is a comma-separated list '
+                          'of files, benchmarks are only compared on hosts '
+                          'in common')
     cmd.add_argument("--table-format", type=str, default="rest",
                      choices=["rest", "md"],
                      help="Format of table rendering")
     input_filenames(cmd)
 
+    # check-budget
+    cmd = subparsers.add_parser('check-budget',
+                                help='Check that benchmarks respect a '
+                                     'performance budget')
+    cmd.add_argument('--budget', required=True, metavar='FILENAME',
+                     help='Budget file (TOML or JSON)')
+    cmd.add_argument('-o', '--output', metavar='FILENAME',
+                     help='Write the JSON report into FILENAME '
+                          '(default: write into stdout)')
+    cmd.add_argument('--test', default='bootstrap',
+                     choices=['bootstrap', 'mannwhitney', 'permutation'],
+                     help='Significance test (default: bootstrap)')
+    cmd.add_argument('--correction', choices=['holm', 'bh'],
+                     help='Correct p-values for multiple comparisons: '
+                          'Holm-Bonferroni (holm) or Benjamini-Hochberg '
+                          '(bh) (default: no correction)')
+    input_filenames(cmd, nargs=2)
+
     # stats
     cmd = subparsers.add_parser('stats', help='Compute statistics')
     display_options(cmd)
@@ -179,6 +236,85 @@ def create_parser():
                      help='Update metadata: METADATA is a comma-separated '
                           'list of KEY=VALUE')
 
+    # compact
+    cmd = subparsers.add_parser('compact',
+                                help='Fold a results log into a single '
+                                     'benchmark suite')
+    cmd.add_argument('-o', '--output', metavar='OUTPUT_FILENAME',
+                     help='Filename where the benchmark suite is written '
+                          '(default: rewrite the log in place)')
+    cmd.add_argument('filename', help='Results log (.jsonl file)')
+
+    # merge
+    cmd = subparsers.add_parser('merge',
+                                help='Merge the results of shards '
+                                     '(Runner --shard option)')
+    cmd.add_argument('-o', '--output', required=True,
+                     metavar='OUTPUT_FILENAME',
+                     help='Filename where the merged benchmark suite '
+                          'is written')
+    cmd.add_argument('filenames', metavar='file.json', nargs='+',
+                     help='Benchmark file of a shard')
+
+    # validate
+    cmd = subparsers.add_parser('validate',
+                                help='Check that benchmark files are valid')
+    cmd.add_argument('filenames', metavar='file.json', nargs='+',
+                     help='Benchmark file')
+
+    # ingest
+    cmd = subparsers.add_parser('ingest',
+                                help='Store benchmark results into a history '
+                                     'database')
+    cmd.add_argument('--db', required=True, metavar='FILENAME',
+                     help='SQLite database of the history (created if it '
+                          'doesn\'t exist)')
+    cmd.add_argument('filenames', metavar='file.json', nargs='+',
+                     help='Benchmark file')
+
+    # history
+    cmd = subparsers.add_parser('history',
+                                help='Display the history of a benchmark')
+    cmd.add_argument('--db', required=True, metavar='FILENAME',
+                     help='SQLite database of the history')
+    cmd.add_argument('--metadata', metavar='METADATA',
+                     help='Only display results with these metadata: '
+                          'METADATA is a comma-separated list of KEY=VALUE')
+    cmd.add_argument('--normalize-host', action="store_true",
+                     help='Normalize results to the host of the most recent '
+                          'result using the host_calibration metadata')
+    cmd.add_argument('name', help='Benchmark name')
+
+    # calibrate-host
+    cmd = subparsers.add_parser('calibrate-host',
+                                help='Measure the speed of the host with '
+                                     'a reference workload')
+    cmd.add_argument('--force', action="store_true",
+                     help='Measure the speed even if it is cached')
+
+    # regressions
+    cmd = subparsers.add_parser('regressions',
+                                help='Detect step changes in a time-ordered '
+                                     'series of results')
+    cmd.add_argument('--db', metavar='FILENAME',
+                     help='Read the series from a history database '
+                          'rather than from files')
+    cmd.add_argument('--metadata', metavar='METADATA',
+                     help='Only use results of the history database with '
+                          'these metadata: METADATA is a comma-separated '
+                          'list of KEY=VALUE')
+    cmd.add_argument('--permutations', type=strictly_positive,
+                     default=1000,
+                     help='Number of random permutations used to compute '
+                          'the confidence of a change (default: 1000)')
+    cmd.add_argument('--confidence', type=float, default=95.0,
+                     help='Minimum confidence in percent to report a '
+                          'change (default: 95%%)')
+    cmd.add_argument('--min-speed', type=float,
+                     help='Absolute minimum of speed change in percent to '
+                          'report a change (default: 0%%)')
+    input_filenames(cmd, nargs='*')
+
     # dump
     cmd = subparsers.add_parser('dump', help='Dump the runs')
     cmd.add_argument('-v', '--verbose', action='store_true',
@@ -195,6 +331,54 @@ def create_parser():
                      help='Number of slow benchmarks to display (default: 5)')
     input_filenames(cmd, name=False)
 
+    # scaling
+    cmd = subparsers.add_parser('scaling',
+                                help='Fit the complexity of parametrized '
+                                     'benchmarks')
+    cmd.add_argument('--param', metavar='NAME',
+                     help='Name of the size parameter (default: the only '
+                          'numeric parameter)')
+    cmd.add_argument('--threshold', type=float, default=0.5,
+                     help='Minimum change of the fitted exponent to flag '
+                          'a complexity change (default: 0.5)')
+    input_filenames(cmd)
+
+    # importtime
+    cmd = subparsers.add_parser('importtime',
+                                help='Benchmark the import time of modules')
+    cmd.add_argument('-p', '--processes', type=strictly_positive, default=20,
+                     help='number of processes used to run benchmarks '
+                          '(default: 20)')
+    cmd.add_argument('-n', '--values', type=strictly_positive, default=3,
+                     help='number of values per process (default: 3)')
+    cmd.add_argument('-w', '--warmups', type=positive_or_nul, default=1,
+                     help='number of skipped values per process used '
+                          'to warmup the benchmark (default: 1)')
+    cmd.add_argument('--cumulative', action='store_true',
+                     help='Use the cumulative import time, including '
+                          'sub-imports, rather than the self time')
+    cmd.add_argument('--python', default=sys.executable,
+                     help='Python executable (default: use running Python, '
+                          'sys.executable)')
+    cmd.add_argument('-o', '--output', metavar='FILENAME',
+                     help='write results encoded to JSON into FILENAME')
+    cmd.add_argument('--append', metavar='FILENAME',
+                     help='append results encoded to JSON into FILENAME')
+    cmd.add_argument('--inherit-environ', metavar='VARS',
+                     type=comma_separated,
+                     help='Comma-separated list of environment variables '
+                          'inherited by child processes.')
+    cmd.add_argument('--copy-env', dest='copy_env', action='store_true',
+                     help='Copy all environment variables')
+    cmd.add_argument('--no-locale', dest='locale', action='store_false',
+                     default=True,
+                     help="Don't copy locale environment variables "
+                          "like LANG or LC_CTYPE.")
+    cmd.add_argument('-q', '--quiet', action='store_true',
+                     help='enable quiet mode')
+    cmd.add_argument('modules', metavar='MODULE', nargs='+',
+                     help='Imported modules')
+
     # command
     cmd = subparsers.add_parser('command',
                                 help='Benchmark a command')
@@ -248,13 +432,41 @@ class Benchmarks:
     def __init__(self):
         self.suites = []
 
-    def load_benchmark_suite(self, filename):
-        suite = pyperf.BenchmarkSuite.load(filename)
+    def load_benchmark_suite(self, filename, names=None):
+        # names: only load these benchmarks
+        try:
+            suite = pyperf.BenchmarkSuite.load(filename, names, trusted=True)
+        except KeyError:
+            if names is None:
+                raise
+            fatal_missing_benchmarks(filename, names)
         self.suites.append(suite)
 
-    def load_benchmark_suites(self, filenames):
-        for filename in filenames:
-            self.load_benchmark_suite(filename)
+    def load_benchmark_suites(self, filenames, names=None, jobs=1):
+        if jobs == 0:
+            jobs = os.cpu_count() or 1
+        jobs = min(jobs, len(filenames))
+        if jobs <= 1 or '-' in filenames:
+            for filename in filenames:
+                self.load_benchmark_suite(filename, names)
+            return
+
+        # Load and parse files in parallel in worker processes
+        from concurrent.futures import ProcessPoolExecutor
+        from pyperf._bench import _load_suite_worker, _unpack_suite
+
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(_load_suite_worker, filename, names,
+                                       True)
+                       for filename in filenames]
+            for filename, future in zip(filenames, futures):
+                try:
+                    suite = _unpack_suite(future.result())
+                except KeyError:
+                    if names is None:
+                        raise
+                    fatal_missing_benchmarks(filename, names)
+                self.suites.append(suite)
 
     def has_same_unique_benchmark(self):
         "True if all suites have one benchmark with the same name"
@@ -269,7 +481,7 @@ class Benchmarks:
             try:
                 suite._convert_include_benchmark(names)
             except KeyError:
-                fatal_missing_benchmarks(suite, names)
+                fatal_missing_benchmarks(suite.filename, names)
 
     def get_nsuite(self):
         return len(self.suites)
@@ -359,9 +571,10 @@ class Benchmarks:
 
 def load_benchmarks(args):
     data = Benchmarks()
-    data.load_benchmark_suites(args.filenames)
-    if getattr(args, 'benchmarks', None):
-        data.include_benchmarks(args.benchmarks)
+    names = getattr(args, 'benchmarks', None)
+    data.load_benchmark_suites(args.filenames, names, args.jobs)
+    if names:
+        data.include_benchmarks(names)
     return data
 
 
@@ -385,14 +598,67 @@ def _display_common_metadata(metadatas, lines):
             metadata.pop(key, None)
 
 
+def cmd_compare_by_host(args):
+    from pyperf._compare import CompareHosts, CompareError
+    from pyperf._group import group_suites
+
+    if len(args.filenames) != 2:
+        print("ERROR: --by-host requires two arguments: reference files "
+              "and changed files")
+        sys.exit(1)
+    if (args.table or args.matrix or args.group_by_speed
+       or args.normalize_host or args.test != 'bootstrap'):
+        print("ERROR: --by-host cannot be used with --table, --matrix, "
+              "--group-by-speed, --normalize-host or --test",
+              file=sys.stderr)
+        sys.exit(1)
+
+    sides = [arg.split(',') for arg in args.filenames]
+    args.filenames = sides[0] + sides[1]
+    data = load_benchmarks(args)
+    nref = len(sides[0])
+    try:
+        ref_groups = group_suites(data.suites[:nref])
+        changed_groups = group_suites(data.suites[nref:])
+    except ValueError as exc:
+        print("ERROR: %s" % exc, file=sys.stderr)
+        sys.exit(1)
+
+    format_filename = format_filename_func(data.suites)
+    names = [','.join(format_filename(suite.filename) for suite in suites)
+             for suites in (data.suites[:nref], data.suites[nref:])]
+    try:
+        CompareHosts(ref_groups, changed_groups, names, args).compare()
+    except CompareError as exc:
+        print(f"ERROR: {exc}", file=sys.stderr)
+        sys.exit(1)
+
+
 def cmd_compare_to(args):
     from pyperf._compare import compare_suites, CompareError
 
+    if args.by_host:
+        cmd_compare_by_host(args)
+        return
+
     data = load_benchmarks(args)
     if data.get_nsuite() < 2:
         print("ERROR: need at least two benchmark files")
         sys.exit(1)
 
+    if args.normalize_host:
+        from pyperf._host_calibration import normalize_suites
+        try:
+            normalize_suites(data.suites)
+        except ValueError as exc:
+            print("ERROR: %s" % exc, file=sys.stderr)
+            sys.exit(1)
+
+    if args.matrix and (args.group_by_speed or args.table):
+        print("ERROR: --matrix cannot be used with --group-by-speed "
+              "or --table", file=sys.stderr)
+        sys.exit(1)
+
     if args.group_by_speed and data.get_nsuite() != 2:
         print("ERROR: --by-speed only works on two benchmark files",
               file=sys.stderr)
@@ -405,6 +671,13 @@ def cmd_compare_to(args):
         sys.exit(1)
 
 
+def cmd_check_budget(args):
+    from pyperf._budget import cmd_check_budget
+
+    data = load_benchmarks(args)
+    cmd_check_budget(args, data)
+
+
 def cmd_collect_metadata(args):
     from pyperf._collect_metadata import cmd_collect_metadata as func
     func(args)
@@ -579,9 +852,15 @@ def cmd_hist(args):
         benchmarks = [(benchmark, filename if show_filename else None)
                       for benchmark, title, filename in benchmarks]
 
-        for line in format_histogram(benchmarks, bins=args.bins,
+        try:
+            lines = format_histogram(benchmarks, bins=args.bins,
                                      extend=args.extend,
-                                     checks=checks):
+                                     checks=checks,
+                                     latency=args.latency)
+        except ValueError as exc:
+            print("ERROR: %s" % exc)
+            sys.exit(1)
+        for line in lines:
             print(line)
 
         if not (is_last or ignored):
@@ -593,14 +872,15 @@ def cmd_hist(args):
             print("[ %s ]" % name)
             for line in format_histogram([name], bins=args.bins,
                                          extend=args.extend,
-                                         checks=checks):
+                                         checks=checks,
+                                         latency=args.latency):
                 print(line)
 
 
-def fatal_missing_benchmarks(suite, names):
+def fatal_missing_benchmarks(filename, names):
     print("ERROR: The benchmark suite %s doesn't contain "
           "with benchmark name in %r"
-          % (suite.filename, names),
+          % (filename, names),
           file=sys.stderr)
     sys.exit(1)
 
@@ -626,7 +906,7 @@ def cmd_convert(args):
         try:
             suite._convert_include_benchmark(names)
         except KeyError:
-            fatal_missing_benchmarks(suite, names)
+            fatal_missing_benchmarks(suite.filename, names)
 
     elif args.exclude_benchmarks:
         names = args.exclude_benchmarks
@@ -701,6 +981,92 @@ def cmd_convert(args):
         suite.dump(sys.stdout, compact=compact)
 
 
+def cmd_compact(args):
+    from pyperf._bench import _is_log_filename
+    from pyperf._resultlog import compact
+
+    if not _is_log_filename(args.filename):
+        print("ERROR: %s is not a results log (.jsonl file)" % args.filename)
+        sys.exit(1)
+    if args.output and os.path.exists(args.output):
+        print("ERROR: The file %r already exists" % args.output)
+        sys.exit(1)
+
+    try:
+        suite = compact(args.filename, args.output)
+    except (OSError, ValueError) as exc:
+        print("ERROR: %s" % exc)
+        sys.exit(1)
+
+    nrun = sum(bench.get_nrun() for bench in suite)
+    print("Compacted %s benchmarks (%s runs) into %s"
+          % (len(suite), nrun, args.output or args.filename))
+
+
+def cmd_validate(args):
+    # Files loaded by other commands are trusted: values and metadata
+    # are not checked. Load files with all checks.
+    ok = True
+    for filename in args.filenames:
+        try:
+            suite = pyperf.BenchmarkSuite.load(filename)
+        except (OSError, ValueError, TypeError, KeyError,
+                AttributeError) as exc:
+            print("ERROR: %s: %s" % (filename, exc))
+            ok = False
+            continue
+
+        nrun = sum(bench.get_nrun() for bench in suite)
+        print("%s: OK (%s benchmarks, %s runs)" % (filename, len(suite), nrun))
+
+    if not ok:
+        sys.exit(1)
+
+
+def cmd_ingest(args):
+    from pyperf._store import cmd_ingest
+    cmd_ingest(args)
+
+
+def cmd_history(args):
+    from pyperf._store import cmd_history
+
+    if not os.path.exists(args.db):
+        print("ERROR: The file %r doesn't exist" % args.db)
+        sys.exit(1)
+    cmd_history(args)
+
+
+def cmd_merge(args):
+    from pyperf._shard import cmd_merge
+    cmd_merge(args)
+
+
+def cmd_calibrate_host(args):
+    from pyperf._host_calibration import cmd_calibrate_host
+    cmd_calibrate_host(args)
+
+
+def cmd_regressions(args):
+    from pyperf._changepoint import cmd_regressions
+
+    if args.db:
+        if args.filenames:
+            print("ERROR: --db and filenames are mutually exclusive")
+            sys.exit(1)
+        if not os.path.exists(args.db):
+            print("ERROR: The file %r doesn't exist" % args.db)
+            sys.exit(1)
+        cmd_regressions(args)
+    else:
+        if len(args.filenames) < 2:
+            print("ERROR: regressions requires at least two files "
+                  "or --db")
+            sys.exit(1)
+        data = load_benchmarks(args)
+        cmd_regressions(args, data)
+
+
 def cmd_slowest(args):
     data = load_benchmarks(args)
     nslowest = args.n
@@ -722,6 +1088,24 @@ def cmd_slowest(args):
                   % (index, bench.get_name(), format_timedelta(duration)))
 
 
+def cmd_scaling(args):
+    from pyperf._scaling import cmd_scaling
+
+    if len(args.filenames) > 2:
+        print("ERROR: scaling requires one or two files")
+        sys.exit(1)
+
+    data = load_benchmarks(args)
+    exitcode = cmd_scaling(args, data)
+    if exitcode:
+        sys.exit(exitcode)
+
+
+def cmd_importtime(args):
+    from pyperf._importtime import cmd_importtime
+    cmd_importtime(args)
+
+
 def cmd_system(args):
     from pyperf._system import System
     System().main(args.system_action, args)
@@ -731,7 +1115,15 @@ def cmd_bench_command(runner, args):
     runner._set_args(args)
     name = args.name
     command = [args.program] + args.program_args
-    runner.bench_command(name, command)
+    if args.cache_files and not args.cache:
+        print("ERROR: --cache-file requires --cache")
+        sys.exit(1)
+    try:
+        runner.bench_command(name, command, cache=args.cache,
+                             cache_files=args.cache_files)
+    except ValueError as exc:
+        print("ERROR: %s" % exc)
+        sys.exit(1)
 
 
 def main():
@@ -742,17 +1134,27 @@ def main():
     dispatch = {
         'show': functools.partial(cmd_show, args),
         'compare_to': functools.partial(cmd_compare_to, args),
+        'check-budget': functools.partial(cmd_check_budget, args),
         'hist': functools.partial(cmd_hist, args),
+        'scaling': functools.partial(cmd_scaling, args),
         'stats': functools.partial(cmd_stats, args),
         'metadata': functools.partial(cmd_metadata, args),
         'check': functools.partial(cmd_check, args),
         'collect_metadata': functools.partial(cmd_collect_metadata, args),
         'timeit': functools.partial(cmd_timeit, args, timeit_runner),
         'convert': functools.partial(cmd_convert, args),
+        'compact': functools.partial(cmd_compact, args),
+        'merge': functools.partial(cmd_merge, args),
+        'validate': functools.partial(cmd_validate, args),
+        'ingest': functools.partial(cmd_ingest, args),
+        'history': functools.partial(cmd_history, args),
+        'calibrate-host': functools.partial(cmd_calibrate_host, args),
+        'regressions': functools.partial(cmd_regressions, args),
         'dump': functools.partial(cmd_dump, args),
         'slowest': functools.partial(cmd_slowest, args),
         'system': functools.partial(cmd_system, args),
         'command': functools.partial(cmd_bench_command, command_runner, args),
+        'importtime': functools.partial(cmd_importtime, args),
     }
 
     with catch_broken_pipe_error():
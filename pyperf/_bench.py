@@ -1,16 +1,21 @@
+import array
 import datetime
 import errno
 import math
 import os.path
 import sys
+import weakref
 
 import statistics
 
 from pyperf._metadata import (NUMBER_TYPES, parse_metadata,
                               _common_metadata, get_metadata_info,
-                              _exclude_common_metadata)
+                              _exclude_common_metadata, _shared_metadata,
+                              _trusted_metadata, _SharedMetadata)
 from pyperf._formatter import DEFAULT_UNIT, format_values
-from pyperf._utils import median_abs_dev, percentile
+from pyperf._latency import LatencyHistogram
+from pyperf._stats import RunningStats
+from pyperf._utils import median_abs_dev, percentiles
 
 
 # JSON format history:
@@ -34,6 +39,7 @@ _JSON_MAP_VERSION = {5: (0, 8, 3), 6: (0, 9, 6), '1.0': (1, 0)}
 # value for these metadata (or no run must have this metadata)
 _CHECKED_METADATA = (
     'aslr',
+    'command_cache',
     'cpu_count',
     'cpu_model_name',
     'hostname',
@@ -47,7 +53,143 @@ _CHECKED_METADATA = (
     'unit')
 
 
-_UNSET = object()
+class _Unset:
+    # Singleton which survives pickling of Benchmark caches
+    def __reduce__(self):
+        return '_UNSET'
+
+
+_UNSET = _Unset()
+
+# Filename extension of the binary format, see pyperf._binary
+_BINARY_SUFFIX = '.pyperf'
+# Filename extension of results logs (JSON lines), see pyperf._resultlog
+_LOG_SUFFIX = '.jsonl'
+
+
+# Filename extension => module providing an open() function like gzip.open()
+# to read and write a compressed file as a stream
+_COMPRESSION_MODULES = {
+    '.gz': 'gzip',
+    '.xz': 'lzma',
+    '.bz2': 'bz2',
+    # Python 3.14 and newer
+    '.zst': 'compression.zstd',
+}
+
+
+def _compression_suffix(filename):
+    filename = os.fsdecode(filename)
+    for suffix in _COMPRESSION_MODULES:
+        if filename.endswith(suffix):
+            return suffix
+    return None
+
+
+def _strip_compression_suffix(filename):
+    filename = os.fsdecode(filename)
+    suffix = _compression_suffix(filename)
+    if suffix:
+        filename = filename[:-len(suffix)]
+    return filename
+
+
+def _open_compressed(filename, mode, **kwargs):
+    # Open filename with the compression module chosen by its extension,
+    # or with open() if the file is not compressed
+    suffix = _compression_suffix(filename)
+    if suffix is None:
+        return open(filename, mode, **kwargs)
+
+    # Use lazy import to limit imports on 'import pyperf'
+    import importlib
+
+    module_name = _COMPRESSION_MODULES[suffix]
+    try:
+        module = importlib.import_module(module_name)
+    except ImportError:
+        raise ValueError("%s compression is not supported: "
+                         "the %s module is missing"
+                         % (suffix, module_name))
+    return module.open(filename, mode, **kwargs)
+
+
+def _is_binary_filename(filename):
+    filename = _strip_compression_suffix(filename)
+    return filename.endswith(_BINARY_SUFFIX)
+
+
+def _is_log_filename(filename):
+    return os.fsdecode(filename).endswith(_LOG_SUFFIX)
+
+
+def _json_benchmark_name(bench_data, suite_metadata):
+    # Get the name of a benchmark without loading it
+    metadata = bench_data.get('metadata') or bench_data.get('common_metadata')
+    if metadata and 'name' in metadata:
+        return metadata['name']
+    runs = bench_data.get('runs')
+    if runs and 'name' in runs[0].get('metadata', {}):
+        return runs[0]['metadata']['name']
+    return suite_metadata.get('name')
+
+
+def _pack_values(values):
+    # Store float values in a compact array of C doubles. Keep a tuple if
+    # a value is an int (ex: memory usage in bytes) to not lose its type.
+    if all(type(value) is float for value in values):
+        return array.array('d', values)
+    return tuple(values)
+
+
+def _pack_warmups(warmups):
+    # Store (loops, value) items in a single array of doubles: loops and
+    # values are interleaved. Keep a tuple if a value is an int or if loops
+    # cannot be stored exactly as a double.
+    if all(type(value) is float and loops <= 2 ** 53
+           for loops, value in warmups):
+        return array.array('d', [item for warmup in warmups
+                                 for item in warmup])
+    return tuple(warmups)
+
+
+def _concat_arrays(items):
+    # Concatenate arrays of doubles (or None) into (array, lengths) to
+    # pickle them quickly; keep the list if an item is not an array
+    if not all(item is None or isinstance(item, array.array)
+               for item in items):
+        return items
+    concat = array.array('d')
+    lengths = array.array('l')
+    for item in items:
+        if item is None:
+            lengths.append(-1)
+        else:
+            concat.extend(item)
+            lengths.append(len(item))
+    return (concat, lengths)
+
+
+def _split_arrays(packed):
+    # Inverse of _concat_arrays()
+    if isinstance(packed, list):
+        return packed
+    concat, lengths = packed
+    items = []
+    pos = 0
+    for length in lengths:
+        if length < 0:
+            items.append(None)
+        else:
+            items.append(concat[pos:pos + length])
+            pos += length
+    return items
+
+
+def _values_buffer(values):
+    if not isinstance(values, array.array):
+        values = array.array('d', values)
+    return memoryview(values).toreadonly()
 
 
 def _check_warmups(warmups):
@@ -89,10 +231,11 @@ def _cached_attr(func):
 class Run:
     # Run is immutable, so it can be shared/exchanged between two benchmarks
 
-    __slots__ = ('_warmups', '_values', '_metadata')
+    __slots__ = ('_warmups', '_values', '_values_tuple', '_metadata',
+                 '_latency')
 
     def __init__(self, values, warmups=None,
-                 metadata=None, collect_metadata=True):
+                 metadata=None, collect_metadata=True, latency=None):
         if any(not (isinstance(value, NUMBER_TYPES) and value > 0)
                for value in values):
             raise ValueError("values must be a sequence of number > 0.0")
@@ -102,16 +245,23 @@ class Run:
                              "where loops is a int >= 1 and value "
                              "is a float >= 0.0")
 
-        # tuple of (loops: int, value) items
+        # see _pack_warmups()
         if warmups:
-            self._warmups = tuple(warmups)
+            self._warmups = _pack_warmups(warmups)
         else:
             self._warmups = None
-        self._values = tuple(values)
+        self._values = _pack_values(values)
+        self._values_tuple = None
 
         if not self._values and not self._warmups:
             raise ValueError("values and warmups are empty sequence")
 
+        if latency is not None and not isinstance(latency, LatencyHistogram):
+            raise TypeError("latency must be a LatencyHistogram, got %s"
+                            % type(latency).__name__)
+        # Latency of individual calls, see the --latency option
+        self._latency = latency
+
         if collect_metadata:
             from pyperf._collect_metadata import collect_metadata as collect_func
 
@@ -128,17 +278,31 @@ class Run:
         else:
             self._metadata = {}
 
+    @classmethod
+    def _trusted(cls, values, warmups, metadata, latency):
+        # Create a run from values written by pyperf: skip checks
+        run = cls.__new__(cls)
+        run._values = _pack_values(values)
+        run._values_tuple = None
+        run._warmups = _pack_warmups(warmups) if warmups else None
+        run._latency = latency
+        run._metadata = metadata
+        return run
+
     def _replace(self, values=None, warmups=True, metadata=None):
         if values is None:
             values = self._values
-        if warmups:
-            warmups = self._warmups
+            latency = self._latency
         else:
-            warmups = None
+            # the latency histogram is specific to the values
+            latency = None
         if metadata is None:
             # share metadata dict since Run metadata is immutable
             metadata = self._metadata
-        run = Run(values, warmups=warmups, collect_metadata=False)
+        run = Run(values, collect_metadata=False, latency=latency)
+        if warmups:
+            # share warmups since Run is immutable
+            run._warmups = self._warmups
         run._metadata = metadata
         return run
 
@@ -196,16 +360,33 @@ class Run:
     def get_metadata(self):
         return dict(self._metadata)
 
+    def _iter_warmups(self):
+        # Iterate on (loops, value) items
+        warmups = self._warmups
+        if not warmups:
+            return iter(())
+        if isinstance(warmups, tuple):
+            return iter(warmups)
+        items = iter(warmups)
+        return ((int(loops), value) for loops, value in zip(items, items))
+
     @property
     def warmups(self):
-        if self._warmups:
-            return self._warmups
-        else:
-            return ()
+        return tuple(self._iter_warmups())
 
     @property
     def values(self):
-        return self._values
+        # Run is immutable: create the tuple once
+        if self._values_tuple is None:
+            self._values_tuple = tuple(self._values)
+        return self._values_tuple
+
+    def get_values_buffer(self):
+        return _values_buffer(self._values)
+
+    @property
+    def latency(self):
+        return self._latency
 
     def get_loops(self):
         return self._metadata.get('loops', 1)
@@ -222,7 +403,7 @@ class Run:
         if warmups and self._warmups:
             inner_loops = self.get_inner_loops()
             raw_values.extend(value * (loops * inner_loops)
-                              for loops, value in self._warmups)
+                              for loops, value in self._iter_warmups())
 
         total_loops = self.get_total_loops()
         raw_values.extend(value * total_loops for value in self._values)
@@ -247,9 +428,12 @@ class Run:
     def _as_json(self, common_metadata):
         data = {}
         if self._warmups:
-            data['warmups'] = self._warmups
+            data['warmups'] = list(self._iter_warmups())
         if self._values:
-            data['values'] = self._values
+            data['values'] = list(self._values)
+
+        if self._latency is not None:
+            data['latency'] = self._latency._as_json()
 
         metadata = _exclude_common_metadata(self._metadata, common_metadata)
         if metadata:
@@ -257,10 +441,16 @@ class Run:
         return data
 
     @classmethod
-    def _json_load(cls, version, run_data, common_metadata):
-        metadata = run_data.get('metadata', {})
-        if common_metadata:
-            metadata = dict(common_metadata, **metadata)
+    def _json_load(cls, version, run_data, common_metadata, trusted=False):
+        # common_metadata is already parsed and shared by all runs
+        # of the benchmark
+        metadata = run_data.get('metadata')
+        if metadata:
+            if trusted:
+                metadata = _trusted_metadata(metadata)
+            else:
+                metadata = parse_metadata(metadata)
+        metadata = _shared_metadata(common_metadata, metadata)
 
         warmups = run_data.get('warmups', None)
         if warmups:
@@ -275,10 +465,18 @@ class Run:
         else:
             values = run_data['samples']
 
-        return cls(values,
-                   warmups=warmups,
-                   metadata=metadata,
-                   collect_metadata=False)
+        latency = run_data.get('latency', None)
+        if latency is not None:
+            latency = LatencyHistogram._json_load(latency)
+
+        if trusted:
+            return cls._trusted(values, warmups, metadata, latency)
+        run = cls(values,
+                  warmups=warmups,
+                  collect_metadata=False,
+                  latency=latency)
+        run._metadata = metadata
+        return run
 
     def _extract_metadata(self, name):
         value = self._metadata.get(name, None)
@@ -322,6 +520,8 @@ class Run:
 class Benchmark:
     def __init__(self, runs):
         self._runs = []   # list of Run objects
+        # weak references to the suites indexing the benchmark by name
+        self._suites = None
         self._clear_runs_cache()
 
         if not runs:
@@ -335,6 +535,33 @@ class Benchmark:
         for run in runs:
             self.add_run(run)
 
+    @classmethod
+    def _trusted(cls, runs):
+        # Create a benchmark from runs written by pyperf: don't call
+        # add_run() which checks the metadata of each run
+        if not runs:
+            raise ValueError("runs must be a non-empty sequence of Run objects")
+        bench = cls.__new__(cls)
+        bench._runs = list(runs)
+        bench._suites = None
+        bench._clear_runs_cache()
+        return bench
+
+    def __getstate__(self):
+        # weak references cannot be pickled
+        state = self.__dict__.copy()
+        state['_suites'] = None
+        # don't pickle values twice
+        state['_values_tuple'] = None
+        return state
+
+    def _add_suite(self, suite):
+        # forget suites which have been destroyed
+        suites = [ref for ref in self._suites or ()
+                  if ref() is not None and ref() is not suite]
+        suites.append(weakref.ref(suite))
+        self._suites = suites
+
     def __repr__(self):
         return ('<Benchmark %r with %s runs>'
                 % (self.get_name(), len(self._runs)))
@@ -370,7 +597,7 @@ class Benchmark:
         return self._get_run_property(lambda run: len(run.warmups))
 
     def _get_nvalue_per_run(self):
-        return self._get_run_property(lambda run: len(run.values))
+        return self._get_run_property(lambda run: len(run._values))
 
     def get_loops(self):
         return self._get_run_property(lambda run: run.get_loops())
@@ -383,6 +610,8 @@ class Benchmark:
 
     def _clear_runs_cache(self, keep_common_metadata=False):
         self._values = None
+        self._values_tuple = None
+        self._stats = None
         self._mean = None
         self._stdev = None
         self._median = None
@@ -390,10 +619,24 @@ class Benchmark:
         if not keep_common_metadata:
             self._common_metadata = None
         self._dates = _UNSET
+        self._latency = _UNSET
+
+    def _get_stats(self):
+        # RunningStats of all values, updated by add_run()
+        if self._stats is None:
+            stats = RunningStats()
+            for run in self._runs:
+                stats.add(run._values)
+            self._stats = stats
+        return self._stats
 
     @_cached_attr
     def mean(self):
-        value = statistics.mean(self.get_values())
+        stats = self._get_stats()
+        if stats.is_exact():
+            value = stats.mean()
+        else:
+            value = statistics.mean(self._get_values())
         # add_run() ensures that all values are greater than zero
         if value <= 0:
             raise ValueError("mean must be > 0")
@@ -401,8 +644,11 @@ class Benchmark:
 
     @_cached_attr
     def stdev(self):
-        values = self.get_values()
-        value = statistics.stdev(values)
+        stats = self._get_stats()
+        if stats.is_exact():
+            value = stats.stdev()
+        else:
+            value = statistics.stdev(self._get_values())
         # add_run() ensures that all values are greater than zero
         if value < 0:
             raise ValueError("std dev must be >= 0")
@@ -410,7 +656,7 @@ class Benchmark:
 
     @_cached_attr
     def median(self):
-        value = statistics.median(self.get_values())
+        value = self._get_stats().median()
         # add_run() ensures that all values are greater than zero
         if value <= 0:
             raise ValueError("median must be > 0")
@@ -418,7 +664,8 @@ class Benchmark:
 
     @_cached_attr
     def median_abs_dev(self):
-        value = median_abs_dev(self.get_values())
+        values = self._get_stats().sorted_values()
+        value = median_abs_dev(values)
         # add_run() ensures that all values are greater than zero
         if value < 0:
             raise ValueError("MAD must be >= 0")
@@ -443,8 +690,8 @@ class Benchmark:
         # value is intended to be advice for the number of processes to run.
         values = []
         for run in self._runs:
-            if len(run.values):
-                values.append(statistics.mean(run.values))
+            if len(run._values):
+                values.append(statistics.mean(run._values))
 
         if len(values) < 2:
             return None
@@ -465,10 +712,15 @@ class Benchmark:
         # (4Z²σ²)/(W²)
         return math.ceil((4 * Z ** 2 * sigma ** 2) / (W ** 2))
 
+    def percentiles(self, ps):
+        for p in ps:
+            if not (0 <= p <= 100):
+                raise ValueError("p must be in the range [0; 100]")
+        values = self._get_stats().sorted_values()
+        return percentiles(values, [p / 100.0 for p in ps], is_sorted=True)
+
     def percentile(self, p):
-        if not (0 <= p <= 100):
-            raise ValueError("p must be in the range [0; 100]")
-        return percentile(self.get_values(), p / 100.0)
+        return self.percentiles((p,))[0]
 
     def add_run(self, run):
         if not isinstance(run, Run):
@@ -491,9 +743,15 @@ class Benchmark:
             for name, value in list(self._common_metadata.items()):
                 if run._metadata.get(name, None) != value:
                     del self._common_metadata[name]
+        stats = self._stats
         self._clear_runs_cache(keep_common_metadata=True)
 
         self._runs.append(run)
+        if stats is not None:
+            # Update statistics in O(len(run.values)), rather than
+            # recomputing them from all values
+            stats.add(run._values)
+            self._stats = stats
 
     def get_unit(self):
         run = self._runs[0]
@@ -516,46 +774,119 @@ class Benchmark:
         if self._values is not None:
             return len(self._values)
         else:
-            return sum(len(run.values) for run in self._runs)
+            return sum(len(run._values) for run in self._runs)
 
-    def get_values(self):
+    def _get_values(self):
+        # Values of all runs: array of doubles, or tuple (see _pack_values)
         if self._values is not None:
             return self._values
 
-        values = []
-        for run in self._runs:
-            values.extend(run.values)
-        values = tuple(values)
+        if all(isinstance(run._values, array.array) for run in self._runs):
+            values = array.array('d')
+            for run in self._runs:
+                values.extend(run._values)
+        else:
+            values = []
+            for run in self._runs:
+                values.extend(run._values)
+            values = tuple(values)
         self._values = values
         return values
 
+    def get_values(self):
+        # the tuple is cached until runs are modified
+        if self._values_tuple is None:
+            self._values_tuple = tuple(self._get_values())
+        return self._values_tuple
+
+    def get_sorted_values(self):
+        return tuple(self._get_stats().sorted_values())
+
+    def get_values_buffer(self):
+        return _values_buffer(self._get_values())
+
     def _get_raw_values(self, warmups=False):
         raw_values = []
         for run in self._runs:
             raw_values.extend(run._get_raw_values(warmups))
         return raw_values
 
+    def get_latency(self):
+        if self._latency is not _UNSET:
+            return self._latency
+
+        latency = None
+        for run in self._runs:
+            if run._latency is None:
+                continue
+            if latency is None:
+                latency = LatencyHistogram()
+            latency.merge(run._latency)
+        self._latency = latency
+        return latency
+
     def _only_calibration(self):
         return all(run._is_calibration() for run in self._runs)
 
+    def _pack(self):
+        # Compact form of the benchmark sent by worker processes, see
+        # _load_suite_worker(): values of all runs are concatenated into
+        # a single array, and the statistics commonly displayed are sent
+        # without the sorted values
+        runs = self._runs
+        metadata = [(run._metadata._common, run._metadata._own)
+                    if isinstance(run._metadata, _SharedMetadata)
+                    else run._metadata
+                    for run in runs]
+        if self._only_calibration():
+            stats = None
+        else:
+            stdev = self.stdev() if self.get_nvalue() >= 2 else None
+            stats = (self.mean(), self.median(), stdev)
+        return (_concat_arrays([run._values for run in runs]),
+                _concat_arrays([run._warmups for run in runs]),
+                metadata,
+                [run._latency for run in runs],
+                stats)
+
     @classmethod
-    def _json_load(cls, version, data, suite_metadata):
+    def _unpack(cls, data):
+        values, warmups, metadata, latencies, stats = data
+        runs = []
+        for run_values, run_warmups, run_metadata, latency in zip(
+                _split_arrays(values), _split_arrays(warmups),
+                metadata, latencies):
+            if isinstance(run_metadata, tuple):
+                run_metadata = _SharedMetadata(*run_metadata)
+            run = Run.__new__(Run)
+            run._values = run_values
+            run._values_tuple = None
+            run._warmups = run_warmups
+            run._metadata = run_metadata
+            run._latency = latency
+            runs.append(run)
+        bench = cls._trusted(runs)
+        if stats is not None:
+            bench._mean, bench._median, bench._stdev = stats
+        return bench
+
+    @classmethod
+    def _json_load(cls, version, data, suite_metadata, trusted=False):
         if version >= (0, 9, 6):
             metadata = data.get('metadata', {})
         else:
             metadata = data.get('common_metadata', {})
-        metadata = parse_metadata(metadata)
+        if trusted:
+            metadata = _trusted_metadata(metadata)
+        else:
+            metadata = parse_metadata(metadata)
         if suite_metadata:
             metadata = dict(suite_metadata, **metadata)
 
-        runs = []
-        for run_data in data['runs']:
-            run = Run._json_load(version, run_data, metadata)
-            # Don't call add_run() to avoid O(n) complexity:
-            # expect that runs were already validated before being written
-            # into a JSON file
-            runs.append(run)
-
+        runs = [Run._json_load(version, run_data, metadata, trusted)
+                for run_data in data['runs']]
+        if trusted:
+            return cls._trusted(runs)
         return cls(runs)
 
     def _as_json(self, suite_metadata):
@@ -591,8 +922,21 @@ class Benchmark:
     def _replace_runs(self, new_runs):
         if not new_runs:
             raise ValueError("no more runs")
+        if not self._suites:
+            self._runs[:] = new_runs
+            self._clear_runs_cache()
+            return
+
+        old_name = self.get_name()
         self._runs[:] = new_runs
         self._clear_runs_cache()
+        if self.get_name() != old_name:
+            # the benchmark was renamed: invalidate the name index
+            # of its suites
+            for ref in self._suites:
+                suite = ref()
+                if suite is not None:
+                    suite._index = None
 
     def _filter_runs(self, include, only_runs):
         if include:
@@ -676,9 +1020,25 @@ class BenchmarkSuite:
 
         self.filename = filename
         self._benchmarks = []
+        # name => Benchmark, None if it must be rebuilt
+        self._index = {}
         for benchmark in benchmarks:
             self.add_benchmark(benchmark)
 
+    def _build_index(self):
+        index = {}
+        for bench in self._benchmarks:
+            name = bench.get_name()
+            if name:
+                index.setdefault(name, bench)
+        self._index = index
+
+    def _get_index(self):
+        if self._index is None:
+            # a benchmark was renamed: rebuild the index
+            self._build_index()
+        return self._index
+
     def get_benchmark_names(self):
         return [bench.get_name() for bench in self]
 
@@ -713,80 +1073,103 @@ class BenchmarkSuite:
                             % type(result).__name__)
 
     def get_benchmark(self, name):
-        for bench in self._benchmarks:
-            if bench.get_name() == name:
-                return bench
-        raise KeyError("there is no benchmark called %r" % name)
+        bench = self._get_index().get(name)
+        if bench is None:
+            raise KeyError("there is no benchmark called %r" % name)
+        return bench
 
     def get_benchmarks(self):
         return list(self._benchmarks)
 
     def add_benchmark(self, benchmark):
-        if benchmark in self._benchmarks:
-            raise ValueError("benchmark already part of the suite")
-
         name = benchmark.get_name()
         if name:
-            try:
-                self.get_benchmark(name)
-            except KeyError:
-                pass
-            else:
+            index = self._get_index()
+            existing = index.get(name)
+            if existing is benchmark:
+                raise ValueError("benchmark already part of the suite")
+            if existing is not None:
                 raise ValueError("the suite has already a benchmark called %r"
                                  % name)
+            index[name] = benchmark
+        elif benchmark in self._benchmarks:
+            raise ValueError("benchmark already part of the suite")
 
         self._benchmarks.append(benchmark)
+        benchmark._add_suite(self)
 
     @classmethod
-    def _json_load(cls, filename, data):
+    def _json_load(cls, filename, data, names=None, trusted=False):
+        benchmarks = cls._json_load_benchmarks(data, names, trusted)
+        return cls._from_loaded(filename, benchmarks, names)
+
+    @staticmethod
+    def _json_load_benchmarks(data, names=None, trusted=False):
         version = data.get('version')
         version_info = _JSON_MAP_VERSION.get(version)
         if not version_info:
             raise ValueError("file format version %r not supported" % version)
         benchmarks_json = data['benchmarks']
+        # Files written by older pyperf versions are always validated
+        trusted = (trusted and version == _JSON_VERSION)
 
         if version_info >= (0, 9, 6):
             metadata = data.get('metadata', {})
             if metadata is not None:
-                metadata = parse_metadata(metadata)
+                if trusted:
+                    metadata = _trusted_metadata(metadata)
+                else:
+                    metadata = parse_metadata(metadata)
         else:
             metadata = {}
 
         benchmarks = []
         for bench_data in benchmarks_json:
-            benchmark = Benchmark._json_load(version_info, bench_data, metadata)
+            if (names is not None
+               and _json_benchmark_name(bench_data, metadata) not in names):
+                continue
+            benchmark = Benchmark._json_load(version_info, bench_data,
+                                             metadata, trusted)
             benchmarks.append(benchmark)
-        suite = cls(benchmarks, filename=filename)
+        return benchmarks
 
-        if not suite:
+    @classmethod
+    def _from_loaded(cls, filename, benchmarks, names):
+        if not benchmarks:
+            if names is not None:
+                raise KeyError("no benchmark found with name in %r"
+                               % sorted(names))
             raise ValueError("the file doesn't contain any benchmark")
-
-        return suite
+        return cls(benchmarks, filename=filename)
 
     @staticmethod
     def _load_open(filename):
-        if isinstance(filename, bytes):
-            suffix = b'.gz'
-        else:
-            suffix = '.gz'
-
-        if filename.endswith(suffix):
-            # Use lazy import to limit imports on 'import pyperf'
-            import gzip
-            return gzip.open(filename, "rt", encoding="utf-8")
-        else:
-            return open(filename, "r", encoding="utf-8")
+        if _is_binary_filename(filename):
+            return _open_compressed(filename, "rb")
+        return _open_compressed(filename, "rt", encoding="utf-8")
 
     @classmethod
-    def load(cls, file):
+    def load(cls, file, names=None, trusted=False):
         # Use lazy import to limit imports on 'import pyperf'
         import json
 
+        if names is not None:
+            names = set(names)
+
         if isinstance(file, (bytes, str)):
             if file != '-':
                 filename = file
+                if _is_log_filename(filename):
+                    from pyperf._resultlog import load as load_log
+                    benchmarks = load_log(filename, names, trusted)
+                    return cls._from_loaded(filename, benchmarks, names)
+
                 fp = cls._load_open(filename)
                 with fp:
+                    if _is_binary_filename(filename):
+                        from pyperf._binary import load
+                        benchmarks = load(fp, names, trusted)
+                        return cls._from_loaded(filename, benchmarks, names)
                     data = json.load(fp)
             else:
                 filename = '<stdin>'
@@ -796,7 +1179,7 @@ class BenchmarkSuite:
             filename = getattr(file, 'name', None)
             data = json.load(file)
 
-        return cls._json_load(filename, data)
+        return cls._json_load(filename, data, names, trusted)
 
     @classmethod
     def loads(cls, string):
@@ -808,21 +1191,12 @@ class BenchmarkSuite:
 
     @staticmethod
     def _dump_open(filename, replace):
-        if isinstance(filename, bytes):
-            suffix = b'.gz'
-        else:
-            suffix = '.gz'
-
         if not replace and os.path.exists(filename):
             raise OSError(errno.EEXIST, "File already exists")
 
-        if filename.endswith(suffix):
-            # Use lazy import to limit imports on 'import pyperf'
-            import gzip
-
-            return gzip.open(filename, mode="wt", encoding="utf-8")
-        else:
-            return open(filename, "w", encoding="utf-8")
+        if _is_binary_filename(filename):
+            return _open_compressed(filename, "wb")
+        return _open_compressed(filename, "wt", encoding="utf-8")
 
     def _as_json(self):
         metadata = self.get_metadata()
@@ -837,7 +1211,13 @@ class BenchmarkSuite:
         # Use lazy import to limit imports on 'import pyperf'
         import json
 
-        data = self._as_json()
+        if isinstance(file, (bytes, str)) and _is_binary_filename(file):
+            data = None
+        else:
+            data = self._as_json()
+        if isinstance(file, (bytes, str)) and _is_log_filename(file):
+            # a results log requires one suite per line
+            compact = True
 
         def dump(data, fp, compact):
             kw = {}
@@ -852,7 +1232,11 @@ class BenchmarkSuite:
         if isinstance(file, (bytes, str)):
             fp = self._dump_open(file, replace)
             with fp:
-                dump(data, fp, compact)
+                if _is_binary_filename(file):
+                    from pyperf._binary import dump as dump_binary
+                    dump_binary(self, fp)
+                else:
+                    dump(data, fp, compact)
                 fp.close()
         else:
             # file is a file object
@@ -862,6 +1246,7 @@ class BenchmarkSuite:
         if not benchmarks:
             raise ValueError("empty benchmark suite")
         self._benchmarks[:] = benchmarks
+        self._build_index()
 
     def _convert_include_benchmark(self, names):
         name_set = set(names)
@@ -899,7 +1284,11 @@ class BenchmarkSuite:
 
 
 def add_runs(filename, result):
-    if os.path.exists(filename):
+    if _is_log_filename(filename):
+        # Results log: append a line, don't rewrite the file
+        from pyperf._resultlog import append
+        append(filename, result)
+    elif os.path.exists(filename):
         suite = BenchmarkSuite.load(filename)
         suite.add_runs(result)
         suite.dump(filename, replace=True)
@@ -907,6 +1296,20 @@ def add_runs(filename, result):
         result.dump(filename)
 
 
+def _load_suite_worker(filename, names=None, trusted=False):
+    # Function run in a worker process to load a suite: statistics
+    # are computed by the worker and sent with the suite to the parent.
+    # Use _unpack_suite() to get the suite.
+    suite = BenchmarkSuite.load(filename, names, trusted)
+    return (suite.filename, [bench._pack() for bench in suite])
+
+
+def _unpack_suite(data):
+    filename, benchmarks = data
+    return BenchmarkSuite([Benchmark._unpack(bench) for bench in benchmarks],
+                          filename=filename)
+
+
 def _load_suite_from_pipe(bench_json):
     lines = bench_json.split("\n")
     result = None
@@ -0,0 +1,255 @@
+"""
+Columnar binary file format of benchmark suites.
+
+Layout:
+
+* MAGIC (8 bytes)
+* header size: unsigned 32-bit integer, little endian
+* header: JSON encoded to UTF-8
+* data: one block per benchmark
+
+The header contains the version of the JSON format used to encode
+metadata and the metadata table: list of unique (name, value) pairs.
+Suite, benchmark and run metadata are lists of indexes in this table.
+Benchmark entries of the header give the offset and the size of their data
+block, so only selected benchmarks are read. A data block contains packed
+arrays of run values and warmups, little endian: float64 ('d') or int64
+('q') if all values are integers.
+
+Runs mixing int and float values store them in the header, to round-trip
+losslessly with the JSON format.
+"""
+import array
+import json
+import struct
+import sys
+
+from pyperf._metadata import (parse_metadata, _exclude_common_metadata,
+                              _shared_metadata, _trusted_metadata)
+from pyperf._latency import LatencyHistogram
+
+
+MAGIC = b'PYPERF\x00\x01'
+_HEADER_SIZE = struct.Struct('<I')
+_INT64_MAX = 2 ** 63 - 1
+
+
+def _typecode(values):
+    if isinstance(values, array.array) and values.typecode == 'd':
+        return 'd'
+    if all(type(value) is float for value in values):
+        return 'd'
+    if all(type(value) is int and -_INT64_MAX <= value <= _INT64_MAX
+           for value in values):
+        return 'q'
+    return None
+
+
+def _pack(typecode, values):
+    if (isinstance(values, array.array) and values.typecode == typecode
+       and sys.byteorder == 'little'):
+        return values.tobytes()
+    data = array.array(typecode, values)
+    if sys.byteorder != 'little':
+        data.byteswap()
+    return data.tobytes()
+
+
+def _unpack(typecode, data, offset, count):
+    values = array.array(typecode)
+    size = values.itemsize * count
+    values.frombytes(data[offset:offset + size])
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return (values.tolist(), offset + size)
+
+
+class _MetadataTable:
+    def __init__(self):
+        self.items = []
+        self._index = {}
+
+    def encode(self, metadata):
+        indexes = []
+        for item in sorted(metadata.items()):
+            # lists (ex: tags) are not hashable
+            key = (item[0], json.dumps(item[1], sort_keys=True))
+            index = self._index.get(key)
+            if index is None:
+                index = len(self.items)
+                self.items.append(list(item))
+                self._index[key] = index
+            indexes.append(index)
+        return indexes
+
+
+def _dump_run(run, common_metadata, table, blocks):
+    entry = {}
+    warmups = list(run._iter_warmups())
+    loops = [item[0] for item in warmups]
+    warmups = [item[1] for item in warmups]
+    for key, values in (('values', run._values), ('warmups', warmups)):
+        typecode = _typecode(values)
+        if typecode is None:
+            if key == 'values':
+                entry[key] = list(values)
+            else:
+                entry[key] = list(zip(loops, values))
+            continue
+        if values:
+            entry['n' + key] = len(values)
+            entry[key + '_type'] = typecode
+            blocks.append(_pack(typecode, values))
+            if key == 'warmups':
+                blocks.append(_pack('q', loops))
+
+    if run._latency is not None:
+        entry['latency'] = run._latency._as_json()
+
+    metadata = _exclude_common_metadata(run._metadata, common_metadata)
+    if metadata:
+        entry['metadata'] = table.encode(metadata)
+    return entry
+
+
+def dump(suite, fp):
+    from pyperf._bench import _JSON_VERSION
+
+    table = _MetadataTable()
+    suite_metadata = suite.get_metadata()
+
+    benchmarks = []
+    blocks = []
+    offset = 0
+    for bench in suite:
+        metadata = bench._get_common_metadata()
+        common_metadata = dict(metadata, **suite_metadata)
+
+        bench_blocks = []
+        runs = [_dump_run(run, common_metadata, table, bench_blocks)
+                for run in bench._runs]
+        size = sum(len(block) for block in bench_blocks)
+        blocks.extend(bench_blocks)
+
+        entry = {'name': bench.get_name(), 'runs': runs,
+                 'offset': offset, 'size': size}
+        metadata = _exclude_common_metadata(metadata, suite_metadata)
+        if metadata:
+            entry['metadata'] = table.encode(metadata)
+        benchmarks.append(entry)
+        offset += size
+
+    header = {'version': _JSON_VERSION,
+              'benchmarks': benchmarks,
+              'metadata': table.encode(suite_metadata),
+              'metadata_table': table.items}
+    header = json.dumps(header, sort_keys=True,
+                        separators=(',', ':')).encode('utf-8')
+
+    fp.write(MAGIC)
+    fp.write(_HEADER_SIZE.pack(len(header)))
+    fp.write(header)
+    for block in blocks:
+        fp.write(block)
+    fp.flush()
+
+
+def _read(fp, size):
+    data = fp.read(size)
+    if len(data) != size:
+        raise ValueError("truncated pyperf binary file")
+    return data
+
+
+def _load_run(run_cls, entry, data, offset, common_metadata, table,
+              trusted=False):
+    metadata = entry.get('metadata')
+    if metadata:
+        metadata = dict(table[index] for index in metadata)
+        if trusted:
+            metadata = _trusted_metadata(metadata)
+        else:
+            metadata = parse_metadata(metadata)
+    metadata = _shared_metadata(common_metadata, metadata)
+
+    values = entry.get('values')
+    if values is None:
+        values = ()
+        count = entry.get('nvalues')
+        if count:
+            values, offset = _unpack(entry['values_type'], data, offset,
+                                     count)
+
+    warmups = entry.get('warmups')
+    if warmups is not None:
+        warmups = [tuple(item) for item in warmups]
+    else:
+        count = entry.get('nwarmups')
+        if count:
+            warmup_values, offset = _unpack(entry['warmups_type'], data,
+                                            offset, count)
+            loops, offset = _unpack('q', data, offset, count)
+            warmups = list(zip(loops, warmup_values))
+
+    latency = entry.get('latency')
+    if latency is not None:
+        latency = LatencyHistogram._json_load(latency)
+
+    if trusted:
+        return (run_cls._trusted(values, warmups, metadata, latency), offset)
+    run = run_cls(values, warmups=warmups,
+                  collect_metadata=False, latency=latency)
+    run._metadata = metadata
+    return (run, offset)
+
+
+def load(fp, names=None, trusted=False):
+    """Load benchmarks, only benchmarks called names if names is set.
+
+    If trusted is true, don't validate values and metadata of files written
+    by the current format version.
+    """
+    from pyperf._bench import Benchmark, Run, _JSON_VERSION
+
+    if _read(fp, len(MAGIC)) != MAGIC:
+        raise ValueError("not a pyperf binary file")
+    header_size, = _HEADER_SIZE.unpack(_read(fp, _HEADER_SIZE.size))
+    header = json.loads(_read(fp, header_size).decode('utf-8'))
+    data_start = len(MAGIC) + _HEADER_SIZE.size + header_size
+    # Files written by other pyperf versions are always validated
+    trusted = (trusted and header.get('version') == _JSON_VERSION)
+
+    table = [tuple(item) for item in header['metadata_table']]
+    suite_metadata = dict(table[index] for index in header['metadata'])
+
+    if names is not None:
+        names = set(names)
+
+    benchmarks = []
+    for entry in header['benchmarks']:
+        if names is not None and entry['name'] not in names:
+            # don't read the data of benchmarks which are not loaded
+            continue
+
+        metadata = dict(suite_metadata)
+        metadata.update(table[index] for index in entry.get('metadata', ()))
+        # shared by all runs of the benchmark
+        if trusted:
+            metadata = _trusted_metadata(metadata)
+        else:
+            metadata = parse_metadata(metadata)
+
+        fp.seek(data_start + entry['offset'])
+        data = _read(fp, entry['size'])
+        offset = 0
+        runs = []
+        for run_entry in entry['runs']:
+            run, offset = _load_run(Run, run_entry, data, offset,
+                                    metadata, table, trusted)
+            runs.append(run)
+        if trusted:
+            benchmarks.append(Benchmark._trusted(runs))
+        else:
+            benchmarks.append(Benchmark(runs))
+
+    return benchmarks
@@ -0,0 +1,206 @@
+"""
+"pyperf check-budget" command: check benchmark results against a
+performance budget.
+
+Budget file (TOML, or JSON with the same structure)::
+
+    # maximum slowdown of benchmarks without a more specific budget
+    default = "+5%"
+
+    [benchmarks]
+    json_dumps = "+3%"
+
+    [tags]
+    serialize = "+2%"
+
+A benchmark violates its budget if its change is significant and its mean
+is slower than the reference mean by more than the budget.
+
+Exit codes: 0 if the budget is respected, EXIT_VIOLATION if a budget is
+violated, EXIT_ERROR if the budget file or the benchmarks are invalid.
+"""
+import argparse
+import json
+import os.path
+import sys
+
+from pyperf._compare import ALPHA, CompareSuites, CompareError
+
+
+# Exit code if a benchmark violates its budget
+EXIT_VIOLATION = 1
+# Exit code if the budget cannot be checked: invalid budget file, etc.
+EXIT_ERROR = 2
+
+
+class Budget:
+    def __init__(self, default=None, benchmarks=None, tags=None):
+        # maximum slowdown in percent, or None
+        self.default = default
+        # name => maximum slowdown in percent
+        self.benchmarks = benchmarks or {}
+        # tag => maximum slowdown in percent
+        self.tags = tags or {}
+
+    def get(self, name, tags=()):
+        """Get (max_slowdown, source) of a benchmark.
+
+        source is 'benchmark', 'tag:<tag>' or 'default'. Return
+        (None, None) if the benchmark has no budget.
+        """
+        if name in self.benchmarks:
+            return (self.benchmarks[name], 'benchmark')
+
+        # the strictest budget of the benchmark tags
+        tag_budgets = [(self.tags[tag], tag) for tag in tags
+                       if tag in self.tags]
+        if tag_budgets:
+            max_slowdown, tag = min(tag_budgets)
+            return (max_slowdown, 'tag:%s' % tag)
+
+        if self.default is not None:
+            return (self.default, 'default')
+        return (None, None)
+
+
+def parse_threshold(value):
+    # "+3%", "3%" or 3 => 3.0
+    if isinstance(value, bool):
+        raise ValueError("invalid budget threshold: %r" % value)
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        text = value.strip()
+        if text.startswith('max'):
+            text = text[3:].strip()
+        if text.endswith('%'):
+            text = text[:-1]
+        try:
+            return float(text)
+        except ValueError:
+            pass
+    raise ValueError("invalid budget threshold: %r" % value)
+
+
+def _load_toml(filename):
+    try:
+        import tomllib
+    except ImportError:
+        # Python 3.10 and older
+        try:
+            import tomli as tomllib
+        except ImportError:
+            raise ValueError("reading TOML budget files requires Python 3.11 "
+                             "or the tomli module: use a JSON budget file")
+    with open(filename, 'rb') as fp:
+        return tomllib.load(fp)
+
+
+def load_budget(filename):
+    if os.path.splitext(filename)[1] == '.json':
+        with open(filename, encoding='utf-8') as fp:
+            data = json.load(fp)
+    else:
+        data = _load_toml(filename)
+    if not isinstance(data, dict):
+        raise ValueError("budget file must contain a table")
+
+    unknown = set(data) - {'default', 'benchmarks', 'tags'}
+    if unknown:
+        raise ValueError("unknown budget keys: %s" % ', '.join(sorted(unknown)))
+
+    default = data.get('default')
+    if default is not None:
+        default = parse_threshold(default)
+    thresholds = {}
+    for key in ('benchmarks', 'tags'):
+        table = data.get(key, {})
+        if not isinstance(table, dict):
+            raise ValueError("budget %r must be a table" % key)
+        thresholds[key] = {name: parse_threshold(value)
+                           for name, value in table.items()}
+    return Budget(default, thresholds['benchmarks'], thresholds['tags'])
+
+
+def _result_as_json(result, budget):
+    ref = result.ref.benchmark
+    changed = result.changed.benchmark
+    name = ref.get_name()
+    tags = ref.get_metadata().get('tags', ())
+    max_slowdown, source = budget.get(name, tags)
+
+    norm_mean = result.norm_mean
+    slowdown = (norm_mean - 1.0) * 100
+    violation = (max_slowdown is not None and result.significant
+                 and slowdown > max_slowdown)
+    return {
+        'name': name,
+        'unit': ref.get_unit(),
+        'reference_mean': ref.mean(),
+        'changed_mean': changed.mean(),
+        'ratio': norm_mean,
+        'interval': list(result.interval),
+        'pvalue': result.pvalue,
+        'adjusted_pvalue': result._adjusted_pvalue,
+        'significant': result.significant,
+        'budget': max_slowdown,
+        'budget_source': source,
+        'violation': violation,
+    }
+
+
+def check_budget(data, budget, args):
+    """Compare the two benchmark suites of data.
+
+    Return the report as a dict.
+    """
+    compare_args = argparse.Namespace(table=False, table_format='rest',
+                                      min_speed=None, group_by_speed=False,
+                                      verbose=False, quiet=True,
+                                      test=args.test,
+                                      correction=args.correction,
+                                      jobs=args.jobs)
+    compare = CompareSuites(data, compare_args)
+    benchmarks = [_result_as_json(result, budget)
+                  for result in compare.iter_results()]
+    ref, changed = data.suites
+    return {
+        'reference': ref.filename,
+        'changed': changed.filename,
+        'test': compare.test,
+        'correction': compare.correction,
+        'alpha': ALPHA,
+        'benchmarks': benchmarks,
+        'violations': [bench['name'] for bench in benchmarks
+                       if bench['violation']],
+    }
+
+
+def cmd_check_budget(args, data):
+    try:
+        budget = load_budget(args.budget)
+    except (OSError, ValueError) as exc:
+        print("ERROR: failed to load the budget %s: %s" % (args.budget, exc),
+              file=sys.stderr)
+        sys.exit(EXIT_ERROR)
+
+    try:
+        report = check_budget(data, budget, args)
+    except CompareError as exc:
+        print("ERROR: %s" % exc, file=sys.stderr)
+        sys.exit(EXIT_ERROR)
+    report['budget'] = args.budget
+
+    text = json.dumps(report, indent=4, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as fp:
+            fp.write(text + '\n')
+    else:
+        print(text)
+
+    violations = report['violations']
+    if violations:
+        print("ERROR: %s benchmarks exceed their performance budget: %s"
+              % (len(violations), ', '.join(violations)),
+              file=sys.stderr)
+        sys.exit(EXIT_VIOLATION)
@@ -0,0 +1,218 @@
+"""
+"pyperf regressions" command: detect step changes in the history of
+benchmarks.
+
+The mean of a benchmark is taken in each suite of a time-ordered series.
+Change points are found by binary segmentation: the series is split where
+the cumulative sum (CUSUM) of deviations from the mean deviates most, if
+the range of the CUSUM is larger than for most random permutations of the
+series; then each segment is searched again.
+"""
+import collections
+import itertools
+import math
+import os.path
+import random
+import sys
+
+
+DEFAULT_PERMUTATIONS = 1000
+DEFAULT_CONFIDENCE = 95.0
+# Minimum number of points of a segment: a single noisy point is not a step
+MIN_SEGMENT = 2
+
+# index: index of the first point after the change
+ChangePoint = collections.namedtuple('ChangePoint',
+                                     'index before after confidence')
+
+
+def _cusum(values):
+    mean = math.fsum(values) / len(values)
+    return list(itertools.accumulate(value - mean for value in values))
+
+
+def _cusum_range(values):
+    cusum = _cusum(values)
+    return max(cusum) - min(cusum)
+
+
+def find_change(values, permutations, rng, min_size=MIN_SEGMENT):
+    """Find the most likely change point of values.
+
+    Return (index, confidence) where confidence is the fraction of random
+    permutations of values with a smaller CUSUM range, or None if the
+    segment is too short.
+    """
+    if len(values) < min_size * 2:
+        return None
+
+    cusum = _cusum(values)
+    value_range = max(cusum) - min(cusum)
+    # the change happens after the point where |cusum| is maximum
+    candidates = range(min_size - 1, len(values) - min_size)
+    pos = max(candidates, key=lambda index: abs(cusum[index]))
+
+    values = list(values)
+    smaller = 0
+    for _ in range(permutations):
+        rng.shuffle(values)
+        if _cusum_range(values) < value_range:
+            smaller += 1
+    return (pos + 1, smaller / permutations)
+
+
+def detect_change_points(values, permutations=DEFAULT_PERMUTATIONS,
+                         confidence=DEFAULT_CONFIDENCE, seed=0):
+    """Detect step changes in the values of a time-ordered series.
+
+    Return a list of ChangePoint sorted by index. before and after are the
+    means of the segments before and after the change.
+    """
+    # Use a fixed seed to get reproducible results
+    rng = random.Random(seed)
+    threshold = confidence / 100.0
+
+    # index => confidence
+    changes = {}
+    segments = [(0, len(values))]
+    while segments:
+        start, end = segments.pop()
+        result = find_change(values[start:end], permutations, rng)
+        if result is None:
+            continue
+        index, change_confidence = result
+        if change_confidence < threshold:
+            continue
+        index += start
+        changes[index] = change_confidence
+        segments.append((start, index))
+        segments.append((index, end))
+
+    bounds = [0, *sorted(changes), len(values)]
+    means = [math.fsum(values[start:end]) / (end - start)
+             for start, end in zip(bounds, bounds[1:])]
+    return [ChangePoint(index, means[pos], means[pos + 1], changes[index])
+            for pos, index in enumerate(bounds[1:-1])]
+
+
+def _detect_worker(args):
+    # Function run in a worker process
+    name, values, permutations, confidence = args
+    return (name, detect_change_points(values, permutations, confidence))
+
+
+def detect_all(series, permutations=DEFAULT_PERMUTATIONS,
+               confidence=DEFAULT_CONFIDENCE, jobs=1):
+    """Detect change points of multiple series in parallel.
+
+    series is a dict: name => list of values. Return a dict:
+    name => list of ChangePoint.
+    """
+    tasks = [(name, values, permutations, confidence)
+             for name, values in sorted(series.items())]
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(tasks))
+    if jobs <= 1:
+        return dict(map(_detect_worker, tasks))
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return dict(executor.map(_detect_worker, tasks))
+
+
+def _load_suites(data):
+    # Return (labels, series, units) where series is a dict:
+    # name => list of (position, mean)
+    labels = []
+    series = collections.defaultdict(list)
+    units = {}
+    for position, suite in enumerate(data.suites):
+        labels.append(os.path.basename(suite.filename))
+        for bench in suite:
+            if not bench.get_nvalue():
+                continue
+            name = bench.get_name()
+            series[name].append((position, bench.mean()))
+            units[name] = bench.get_unit()
+    return (labels, series, units)
+
+
+def _load_db(args):
+    from pyperf._store import HistoryStore, parse_metadata_filter
+
+    metadata = None
+    if args.metadata:
+        try:
+            metadata = parse_metadata_filter(args.metadata)
+        except ValueError as exc:
+            print("ERROR: %s" % exc)
+            sys.exit(1)
+
+    labels = []
+    series = collections.defaultdict(list)
+    units = {}
+    with HistoryStore(args.db) as store:
+        names = args.benchmarks or store.get_benchmark_names()
+        for name in names:
+            for entry in store.history(name, metadata):
+                if not entry.nvalue:
+                    continue
+                series[name].append((len(labels), entry.mean))
+                labels.append(entry.date or '(no date)')
+                units[name] = entry.unit
+    return (labels, series, units)
+
+
+def _speed(change):
+    # Speed change in percent, as compare_to --min-speed
+    ratio = change.after / change.before
+    if ratio < 1.0:
+        # faster uses the inverse
+        ratio = 1.0 / ratio
+    return (ratio - 1.0) * 100
+
+
+def format_change(change, labels, positions, unit):
+    from pyperf._compare import format_normalized_mean
+    from pyperf._formatter import format_values
+
+    position = positions[change.index]
+    before, after = format_values(unit, (change.before, change.after))
+    return ("#%s (%s): %s -> %s: %s (confidence %.1f%%)"
+            % (change.index + 1, labels[position], before, after,
+               format_normalized_mean(change.after / change.before),
+               change.confidence * 100))
+
+
+def cmd_regressions(args, data=None):
+    # data: Benchmarks loaded from files, or None to read the history
+    # database args.db
+    if data is not None:
+        labels, series, units = _load_suites(data)
+    else:
+        labels, series, units = _load_db(args)
+
+    values = {name: [mean for position, mean in points]
+              for name, points in series.items()}
+    results = detect_all(values, args.permutations, args.confidence,
+                         args.jobs)
+
+    nchange = 0
+    for name, changes in sorted(results.items()):
+        if args.min_speed is not None:
+            changes = [change for change in changes
+                       if _speed(change) >= args.min_speed]
+        if not changes:
+            continue
+
+        positions = [position for position, mean in series[name]]
+        print("%s:" % name)
+        for change in changes:
+            print("- %s" % format_change(change, labels, positions,
+                                         units[name]))
+        nchange += len(changes)
+
+    if not nchange:
+        print("No change point detected in %s benchmarks" % len(results))
@@ -1,10 +1,11 @@
+import bisect
 import contextlib
 import errno
 import os.path
 import sys
 
 from pyperf._formatter import (format_seconds, format_number,
-                               format_datetime)
+                               format_datetime, format_rate)
 from pyperf._metadata import format_metadata as _format_metadata
 
 
@@ -196,12 +197,17 @@ def _format_runs(bench, quiet=False, verbose=False, raw=False, lines=None):
 PERCENTILE_NAMES = {0: 'minimum', 25: 'Q1', 50: 'median', 75: 'Q3', 100: 'maximum'}
 
 
+STATS_PERCENTILES = (0, 5, 25, 50, 75, 95, 100)
+
+
 def format_stats(bench, lines):
     fmt = bench.format_value
-    values = bench.get_values()
 
     nrun = bench.get_nrun()
-    nvalue = len(values)
+    nvalue = bench.get_nvalue()
+    # sort values once
+    percentiles = dict(zip(STATS_PERCENTILES,
+                           bench.percentiles(STATS_PERCENTILES)))
 
     empty_line(lines)
 
@@ -272,11 +278,11 @@ def format_stats(bench, lines):
     lines.append('')
 
     # Minimum
-    table = [("Minimum", bench.format_value(min(values)))]
+    table = [("Minimum", bench.format_value(percentiles[0]))]
 
     # Median +- MAD
     median = bench.median()
-    if len(values) > 2:
+    if nvalue > 2:
         median_abs_dev = bench.median_abs_dev()
         table.append(("Median +- MAD",
                       "%s +- %s"
@@ -286,14 +292,14 @@ def format_stats(bench, lines):
 
     # Mean +- std dev
     mean = bench.mean()
-    if len(values) > 2:
+    if nvalue > 2:
         stdev = bench.stdev()
         table.append(("Mean +- std dev",
                       "%s +- %s" % bench.format_values((mean, stdev))))
     else:
         table.append(("Mean", bench.format_value(mean)))
 
-    table.append(("Maximum", bench.format_value(max(values))))
+    table.append(("Maximum", bench.format_value(percentiles[100])))
 
     # Render table
     width = max(len(row[0]) + 1 for row in table)
@@ -307,8 +313,8 @@ def format_stats(bench, lines):
                 % (fmt(value), (value - mean) * 100.0 / mean))
 
     # Percentiles
-    for p in (0, 5, 25, 50, 75, 95, 100):
-        text = format_limit(mean, bench.percentile(p))
+    for p in STATS_PERCENTILES:
+        text = format_limit(mean, percentiles[p])
         text = "%3sth percentile: %s" % (p, text)
         name = PERCENTILE_NAMES.get(p)
         if name:
@@ -317,13 +323,15 @@ def format_stats(bench, lines):
     lines.append('')
 
     # Outliers
-    q1 = bench.percentile(25)
-    q3 = bench.percentile(75)
+    q1 = percentiles[25]
+    q3 = percentiles[75]
     iqr = q3 - q1
     outlier_min = (q1 - 1.5 * iqr)
     outlier_max = (q3 + 1.5 * iqr)
-    noutlier = sum(not (outlier_min <= value <= outlier_max)
-                   for value in values)
+    # values are sorted: count outliers with a binary search
+    values = bench.get_sorted_values()
+    noutlier = (bisect.bisect_left(values, outlier_min)
+                + len(values) - bisect.bisect_right(values, outlier_max))
     bounds = bench.format_values((outlier_min, outlier_max))
     lines.append('Number of outlier (out of %s..%s): %s'
                  % (bounds[0], bounds[1], format_number(noutlier)))
@@ -331,8 +339,44 @@ def format_stats(bench, lines):
     return lines
 
 
+LATENCY_PERCENTILES = (50, 90, 99, 99.9, 99.99)
+
+
+def format_latency(bench, lines):
+    latency = bench.get_latency()
+    if latency is None:
+        return lines
+
+    empty_line(lines)
+    lines.append("Latency (%s):"
+                 % format_number(latency.get_count(), 'timed call'))
+    percentiles = latency.percentiles(LATENCY_PERCENTILES)
+    for p, value in zip(LATENCY_PERCENTILES, percentiles):
+        lines.append("- p%s: %s" % (p, bench.format_value(value)))
+    lines.append("- max: %s" % bench.format_value(latency.max()))
+    return lines
+
+
+def _format_latency_summary(bench):
+    latency = bench.get_latency()
+    p50, p99, p999 = latency.percentiles((50, 99, 99.9))
+    return ('Latency: p50 %s, p99 %s, p99.9 %s'
+            % bench.format_values((p50, p99, p999)))
+
+
+def _histogram_counts(bench, latency):
+    # list of (value, count) tuples sorted by value
+    if latency:
+        histogram = bench.get_latency()
+        if histogram is None:
+            raise ValueError("benchmark %r has no latency histogram"
+                             % bench.get_name())
+        return histogram.get_buckets()
+    return [(value, 1) for value in bench.get_sorted_values()]
+
+
 def format_histogram(benchmarks, bins=20, extend=False, lines=None,
-                     checks=False):
+                     checks=False, latency=False):
     import collections
     import shutil
 
@@ -346,11 +390,16 @@ def format_histogram(benchmarks, bins=20, extend=False, lines=None,
         if not extend:
             bins = min(bins, 25)
 
-    all_values = []
+    all_counts = []
     for bench, title in benchmarks:
-        all_values.extend(bench.get_values())
-    all_min = min(all_values)
-    all_max = max(all_values)
+        counts = _histogram_counts(bench, latency)
+        if not counts:
+            # benchmark which only contains calibration runs
+            raise ValueError("benchmark %r has no value" % bench.get_name())
+        all_counts.append(counts)
+    # counts are sorted by value
+    all_min = min(counts[0][0] for counts in all_counts)
+    all_max = max(counts[-1][0] for counts in all_counts)
     value_k = float(all_max - all_min) / bins
     if not value_k:
         value_k = 1.0
@@ -364,17 +413,16 @@ def format_histogram(benchmarks, bins=20, extend=False, lines=None,
     if lines is None:
         lines = []
 
-    for item in benchmarks:
+    for item, counts in zip(benchmarks, all_counts):
         empty_line(lines)
 
         bench, title = item
         if title:
             lines.append("[ %s ]" % title)
 
-        values = bench.get_values()
-
-        buckets = [value_bucket(value) for value in values]
-        counter = collections.Counter(buckets)
+        counter = collections.Counter()
+        for value, count in counts:
+            counter[value_bucket(value)] += count
         count_max = max(counter.values())
         count_width = len(str(count_max))
 
@@ -408,7 +456,7 @@ def format_checks(bench, lines=None, check_too_many_processes=False):
         # Benchmark only contains calibration runs
         return lines
 
-    values = bench.get_values()
+    nvalue = bench.get_nvalue()
     mean = bench.mean()
     warnings = []
     warn = warnings.append
@@ -416,7 +464,7 @@ def format_checks(bench, lines=None, check_too_many_processes=False):
 
     # Display a warning if the standard deviation is greater than 10%
     # of the mean
-    if len(values) >= 2:
+    if nvalue >= 2:
         stdev = bench.stdev()
         percent = stdev * 100.0 / mean
         if percent >= 10.0:
@@ -432,10 +480,8 @@ def format_checks(bench, lines=None, check_too_many_processes=False):
                 warn("Not enough samples to get a stable result (95% certainly of less than 1% variation)")
 
     # Minimum and maximum, detect obvious outliers
-    for minimum, value in (
-        ('minimum', min(values)),
-        ('maximum', max(values)),
-    ):
+    for minimum, value in zip(('minimum', 'maximum'),
+                              bench.percentiles((0, 100))):
         percent = (value - mean) * 100.0 / mean
         if abs(percent) >= 50:
             if percent >= 0:
@@ -496,6 +542,38 @@ def format_checks(bench, lines=None, check_too_many_processes=False):
     return lines
 
 
+def format_throughput(benchmarks, lines=None):
+    # benchmarks: list of Benchmark objects produced by
+    # Runner.bench_parallel_func(), one per parallelism level
+    if lines is None:
+        lines = []
+
+    points = []
+    for bench in benchmarks:
+        if bench.get_unit() != 'second' or bench._only_calibration():
+            continue
+        parallel = bench.get_metadata().get('parallel', 1)
+        # each worker process calls the function 1/mean times per second
+        rate = parallel / bench.mean()
+        points.append((parallel, rate))
+    if not points:
+        return lines
+
+    points.sort()
+    ref_parallel, ref_rate = points[0]
+    ref_rate /= ref_parallel
+
+    empty_line(lines)
+    lines.append("Throughput:")
+    for parallel, rate in points:
+        speedup = rate / ref_rate
+        efficiency = speedup * 100.0 / parallel
+        lines.append("- %s: %s (%.2fx, efficiency: %.0f%%)"
+                     % (format_number(parallel, 'process', 'processes'),
+                        format_rate(rate), speedup, efficiency))
+    return lines
+
+
 def _format_result_value(bench):
     mean = bench.mean()
     if bench.get_nvalue() >= 2:
@@ -588,6 +666,7 @@ def format_benchmark(bench, checks=True, metadata=False,
 
     if stats:
         format_stats(bench, lines=lines)
+        format_latency(bench, lines=lines)
 
     if checks:
         format_checks(bench, lines=lines, check_too_many_processes=only_checks)
@@ -601,6 +680,9 @@ def format_benchmark(bench, checks=True, metadata=False,
             text = "%s: %s" % (name, text)
         lines.append(text)
 
+        if bench.get_latency() is not None:
+            lines.append(_format_latency_summary(bench))
+
     return lines
 
 
@@ -4,10 +4,90 @@ import os.path
 import subprocess
 import sys
 
+from pyperf._system import OS_LINUX
 from pyperf._utils import shell_quote, popen_communicate
 from pyperf._worker import WorkerTask
 
 
+CACHE_MODES = ('warm', 'cold')
+DROP_CACHES = '/proc/sys/vm/drop_caches'
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+def get_cache_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, filenames in os.walk(path):
+                dirs.sort()
+                for filename in sorted(filenames):
+                    files.append(os.path.join(root, filename))
+        elif os.path.exists(path):
+            files.append(path)
+        else:
+            raise ValueError("cache file not found: %r" % path)
+    return files
+
+
+def warm_cache(files):
+    # Read files to load them into the page cache
+    for filename in files:
+        with open(filename, 'rb') as fp:
+            while fp.read(READ_CHUNK_SIZE):
+                pass
+
+
+def evict_cache(files):
+    # Only clean pages are evicted
+    for filename in files:
+        fd = os.open(filename, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def drop_caches():
+    # Drop the whole page cache: write dirty pages to disk, and then
+    # free clean pages (Linux, requires root)
+    os.sync()
+    with open(DROP_CACHES, 'w') as fp:
+        fp.write('1\n')
+
+
+class CommandCache:
+    """Put input files in the page cache state of the cache mode."""
+
+    def __init__(self, mode, paths):
+        if mode not in CACHE_MODES:
+            raise ValueError("invalid cache mode: %r" % mode)
+        if mode == 'cold' and not hasattr(os, 'posix_fadvise'):
+            raise ValueError("cold cache mode requires os.posix_fadvise()")
+        if not paths:
+            raise ValueError("the %s cache mode requires input files" % mode)
+        self.mode = mode
+        self.files = get_cache_files(paths)
+        self.drop_caches = (mode == 'cold' and OS_LINUX
+                            and os.geteuid() == 0)
+
+    def prepare(self, metadata):
+        if self.mode == 'warm':
+            warm_cache(self.files)
+            return
+
+        evict_cache(self.files)
+        if self.drop_caches:
+            try:
+                drop_caches()
+            except OSError:
+                # ex: /proc/sys is read-only in a container
+                self.drop_caches = False
+        if self.drop_caches:
+            metadata['command_cache_method'] = 'drop_caches'
+        else:
+            metadata['command_cache_method'] = 'fadvise'
+
+
 def parse_subprocess_data(output):
     # Parse the data send from the subprocess.
     # It is three lines containing:
@@ -28,7 +108,10 @@ def parse_subprocess_data(output):
     return timing, rss, metadata
 
 
-def bench_command(command, task, loops):
+def bench_command(command, cache, task, loops):
+    if cache is not None:
+        cache.prepare(task.metadata)
+
     path = os.path.dirname(__file__)
     script = os.path.join(path, '_process_time.py')
     run_script = [sys.executable, script]
@@ -56,10 +139,12 @@ def bench_command(command, task, loops):
 
 
 class BenchCommandTask(WorkerTask):
-    def __init__(self, runner, name, command):
+    def __init__(self, runner, name, command, cache=None):
         command_str = ' '.join(map(shell_quote, command))
         metadata = {'command': command_str}
-        task_func = functools.partial(bench_command, command)
+        if cache is not None:
+            metadata['command_cache'] = cache.mode
+        task_func = functools.partial(bench_command, command, cache)
         WorkerTask.__init__(self, runner, name, task_func, metadata)
 
     def compute(self):
@@ -1,22 +1,125 @@
-from pyperf._cli import display_title, format_result_value
-from pyperf._utils import is_significant, geometric_mean
-
-
-def is_significant_benchs(bench1, bench2):
-    values1 = bench1.get_values()
-    values2 = bench2.get_values()
-
-    if len(values1) == 1 and len(values2) == 1:
-        # FIXME: is it ok to consider that comparison between two values
-        # is significant?
-        return (True, None)
+import itertools
+import math
+import os
+import random
 
-    try:
-        significant, t_score = is_significant(values1, values2)
-        return (significant, t_score)
-    except Exception:
-        # FIXME: fix the root bug, don't work around it
-        return (True, None)
+from pyperf._cli import display_title, format_result_value
+from pyperf._formatter import format_number, format_values
+from pyperf._utils import (bootstrap_ratio_test, mann_whitney_u,
+                           permutation_test, adjust_pvalues, geometric_mean,
+                           stratified_bootstrap_ratio_test,
+                           BOOTSTRAP_RESAMPLES)
+
+
+# Significance level
+ALPHA = 0.05
+
+# Significance tests: name => description
+SIGNIFICANCE_TESTS = {
+    'bootstrap': 'bootstrap test of the ratio of means',
+    'mannwhitney': 'Mann-Whitney U test',
+    'permutation': 'permutation test of the difference of means',
+}
+DEFAULT_TEST = 'bootstrap'
+
+# Corrections for multiple comparisons: name => description
+CORRECTIONS = {
+    'holm': 'Holm-Bonferroni correction',
+    'bh': 'Benjamini-Hochberg correction',
+}
+
+# Number of resamples used to compute the confidence of the ranking of
+# compare_to --matrix
+RANKING_RESAMPLES = 1000
+
+
+def significance_test(values1, values2, test=DEFAULT_TEST):
+    """Compare values2 to values1.
+
+    Return (interval, pvalue) where interval is the bootstrap confidence
+    interval of the ratio of means, and pvalue is the p-value of the test.
+    """
+    low, high, pvalue = bootstrap_ratio_test(values1, values2)
+    if test == 'mannwhitney':
+        pvalue = mann_whitney_u(values1, values2)[1]
+    elif test == 'permutation':
+        pvalue = permutation_test(values1, values2)
+    elif test != 'bootstrap':
+        raise ValueError("unknown significance test: %r" % test)
+    return ((low, high), pvalue)
+
+
+def _significance_test_worker(args):
+    # Function run in a worker process
+    return significance_test(*args)
+
+
+def compute_tests(results, test, jobs):
+    """Run significance tests of CompareResult objects in parallel.
+
+    Tests are run in worker processes, even if NumPy is available: bootstrap
+    resamples are vectorized in each worker.
+    """
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    if jobs <= 1 or len(results) <= 1:
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    tasks = [(result.ref.benchmark._get_values(),
+              result.changed.benchmark._get_values(),
+              test)
+             for result in results]
+    with ProcessPoolExecutor(max_workers=min(jobs, len(results))) as executor:
+        outcomes = executor.map(_significance_test_worker, tasks)
+        for result, outcome in zip(results, outcomes):
+            result._interval, result._pvalue = outcome
+
+
+def adjust_results_pvalues(results, correction):
+    # Correct p-values of CompareResult objects for multiple comparisons
+    pvalues = [result.pvalue for result in results]
+    adjusted = adjust_pvalues(pvalues, correction)
+    for result, pvalue in zip(results, adjusted):
+        result._adjusted_pvalue = pvalue
+        result._significant = None
+
+
+def check_resampling_correction(ncompare, hint):
+    # The p-value of a resampling test cannot be smaller than
+    # 1 / (resamples + 1): after a correction over too many comparisons,
+    # no change can be significant
+    if ncompare / (BOOTSTRAP_RESAMPLES + 1) >= ALPHA:
+        raise CompareError("p-values of resampling tests cannot be smaller "
+                           "than 1/%s: no change can be significant after "
+                           "a correction over %s comparisons, %s"
+                           % (BOOTSTRAP_RESAMPLES + 1, ncompare, hint))
+
+
+def get_correction_test(test, correction, ncompare):
+    """Get the significance test used to compute p-values.
+
+    With a correction for multiple comparisons, the bootstrap test uses the
+    analytic p-value of the Mann-Whitney U test: resampling p-values are
+    too coarse to be corrected. Raise a CompareError if a permutation test
+    cannot be significant after the correction.
+    """
+    if not correction:
+        return test
+    if test == 'bootstrap':
+        return 'mannwhitney'
+    if test == 'permutation':
+        check_resampling_correction(ncompare, "use --test=mannwhitney")
+    return test
+
+
+def display_method(test, correction, ncompare):
+    text = SIGNIFICANCE_TESTS[test]
+    if correction:
+        text = ("%s, %s over %s comparisons"
+                % (text, CORRECTIONS[correction], ncompare))
+    print("Significance: %s (alpha=%s)" % (text, ALPHA))
 
 
 class CompareData:
@@ -44,6 +147,14 @@ def format_normalized_mean(norm_mean):
         return "%.2fx slower" % norm_mean
 
 
+def format_confidence_interval(norm_mean, interval):
+    low, high = interval
+    if norm_mean < 1.0:
+        # faster uses the inverse
+        low, high = (1.0 / high, 1.0 / low)
+    return "[%.2fx-%.2fx]" % (low, high)
+
+
 def format_geometric_mean(norm_means):
     geo_mean = geometric_mean(norm_means)
     return format_normalized_mean(geo_mean)
@@ -54,23 +165,26 @@ def get_tags_for_result(result):
 
 
 class CompareResult:
-    def __init__(self, ref, changed, min_speed=None):
+    def __init__(self, ref, changed, min_speed=None, test=DEFAULT_TEST):
         # CompareData object
         self.ref = ref
         # CompareData object
         self.changed = changed
         self._min_speed = min_speed
+        self._test = test
         self._significant = None
-        self._t_score = None
+        self._interval = None
+        self._pvalue = None
+        # p-value adjusted for multiple comparisons, see
+        # CompareSuites.adjust_pvalues()
+        self._adjusted_pvalue = None
         self._norm_mean = None
 
     def __repr__(self):
         return '<CompareResult ref=%r changed=%r>' % (self.ref, self.changed)
 
     def _set_significant(self):
-        bench1 = self.ref.benchmark
-        bench2 = self.changed.benchmark
-        self._significant, self._t_score = is_significant_benchs(bench1, bench2)
+        self._significant = (self.decision_pvalue < ALPHA)
 
         if self._min_speed is not None:
             norm_mean = self.norm_mean
@@ -86,11 +200,43 @@ class CompareResult:
             self._set_significant()
         return self._significant
 
+    def _compute_test(self):
+        values1 = self.ref.benchmark._get_values()
+        values2 = self.changed.benchmark._get_values()
+        if self._test == 'mannwhitney':
+            # the p-value is analytic: only compute the bootstrap interval
+            # if it's displayed
+            self._pvalue = mann_whitney_u(values1, values2)[1]
+        else:
+            self._interval, self._pvalue = significance_test(values1,
+                                                             values2,
+                                                             self._test)
+
+    # confidence interval of the normalized mean: (low, high)
     @property
-    def t_score(self):
-        if self._significant is None:
-            self._set_significant()
-        return self._t_score
+    def interval(self):
+        if self._interval is None:
+            if self._test == 'mannwhitney':
+                low, high, pvalue = bootstrap_ratio_test(
+                    self.ref.benchmark._get_values(),
+                    self.changed.benchmark._get_values())
+                self._interval = (low, high)
+            else:
+                self._compute_test()
+        return self._interval
+
+    @property
+    def pvalue(self):
+        if self._pvalue is None:
+            self._compute_test()
+        return self._pvalue
+
+    # p-value used to decide if the change is significant
+    @property
+    def decision_pvalue(self):
+        if self._adjusted_pvalue is not None:
+            return self._adjusted_pvalue
+        return self.pvalue
 
     def _compute_norm_mean(self):
         ref = self.ref.benchmark
@@ -122,23 +268,43 @@ class CompareResult:
         else:
             text = "%s -> %s" % (ref_text, chg_text)
 
-        text = "%s: %s" % (text, format_normalized_mean(self.norm_mean))
+        norm_mean = self.norm_mean
+        text = "%s: %s %s" % (text, format_normalized_mean(norm_mean),
+                              format_confidence_interval(norm_mean,
+                                                         self.interval))
         return text
 
+    def format_latency(self):
+        ref = self.ref.benchmark
+        changed = self.changed.benchmark
+        ref_latency = ref.get_latency()
+        chg_latency = changed.get_latency()
+        if ref_latency is None or chg_latency is None:
+            return []
+
+        percents = (50, 99, 99.9)
+        lines = []
+        for p, ref_value, chg_value in zip(percents,
+                                           ref_latency.percentiles(percents),
+                                           chg_latency.percentiles(percents)):
+            if ref_value:
+                ratio = format_normalized_mean(chg_value / ref_value)
+            else:
+                # percentile in the 0 ns bucket: coarse clock resolution
+                ratio = "n/a"
+            lines.append("p%s: %s -> %s: %s"
+                         % (p, ref.format_value(ref_value),
+                            changed.format_value(chg_value), ratio))
+        return lines
+
     def format(self, verbose=True, show_name=True):
         text = self.oneliner(show_name=show_name, check_significant=False)
         lines = [text]
-
-        # significant?
-        if self.t_score is None:
-            lines.append("ERROR when testing if values are significant")
+        lines.extend(self.format_latency())
 
         if self.significant:
             if verbose:
-                if self.t_score is not None:
-                    lines.append("Significant (t=%.2f)" % self.t_score)
-                else:
-                    lines.append("Significant")
+                lines.append("Significant (p=%.3g)" % self.decision_pvalue)
         else:
             lines.append("Not significant!")
         return lines
@@ -229,6 +395,7 @@ class CompareSuites:
         self.table = args.table
         self.table_format = args.table_format
         self.min_speed = args.min_speed
+        self.correction = getattr(args, 'correction', None)
         self.group_by_speed = args.group_by_speed
         self.verbose = args.verbose
         self.quiet = args.quiet
@@ -236,6 +403,9 @@ class CompareSuites:
         grouped_by_name = self.benchmarks.group_by_name()
         if not grouped_by_name:
             raise CompareError("Benchmark suites have no benchmark in common")
+        ncompare = sum(len(item.benchmarks) - 1 for item in grouped_by_name)
+        self.test = get_correction_test(getattr(args, 'test', DEFAULT_TEST),
+                                        self.correction, ncompare)
 
         # List of CompareResults
         self.all_results = []
@@ -245,6 +415,9 @@ class CompareSuites:
             self.all_results.append(results)
 
         self.show_name = (len(grouped_by_name) > 1)
+        self.compute_tests(getattr(args, 'jobs', 1))
+        if self.correction:
+            self.adjust_pvalues()
 
         self.tags = set()
         for results in self.all_results:
@@ -262,11 +435,25 @@ class CompareSuites:
 
         for item in benchmarks[1:]:
             changed = CompareData(item.filename, item.benchmark)
-            result = CompareResult(ref, changed, min_speed)
+            result = CompareResult(ref, changed, min_speed, self.test)
             results.append(result)
 
         return results
 
+    def iter_results(self):
+        for results in self.all_results:
+            yield from results
+
+    def compute_tests(self, jobs):
+        compute_tests(list(self.iter_results()), self.test, jobs)
+
+    def adjust_pvalues(self):
+        adjust_results_pvalues(list(self.iter_results()), self.correction)
+
+    def display_method(self):
+        display_method(self.test, self.correction,
+                       len(list(self.iter_results())))
+
     @staticmethod
     def display_not_significant(not_significant):
         print("Benchmark hidden because not significant (%s): %s"
@@ -473,12 +660,393 @@ class CompareSuites:
             display_title("All benchmarks:")
         self.compare_suites(self.all_results)
 
+        if self.test != DEFAULT_TEST or self.correction:
+            print()
+            self.display_method()
+
         if not self.quiet:
             self.list_ignored()
 
 
+def rank_suites(means, sems, resamples=RANKING_RESAMPLES, seed=0):
+    """Rank suites by the geometric mean of their benchmark means.
+
+    means[bench][suite] is the mean of a benchmark in a suite and
+    sems[bench][suite] its standard error. Return a list of
+    (suite, norm_mean, confidence) sorted from the fastest to the slowest
+    suite. norm_mean is the geometric mean normalized to the previous suite
+    of the ranking, confidence is the fraction of bootstrap resamples in which
+    the suite is slower than the previous suite. Both are None for the
+    fastest suite.
+
+    Resamples draw benchmarks with replacement and draw the logarithm of the
+    mean of each benchmark from a normal distribution of its relative
+    standard error (sem / mean).
+    """
+    nbench = len(means)
+    nsuite = len(means[0])
+
+    # logs[suite][bench]: comparing sums of logarithms is the same as
+    # comparing geometric means normalized to any suite
+    logs = [[math.log(row[suite]) for row in means]
+            for suite in range(nsuite)]
+    # variances[suite][bench]: variance of the logarithm of the mean
+    variances = [[(sem_row[suite] / row[suite]) ** 2
+                  for row, sem_row in zip(means, sems)]
+                 for suite in range(nsuite)]
+    sum_logs = [math.fsum(suite_logs) for suite_logs in logs]
+    order = sorted(range(nsuite), key=sum_logs.__getitem__)
+
+    # Use a fixed seed to get reproducible results
+    rng = random.Random(seed)
+    benchs = range(nbench)
+    slower = [0] * nsuite
+    for _ in range(resamples):
+        drawn = rng.choices(benchs, k=nbench)
+        # The sum of the logarithms of the drawn benchmarks is a sum of
+        # independent normal variables: draw it directly, rather than
+        # drawing each benchmark
+        resample_logs = [rng.gauss(sum(map(suite_logs.__getitem__, drawn)),
+                                   math.sqrt(sum(map(suite_vars.__getitem__,
+                                                     drawn))))
+                         for suite_logs, suite_vars in zip(logs, variances)]
+        for prev, suite in zip(order, order[1:]):
+            if resample_logs[suite] > resample_logs[prev]:
+                slower[suite] += 1
+
+    ranking = [(order[0], None, None)]
+    for prev, suite in zip(order, order[1:]):
+        norm_mean = math.exp((sum_logs[suite] - sum_logs[prev]) / nbench)
+        ranking.append((suite, norm_mean, slower[suite] / resamples))
+    return ranking
+
+
+class CompareMatrix:
+    """Compare all pairs of benchmark suites."""
+
+    def __init__(self, benchmarks, args):
+        self.benchmarks = benchmarks
+        self.table_format = args.table_format
+        self.correction = args.correction
+
+        grouped_by_name = self.benchmarks.group_by_name()
+        if not grouped_by_name:
+            raise CompareError("Benchmark suites have no benchmark in common")
+        # the correction is computed over all pairs of all benchmarks
+        ncompare = sum(math.comb(len(item.benchmarks), 2)
+                       for item in grouped_by_name)
+        self.test = get_correction_test(args.test, self.correction, ncompare)
+        self.names = [item.filename for item in grouped_by_name[0].benchmarks]
+
+        # List of (name, results) where results is a dict:
+        # (index1, index2) => CompareResult with index1 < index2
+        self.all_results = []
+        for item in grouped_by_name:
+            datas = [CompareData(cmp_item.filename, cmp_item.benchmark)
+                     for cmp_item in item.benchmarks]
+            results = {}
+            for index1, index2 in itertools.combinations(range(len(datas)), 2):
+                results[index1, index2] = CompareResult(datas[index1],
+                                                        datas[index2],
+                                                        args.min_speed,
+                                                        self.test)
+            self.all_results.append((item.name, results))
+
+        compute_tests(list(self.iter_results()), self.test, args.jobs)
+        if self.correction:
+            adjust_results_pvalues(list(self.iter_results()), self.correction)
+
+    def iter_results(self):
+        for name, results in self.all_results:
+            yield from results.values()
+
+    def render_table(self, headers, rows):
+        if self.table_format == 'rest':
+            table = ReSTTable(headers, rows)
+        else:
+            table = MarkDownTable(headers, rows)
+        table.render(print)
+
+    def render_matrix(self, format_cell):
+        # format_cell(index1, index2) formats the suite index2 compared to
+        # the suite index1, index1 < index2
+        headers = [''] + self.names
+        rows = []
+        for row_index, row_name in enumerate(self.names):
+            row = [row_name]
+            for index, name in enumerate(self.names):
+                if index == row_index:
+                    row.append('-')
+                elif row_index < index:
+                    row.append(format_cell(row_index, index, False))
+                else:
+                    row.append(format_cell(index, row_index, True))
+            rows.append(row)
+        self.render_table(headers, rows)
+
+    def compare_benchmark(self, results):
+        def format_cell(index1, index2, inverse):
+            result = results[index1, index2]
+            if not result.significant:
+                return 'not significant'
+            norm_mean = result.norm_mean
+            if inverse:
+                norm_mean = 1.0 / norm_mean
+            return format_normalized_mean(norm_mean)
+
+        self.render_matrix(format_cell)
+
+    def compare_geometric_mean(self):
+        def format_cell(index1, index2, inverse):
+            norm_means = [results[index1, index2].norm_mean
+                          for name, results in self.all_results]
+            geo_mean = geometric_mean(norm_means)
+            if inverse:
+                geo_mean = 1.0 / geo_mean
+            return format_normalized_mean(geo_mean)
+
+        self.render_matrix(format_cell)
+
+    def rank(self):
+        means = []
+        sems = []
+        for item in self.benchmarks.group_by_name():
+            bench_means = []
+            bench_sems = []
+            for cmp_item in item.benchmarks:
+                bench = cmp_item.benchmark
+                bench_means.append(bench.mean())
+                nvalue = bench.get_nvalue()
+                if nvalue >= 2:
+                    bench_sems.append(bench.stdev() / math.sqrt(nvalue))
+                else:
+                    bench_sems.append(0.0)
+            means.append(bench_means)
+            sems.append(bench_sems)
+
+        print("Ranking (fastest first):")
+        print()
+        for rank, (index, norm_mean, confidence) in enumerate(rank_suites(means, sems), 1):
+            text = "%s. %s" % (rank, self.names[index])
+            if norm_mean is not None:
+                text = ("%s: %s than #%s (confidence %.1f%%)"
+                        % (text, format_normalized_mean(norm_mean), rank - 1,
+                           confidence * 100))
+            print(text)
+
+    def compare(self):
+        for name, results in self.all_results:
+            display_title(name)
+            self.compare_benchmark(results)
+            print()
+
+        if len(self.all_results) > 1:
+            display_title('Geometric mean')
+            self.compare_geometric_mean()
+            print()
+
+        self.rank()
+
+        if self.test != DEFAULT_TEST or self.correction:
+            print()
+            display_method(self.test, self.correction,
+                           len(list(self.iter_results())))
+
+
+def _stratified_test_worker(strata):
+    # Function run in a worker process
+    return stratified_bootstrap_ratio_test(strata)
+
+
+def format_group_value(group):
+    if group.get_nvalue() >= 2:
+        mean, stdev = format_values(group.get_unit(),
+                                    (group.mean(), group.stdev()))
+        return "%s +- %s" % (mean, stdev)
+    return format_values(group.get_unit(), (group.mean(),))[0]
+
+
+class CompareHostsResult:
+    """Compare two BenchmarkGroup objects on the hosts in common."""
+
+    def __init__(self, ref, changed, hosts):
+        # BenchmarkGroup objects restricted to hosts
+        self.ref = ref
+        self.changed = changed
+        self.hosts = hosts
+        self.interval = None
+        self.pvalue = None
+        self._adjusted_pvalue = None
+
+    def get_strata(self):
+        return [(self.ref.get_stratum(host)._get_values(),
+                 self.changed.get_stratum(host)._get_values())
+                for host in self.hosts]
+
+    # geometric mean of the normalized means of each host
+    @property
+    def norm_mean(self):
+        return geometric_mean(changed.mean() / ref.mean()
+                              for ref, changed in
+                              ((self.ref.get_stratum(host),
+                                self.changed.get_stratum(host))
+                               for host in self.hosts))
+
+    @property
+    def decision_pvalue(self):
+        if self._adjusted_pvalue is not None:
+            return self._adjusted_pvalue
+        return self.pvalue
+
+    def oneliner(self, ref_name, changed_name):
+        text = ("Mean +- std dev: [%s] %s -> [%s] %s"
+                % (ref_name, format_group_value(self.ref),
+                   changed_name, format_group_value(self.changed)))
+        norm_mean = self.norm_mean
+        return ("%s: %s %s (%s)"
+                % (text, format_normalized_mean(norm_mean),
+                   format_confidence_interval(norm_mean, self.interval),
+                   format_number(len(self.hosts), 'host')))
+
+
+class CompareHosts:
+    """Compare two sides made of results collected on multiple hosts.
+
+    Each benchmark is only compared on the hosts of both sides, with a
+    stratified bootstrap test: values are resampled within each host.
+    """
+
+    def __init__(self, ref_groups, changed_groups, names, args):
+        # names: (reference name, changed name)
+        self.ref_name, self.changed_name = names
+        self.min_speed = args.min_speed
+        self.correction = args.correction
+        self.quiet = args.quiet
+
+        # list of (benchmark name, CompareHostsResult)
+        self.results = []
+        # list of (benchmark name, reference hosts, changed hosts)
+        self.no_common_host = []
+        # hostname => set of benchmark names
+        self.ignored_hosts = ({}, {})
+        for name, ref in ref_groups.items():
+            changed = changed_groups.get(name)
+            if changed is None:
+                continue
+            ref_hosts = ref.get_hosts()
+            changed_hosts = changed.get_hosts()
+            hosts = [host for host in ref_hosts if host in changed_hosts]
+            for index, (side_hosts, other_hosts) in enumerate(
+                ((ref_hosts, changed_hosts), (changed_hosts, ref_hosts))
+            ):
+                for host in side_hosts:
+                    if host not in other_hosts:
+                        self.ignored_hosts[index].setdefault(host, set()).add(name)
+            if not hosts:
+                self.no_common_host.append(name)
+                continue
+            result = CompareHostsResult(ref.select_hosts(hosts),
+                                        changed.select_hosts(hosts), hosts)
+            self.results.append((name, result))
+        if not self.results and not self.no_common_host:
+            raise CompareError("Benchmark suites have no benchmark in common")
+        if self.correction:
+            check_resampling_correction(len(self.results),
+                                        "compare fewer benchmarks "
+                                        "with --benchmark")
+
+        self.compute_tests(args.jobs)
+        if self.correction:
+            adjust_results_pvalues([result for name, result in self.results],
+                                   self.correction)
+
+    def compute_tests(self, jobs):
+        tasks = [result.get_strata() for name, result in self.results]
+        if jobs == 0:
+            jobs = os.cpu_count() or 1
+        jobs = min(jobs, len(tasks))
+        if jobs <= 1:
+            outcomes = map(_stratified_test_worker, tasks)
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                outcomes = list(executor.map(_stratified_test_worker, tasks))
+        for (name, result), (low, high, pvalue) in zip(self.results, outcomes):
+            result.interval = (low, high)
+            result.pvalue = pvalue
+
+    def is_significant(self, result):
+        if result.decision_pvalue >= ALPHA:
+            return False
+        if self.min_speed is not None:
+            norm_mean = result.norm_mean
+            if norm_mean < 1.0:
+                # faster uses the inverse
+                norm_mean = 1.0 / norm_mean
+            if (norm_mean - 1.0) * 100 < self.min_speed:
+                return False
+        return True
+
+    def compare(self):
+        show_name = (len(self.results) > 1)
+        not_significant = []
+        empty_line = False
+        for name, result in self.results:
+            if not self.is_significant(result):
+                not_significant.append(name)
+                continue
+            text = result.oneliner(self.ref_name, self.changed_name)
+            if show_name:
+                text = '%s: %s' % (name, text)
+            print(text)
+            empty_line = True
+
+        if not self.quiet and not_significant:
+            if empty_line:
+                print()
+            CompareSuites.display_not_significant(not_significant)
+            empty_line = True
+
+        norm_means = [result.norm_mean for name, result in self.results]
+        if len(norm_means) >= 2:
+            if empty_line:
+                print()
+            print('Geometric mean: %s' % format_geometric_mean(norm_means))
+            empty_line = True
+
+        if self.correction:
+            if empty_line:
+                print()
+            display_method(DEFAULT_TEST, self.correction, len(self.results))
+            empty_line = True
+
+        if self.quiet:
+            return
+        if self.no_common_host:
+            if empty_line:
+                print()
+            print("Benchmark ignored because it has no host in common (%s): %s"
+                  % (len(self.no_common_host),
+                     ', '.join(self.no_common_host)))
+            empty_line = True
+        for side_name, ignored in zip((self.ref_name, self.changed_name),
+                                      self.ignored_hosts):
+            if not ignored:
+                continue
+            if empty_line:
+                print()
+                empty_line = False
+            for host, names in ignored.items():
+                print("Ignored host %s of %s (%s benchmarks)"
+                      % (host or '(unknown)', side_name, len(names)))
+
+
 def compare_suites(benchmarks, args):
-    CompareSuites(benchmarks, args).compare()
+    if getattr(args, 'matrix', False):
+        CompareMatrix(benchmarks, args).compare()
+    else:
+        CompareSuites(benchmarks, args).compare()
 
 
 def timeit_compare_benchs(name1, bench1, name2, bench2, args):
@@ -137,6 +137,27 @@ def get_isolated_cpus():
     return None
 
 
+def get_usable_cpus():
+    """Get the list of CPUs usable by the current process.
+
+    Return a sorted list of CPU identifiers, or return None if the list
+    cannot be retrieved.
+    """
+    # Availability: some Unix platforms
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+
+    if psutil is not None:
+        proc = psutil.Process()
+        if hasattr(proc, 'cpu_affinity'):
+            return sorted(proc.cpu_affinity())
+
+    cpu_count = get_logical_cpu_count()
+    if not cpu_count:
+        return None
+    return list(range(cpu_count))
+
+
 def set_cpu_affinity(cpus):
     # Availability: some Unix platforms
     if hasattr(os, 'sched_setaffinity'):
@@ -99,6 +99,14 @@ def format_number(number, unit=None, units=None):
         return '%s %s' % (number, unit)
 
 
+def format_rate(rate, unit='call'):
+    # Number of operations per second, ex: "12.3k calls/sec"
+    for prefix, factor in (('G', 1e9), ('M', 1e6), ('k', 1e3)):
+        if rate >= factor:
+            return '%.1f%s %ss/sec' % (rate / factor, prefix, unit)
+    return '%.1f %ss/sec' % (rate, unit)
+
+
 def format_integers(numbers):
     return tuple(format_number(number) for number in numbers)
 
@@ -0,0 +1,142 @@
+import math
+import statistics
+
+from pyperf._bench import Benchmark
+
+
+class BenchmarkGroup:
+    """Runs of a benchmark collected on multiple hosts.
+
+    A Benchmark cannot mix runs of different hosts: runs are stored in
+    strata, one Benchmark per hostname. Estimates give the same weight to
+    each host.
+    """
+
+    def __init__(self, benchmarks=()):
+        # hostname => Benchmark
+        self._strata = {}
+        for bench in benchmarks:
+            self.add_benchmark(bench)
+
+    def __repr__(self):
+        return ('<BenchmarkGroup %r hosts=%s>'
+                % (self.get_name(), self.get_hosts()))
+
+    def get_name(self):
+        for bench in self._strata.values():
+            return bench.get_name()
+        return None
+
+    def get_unit(self):
+        for bench in self._strata.values():
+            return bench.get_unit()
+        return None
+
+    def add_run(self, run):
+        name = self.get_name()
+        if name is not None and run._get_name() != name:
+            raise ValueError("incompatible benchmark name: current=%r, run=%r"
+                             % (name, run._get_name()))
+
+        hostname = run._metadata.get('hostname', None)
+        bench = self._strata.get(hostname)
+        if bench is not None:
+            bench.add_run(run)
+            return
+
+        bench = Benchmark([run])
+        unit = self.get_unit()
+        if unit is not None and bench.get_unit() != unit:
+            raise ValueError("incompatible benchmark, metadata unit is "
+                             "different: current=%s, run=%s"
+                             % (unit, bench.get_unit()))
+        self._strata[hostname] = bench
+
+    def add_benchmark(self, benchmark):
+        if not isinstance(benchmark, Benchmark):
+            raise TypeError("expected Benchmark, got %s"
+                            % type(benchmark).__name__)
+        for run in benchmark.get_runs():
+            self.add_run(run)
+
+    def get_hosts(self):
+        return list(self._strata)
+
+    def get_stratum(self, hostname):
+        return self._strata[hostname]
+
+    def get_strata(self):
+        """Get the list of (hostname, Benchmark)."""
+        return list(self._strata.items())
+
+    def select_hosts(self, hostnames):
+        """Create a group which only contains the specified hosts."""
+        group = BenchmarkGroup()
+        group._strata = {hostname: self._strata[hostname]
+                         for hostname in hostnames}
+        return group
+
+    def get_nrun(self):
+        return sum(bench.get_nrun() for bench in self._strata.values())
+
+    def get_nvalue(self):
+        return sum(bench.get_nvalue() for bench in self._strata.values())
+
+    def _get_strata_values(self):
+        return [bench._get_values() for bench in self._strata.values()
+                if bench.get_nvalue()]
+
+    def mean(self):
+        """Pooled mean: mean of the means of each host."""
+        means = [statistics.fmean(values)
+                 for values in self._get_strata_values()]
+        if not means:
+            raise ValueError("the group has no value")
+        return statistics.fmean(means)
+
+    def variance_components(self):
+        """Get (within, between) variances.
+
+        within is the pooled variance of values on the same host, between
+        is the variance of the means of hosts which is not explained by the
+        within-host variance (method of moments).
+        """
+        strata = self._get_strata_values()
+        if not strata:
+            raise ValueError("the group has no value")
+
+        sum_squares = 0.0
+        ddof = 0
+        for values in strata:
+            if len(values) >= 2:
+                sum_squares += statistics.variance(values) * (len(values) - 1)
+                ddof += len(values) - 1
+        within = sum_squares / ddof if ddof else 0.0
+
+        if len(strata) < 2:
+            return (within, 0.0)
+        means = [statistics.fmean(values) for values in strata]
+        mean_inv_n = statistics.fmean(1.0 / len(values) for values in strata)
+        between = max(statistics.variance(means) - within * mean_inv_n, 0.0)
+        return (within, between)
+
+    def stdev(self):
+        """Standard deviation of a value measured on a random host."""
+        within, between = self.variance_components()
+        return math.sqrt(within + between)
+
+
+def group_suites(suites):
+    """Group benchmarks of suites by name.
+
+    Return a dict: name => BenchmarkGroup.
+    """
+    groups = {}
+    for suite in suites:
+        for bench in suite:
+            name = bench.get_name()
+            group = groups.get(name)
+            if group is None:
+                group = groups[name] = BenchmarkGroup()
+            group.add_benchmark(bench)
+    return groups
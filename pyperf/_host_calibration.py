@@ -0,0 +1,257 @@
+"""
+Host calibration: speed of the host measured by a reference workload.
+
+The reference workload is a fixed set of small pure Python loops. The host
+calibration is the geometric mean of their timings in seconds: a host twice
+as fast gets a calibration twice as small. It is cached per host and per
+Python executable, and stored in the host_calibration metadata of runs
+(Runner --calibrate-host option).
+
+Results measured on different hosts can then be normalized: values are
+multiplied by the ratio of host calibrations. The reference workload runs
+on the Python used by the benchmark, so the normalization only makes sense
+to compare results of the same Python on different hosts.
+"""
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+
+from pyperf._utils import get_cache_dir
+
+
+CACHE_FILENAME = 'host_calibration.json'
+# Measure again the host calibration after 7 days
+CACHE_MAX_AGE = 7 * 24 * 3600
+# Number of times each workload is run: keep the minimum timing
+REPEAT = 5
+
+
+def _workload_int(loops):
+    x = 0
+    for i in range(loops):
+        x = (x + i * 7) % 1000003
+    return x
+
+
+def _workload_float(loops):
+    x = 0.5
+    for i in range(loops):
+        x = x * 0.999999 + 1.0 / (i + 1)
+    return x
+
+
+def _workload_str(loops):
+    parts = []
+    for i in range(loops):
+        parts.append('%s:%s' % (i, 'abc'))
+    return len(','.join(parts).upper())
+
+
+def _workload_dict(loops):
+    data = {}
+    for i in range(loops):
+        data[str(i)] = i
+    return sum(data[str(i)] for i in range(loops))
+
+
+def _workload_call(loops):
+    def add(x, y):
+        return x + y
+
+    x = 0
+    for i in range(loops):
+        x = add(x, i)
+    return x
+
+
+def _workload_sort(loops):
+    rng = random.Random(0)
+    values = [rng.random() for _ in range(loops)]
+    values.sort()
+    return values[0]
+
+
+# (name, function, loops): each workload takes a few milliseconds
+WORKLOADS = (
+    ('int', _workload_int, 100_000),
+    ('float', _workload_float, 100_000),
+    ('str', _workload_str, 50_000),
+    ('dict', _workload_dict, 30_000),
+    ('call', _workload_call, 100_000),
+    ('sort', _workload_sort, 50_000),
+)
+
+
+def measure_host_calibration(repeat=REPEAT):
+    """Run the reference workload: return the host calibration in seconds."""
+    timings = []
+    for name, func, loops in WORKLOADS:
+        best = None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            func(loops)
+            dt = time.perf_counter() - t0
+            if best is None or dt < best:
+                best = dt
+        timings.append(best)
+    return math.exp(math.fsum(map(math.log, timings)) / len(timings))
+
+
+def _cache_key():
+    # Timings depend on the host and on the Python executable
+    return ';'.join((platform.node(), platform.machine(),
+                     sys.executable, sys.version.split()[0]))
+
+
+def _read_cache(filename):
+    try:
+        with open(filename, encoding='utf-8') as fp:
+            cache = json.load(fp)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cache, dict):
+        return {}
+    return cache
+
+
+def _write_cache(filename, cache):
+    # Write a temporary file and rename it to not write a truncated file
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    tmp = '%s.%s.tmp' % (filename, os.getpid())
+    with open(tmp, 'w', encoding='utf-8') as fp:
+        json.dump(cache, fp, indent=4, sort_keys=True)
+        fp.write('\n')
+    os.replace(tmp, filename)
+
+
+def get_host_calibration(force=False):
+    """Get the host calibration in seconds.
+
+    Read it from the cache, or measure it if it's not cached, if the cache
+    is older than CACHE_MAX_AGE, or if force is true.
+    """
+    filename = os.path.join(get_cache_dir(), CACHE_FILENAME)
+    key = _cache_key()
+    cache = _read_cache(filename)
+    now = time.time()
+
+    entry = cache.get(key)
+    if (not force and isinstance(entry, dict)
+       and 0 <= now - entry.get('timestamp', -1) <= CACHE_MAX_AGE):
+        return entry['calibration']
+
+    calibration = measure_host_calibration()
+    cache[key] = {'calibration': calibration, 'timestamp': now}
+    try:
+        _write_cache(filename, cache)
+    except OSError:
+        # the cache is an optimization
+        pass
+    return calibration
+
+
+def get_python_host_calibration(python, env=None):
+    """Get the host calibration of a Python executable.
+
+    Run get_host_calibration() in a child process if python is not the
+    current Python executable. Raise a RuntimeError if the child process
+    fails.
+    """
+    if python == sys.executable:
+        return get_host_calibration()
+
+    import subprocess
+
+    code = ('from pyperf._host_calibration import get_host_calibration; '
+            'print(repr(get_host_calibration()))')
+    proc = subprocess.run([python, '-c', code], env=env,
+                          stdout=subprocess.PIPE, text=True)
+    if proc.returncode:
+        raise RuntimeError("%s failed to measure the host calibration "
+                           "with exit code %s" % (python, proc.returncode))
+    return float(proc.stdout)
+
+
+def get_benchmark_calibration(bench):
+    """Get the mean host calibration of the runs of a benchmark.
+
+    Raise a ValueError if a run has no host_calibration metadata.
+    """
+    calibrations = []
+    for run in bench.get_runs():
+        if not run._values:
+            # calibration run
+            continue
+        calibration = run._metadata.get('host_calibration')
+        if calibration is None:
+            raise ValueError("benchmark %r has no host_calibration metadata: "
+                             "run benchmarks with --calibrate-host"
+                             % bench.get_name())
+        calibrations.append(calibration)
+    if not calibrations:
+        raise ValueError("benchmark %r has no value" % bench.get_name())
+    return math.fsum(calibrations) / len(calibrations)
+
+
+def normalize_benchmark(bench, calibration):
+    """Scale values of bench as if they were measured on a host
+    of the specified calibration.
+
+    Only benchmarks of durations are normalized.
+    """
+    if bench.get_unit() != 'second':
+        return
+
+    get_benchmark_calibration(bench)
+    runs = []
+    for run in bench.get_runs():
+        if run._values:
+            factor = calibration / run._metadata['host_calibration']
+            run = run._replace(values=[value * factor
+                                       for value in run._values])
+        runs.append(run)
+    bench._replace_runs(runs)
+
+
+def normalize_suites(suites):
+    """Normalize benchmarks of suites to the host of the first suite."""
+    ref_suite = suites[0]
+    for suite in suites[1:]:
+        for bench in suite:
+            try:
+                ref_bench = ref_suite.get_benchmark(bench.get_name())
+            except KeyError:
+                continue
+            if ref_bench.get_unit() != 'second':
+                continue
+            calibration = get_benchmark_calibration(ref_bench)
+            normalize_benchmark(bench, calibration)
+
+
+def normalize_history(entries, calibrations):
+    """Normalize HistoryEntry objects to the host of the last entry.
+
+    calibrations is the list of host calibrations of entries.
+    """
+    last = calibrations[-1]
+    normalized = []
+    for entry, calibration in zip(entries, calibrations):
+        if entry.nvalue and entry.unit == 'second':
+            factor = last / calibration
+            entry = entry._replace(**{
+                field: getattr(entry, field) * factor
+                for field in ('mean', 'stdev', 'median', 'min', 'max')
+                if getattr(entry, field) is not None})
+        normalized.append(entry)
+    return normalized
+
+
+def cmd_calibrate_host(args):
+    from pyperf._formatter import format_timedelta
+
+    calibration = get_host_calibration(force=args.force)
+    print("Host calibration: %s" % format_timedelta(calibration))
@@ -0,0 +1,167 @@
+"""
+"pyperf importtime" command: benchmark the import time of each module
+using the "python -X importtime" command line option.
+"""
+import collections
+import os.path
+import re
+import subprocess
+import sys
+
+import pyperf
+from pyperf._cli import format_result
+from pyperf._utils import abs_executable, create_environ, popen_communicate
+
+
+# Written into stderr before importing modules, to ignore modules imported
+# at Python startup
+MARKER = 'pyperf importtime: start'
+
+# import time: self [us] | cumulative | imported package
+_IMPORTTIME_REGEX = re.compile(r'^import time:\s*([0-9]+)\s*\|'
+                               r'\s*([0-9]+)\s*\|\s*(\S+)\s*$')
+
+
+def importtime_code(modules):
+    code = ['import sys',
+            'sys.stderr.write(%r)' % (MARKER + '\n'),
+            'sys.stderr.flush()']
+    code.extend('import %s' % module for module in modules)
+    return '; '.join(code)
+
+
+def parse_importtime(output, cumulative=False):
+    """Parse the -X importtime output.
+
+    Return a dict: module name => import time in seconds.
+    """
+    timings = {}
+    started = False
+    for line in output.splitlines():
+        if not started:
+            started = (line.rstrip() == MARKER)
+            continue
+
+        match = _IMPORTTIME_REGEX.match(line)
+        if match is None:
+            continue
+        self_us, cumulative_us, name = match.groups()
+        if cumulative:
+            timings[name] = int(cumulative_us) / 1e6
+        else:
+            timings[name] = int(self_us) / 1e6
+
+    if not started:
+        raise ValueError("-X importtime output marker not found")
+    return timings
+
+
+class ImportTime:
+    def __init__(self, args):
+        self.args = args
+        self.python = abs_executable(args.python)
+        self.cmd = [self.python, '-X', 'importtime',
+                    '-c', importtime_code(args.modules)]
+        self.env = create_environ(args.inherit_environ, args.locale,
+                                  args.copy_env)
+
+    def run_process(self):
+        proc = subprocess.Popen(self.cmd,
+                                stdout=subprocess.DEVNULL,
+                                stderr=subprocess.PIPE,
+                                universal_newlines=True,
+                                env=self.env)
+        stderr = popen_communicate(proc)[1]
+        if proc.returncode:
+            sys.stderr.write(stderr)
+            print("ERROR: %s failed with exit code %s"
+                  % (' '.join(self.cmd[:3]), proc.returncode))
+            sys.exit(1)
+        return parse_importtime(stderr, self.args.cumulative)
+
+    def create_metadata(self):
+        from pyperf._collect_metadata import collect_metadata
+
+        # Don't collect metadata of the running Python: modules are imported
+        # by the PYTHON program
+        metadata = collect_metadata(process=False)
+        metadata['python_executable'] = self.python
+        metadata['unit'] = 'second'
+        metadata['loops'] = 1
+        metadata['importtime'] = ('cumulative' if self.args.cumulative
+                                  else 'self')
+        metadata['importtime_modules'] = ' '.join(self.args.modules)
+        return metadata
+
+    def create_suite(self):
+        args = self.args
+        metadata = self.create_metadata()
+
+        # module name => list of Run objects
+        runs = collections.defaultdict(list)
+        # modules with a value of zero: import time below the resolution
+        # of -X importtime (1 microsecond)
+        ignored = set()
+        for process in range(args.processes):
+            warmups = collections.defaultdict(list)
+            values = collections.defaultdict(list)
+            for index in range(args.warmups + args.values):
+                timings = self.run_process()
+                if index < args.warmups:
+                    samples = warmups
+                else:
+                    samples = values
+                for name, value in timings.items():
+                    samples[name].append(value)
+
+            for name, module_values in values.items():
+                if not all(module_values):
+                    ignored.add(name)
+                    continue
+                module_warmups = [(1, value)
+                                  for value in warmups.get(name, ())]
+                run = pyperf.Run(module_values,
+                                 warmups=module_warmups,
+                                 metadata=dict(metadata, name=name),
+                                 collect_metadata=False)
+                runs[name].append(run)
+
+            if not args.quiet:
+                print(".", end='')
+                sys.stdout.flush()
+        if not args.quiet:
+            print()
+
+        benchmarks = [pyperf.Benchmark(module_runs)
+                      for name, module_runs in runs.items()
+                      if name not in ignored]
+        if not benchmarks:
+            print("ERROR: no module import time measured")
+            sys.exit(1)
+        return (pyperf.BenchmarkSuite(benchmarks), ignored)
+
+    def main(self):
+        args = self.args
+        if args.output and os.path.exists(args.output):
+            print("ERROR: The JSON file %r already exists" % args.output)
+            sys.exit(1)
+
+        suite, ignored = self.create_suite()
+
+        benchmarks = sorted(suite, key=lambda bench: bench.mean(),
+                            reverse=True)
+        for bench in benchmarks:
+            print("%s: %s" % (bench.get_name(), format_result(bench)))
+        if ignored and not args.quiet:
+            print()
+            print("Ignored %s modules: import time below 1 us"
+                  % len(ignored))
+
+        if args.append:
+            pyperf.add_runs(args.append, suite)
+        if args.output:
+            suite.dump(args.output)
+
+
+def cmd_importtime(args):
+    ImportTime(args).main()
@@ -0,0 +1,143 @@
+"""
+Latency histogram used by the --latency mode of Runner.
+
+The histogram is log-linear (HDR histogram): values are integers in
+nanoseconds, values smaller than 2 ** SUB_BUCKET_BITS are stored exactly, and
+larger values are stored in buckets whose width grows with the value, so the
+relative error stays below 1 / 2 ** (SUB_BUCKET_BITS - 1). Only non-empty
+buckets are stored, so the memory usage is bounded by the number of buckets,
+not by the number of recorded values.
+"""
+import math
+
+
+SUB_BUCKET_BITS = 8
+_HALF_SUB_BUCKET_BITS = SUB_BUCKET_BITS - 1
+_SUB_BUCKET_COUNT = 2 ** SUB_BUCKET_BITS
+
+
+def bucket_index(value):
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    if shift <= 0:
+        return value
+    return (shift << _HALF_SUB_BUCKET_BITS) + (value >> shift)
+
+
+def bucket_range(index):
+    """Get the (lowest, highest) values of a bucket in nanoseconds."""
+    if index < _SUB_BUCKET_COUNT:
+        return (index, index)
+    shift = (index >> _HALF_SUB_BUCKET_BITS) - 1
+    lowest = (index - (shift << _HALF_SUB_BUCKET_BITS)) << shift
+    return (lowest, lowest + (1 << shift) - 1)
+
+
+def _bucket_value(index):
+    # middle of the bucket, in seconds
+    lowest, highest = bucket_range(index)
+    return (lowest + highest) * 0.5e-9
+
+
+class LatencyHistogram:
+    __slots__ = ('_counts', '_sorted')
+
+    def __init__(self, counts=None):
+        # bucket index => number of recorded values
+        if counts is not None:
+            self._counts = dict(counts)
+        else:
+            self._counts = {}
+        self._sorted = None
+
+    def __repr__(self):
+        return '<LatencyHistogram count=%s>' % self.get_count()
+
+    def __eq__(self, other):
+        if not isinstance(other, LatencyHistogram):
+            return NotImplemented
+        return self._counts == other._counts
+
+    def record(self, value):
+        # value: duration in nanoseconds (int)
+        shift = value.bit_length() - SUB_BUCKET_BITS
+        if shift > 0:
+            value = (shift << _HALF_SUB_BUCKET_BITS) + (value >> shift)
+        counts = self._counts
+        counts[value] = counts.get(value, 0) + 1
+        self._sorted = None
+
+    def merge(self, other):
+        counts = self._counts
+        for index, count in other._counts.items():
+            counts[index] = counts.get(index, 0) + count
+        self._sorted = None
+
+    def _get_sorted(self):
+        if self._sorted is None:
+            self._sorted = sorted(self._counts.items())
+        return self._sorted
+
+    def get_count(self):
+        return sum(self._counts.values())
+
+    def get_buckets(self):
+        """List of (value, count) tuples sorted by value in seconds."""
+        return [(_bucket_value(index), count)
+                for index, count in self._get_sorted()]
+
+    def min(self):
+        index = self._get_sorted()[0][0]
+        return bucket_range(index)[0] * 1e-9
+
+    def max(self):
+        index = self._get_sorted()[-1][0]
+        return bucket_range(index)[1] * 1e-9
+
+    def mean(self):
+        total = math.fsum(_bucket_value(index) * count
+                          for index, count in self._counts.items())
+        return total / self.get_count()
+
+    def percentiles(self, percents):
+        items = self._get_sorted()
+        if not items:
+            raise ValueError("empty histogram")
+        count = self.get_count()
+
+        results = []
+        for p in percents:
+            if not (0 <= p <= 100):
+                raise ValueError("p must be in the range [0; 100]")
+            # nearest-rank method
+            rank = max(int(math.ceil(p * count / 100.0)), 1)
+            seen = 0
+            for index, bucket_count in items:
+                seen += bucket_count
+                if seen >= rank:
+                    break
+            if p == 100:
+                results.append(bucket_range(index)[1] * 1e-9)
+            else:
+                results.append(_bucket_value(index))
+        return results
+
+    def percentile(self, p):
+        return self.percentiles((p,))[0]
+
+    def _as_json(self):
+        buckets = [list(item) for item in self._get_sorted()]
+        return {'sub_bucket_bits': SUB_BUCKET_BITS, 'buckets': buckets}
+
+    @classmethod
+    def _json_load(cls, data):
+        if data.get('sub_bucket_bits') != SUB_BUCKET_BITS:
+            raise ValueError("unsupported latency histogram precision: %r"
+                             % data.get('sub_bucket_bits'))
+        counts = {}
+        for index, count in data['buckets']:
+            if not (isinstance(index, int) and index >= 0
+                    and isinstance(count, int) and count >= 1):
+                raise ValueError("invalid latency histogram bucket: %r"
+                                 % ([index, count],))
+            counts[index] = count
+        return cls(counts)
@@ -1,9 +1,13 @@
+import contextlib
+import os
+import select
 import sys
 import subprocess
 
 from pyperf._bench import _load_suite_from_pipe
 from pyperf._cli import format_run
 from pyperf._formatter import format_number
+from pyperf._shard import format_shard
 from pyperf._utils import MS_WINDOWS, create_environ, create_pipe, popen_killer
 
 
@@ -37,6 +41,10 @@ class Manager:
         self.next_run = 'loops'
         self.calibrate_loops = int(not self.args.loops)
         self.calibrate_warmups = int(self.args.warmups is None)
+        # CPU list (str) passed to the --affinity option of workers
+        self.affinity = self.args.affinity
+        # Extra command line options passed to workers
+        self.worker_args = []
 
     def worker_cmd(self, calibrate_loops, calibrate_warmups, wpipe):
         args = self.args
@@ -61,12 +69,19 @@ class Manager:
                 cmd.append('--recalibrate-warmups')
         if args.verbose:
             cmd.append('-' + 'v' * args.verbose)
-        if args.affinity:
-            cmd.append('--affinity=%s' % args.affinity)
+        if self.affinity:
+            cmd.append('--affinity=%s' % self.affinity)
         if args.tracemalloc:
             cmd.append('--tracemalloc')
         if args.track_memory:
             cmd.append('--track-memory')
+        if args.latency:
+            cmd.append('--latency')
+        if args.calibrate_host:
+            cmd.extend(('--calibrate-host',
+                        '--host-calibration=%r' % self.get_host_calibration()))
+        if args.shard:
+            cmd.append('--shard=%s' % format_shard(args.shard))
 
         if args.profile:
             cmd.extend(['--profile', args.profile])
@@ -78,11 +93,29 @@ class Manager:
             for hook in args.hook:
                 cmd.extend(['--hook', hook])
 
+        cmd.extend(self.worker_args)
+
         if self.runner._add_cmdline_args:
             self.runner._add_cmdline_args(cmd, args)
 
         return cmd
 
+    def get_host_calibration(self):
+        # Measure the host calibration once, before spawning the first
+        # worker: workers measuring it simultaneously (ex: parallel
+        # workers with a cold cache) would get and cache a skewed value
+        calibrations = self.runner._host_calibrations
+        calibration = calibrations.get(self.python)
+        if calibration is None:
+            from pyperf._host_calibration import get_python_host_calibration
+
+            env = create_environ(self.args.inherit_environ,
+                                 self.args.locale,
+                                 self.args.copy_env)
+            calibration = get_python_host_calibration(self.python, env)
+            calibrations[self.python] = calibration
+        return calibration
+
     def spawn_worker(self, calibrate_loops, calibrate_warmups):
         env = create_environ(self.args.inherit_environ,
                              self.args.locale,
@@ -250,3 +283,135 @@ class Manager:
         self.args.warmups = old_warmups
         self.args.loops = old_loops
         return self.bench
+
+
+class ParallelManager(Manager):
+    """
+    Manager process which spawns groups of worker processes running the
+    benchmark simultaneously, each worker being pinned to a different CPU,
+    to measure how the throughput scales with the number of busy CPUs.
+
+    The number of loops and warmups is calibrated once in a single worker
+    process, and then reused by all parallelism levels.
+    """
+    def __init__(self, runner, levels, cpus):
+        Manager.__init__(self, runner)
+        self.levels = levels
+        self.cpus = cpus
+
+    def calibrate(self):
+        while self.calibrate_loops or self.calibrate_warmups:
+            worker_bench, run = self.create_worker_bench()
+            self.display_run(worker_bench, run)
+            self.handle_calibration(run)
+            self.choose_next_run()
+
+    def wait_ready(self, rpipe, workers):
+        # Each worker writes one byte into the pipe when it is ready
+        nready = 0
+        while nready < len(workers):
+            if not MS_WINDOWS:
+                ready, _, _ = select.select([rpipe.fd], [], [], 1.0)
+                if not ready:
+                    for cmd, proc, _ in workers:
+                        if proc.poll() is not None:
+                            raise RuntimeError("%s exited with exit code %s "
+                                               "before the benchmark start"
+                                               % (cmd[0], proc.returncode))
+                    continue
+            data = os.read(rpipe.fd, len(workers) - nready)
+            if not data:
+                raise RuntimeError("worker processes exited before "
+                                   "the benchmark start")
+            nready += len(data)
+
+    def spawn_workers(self, parallel):
+        env = create_environ(self.args.inherit_environ,
+                             self.args.locale,
+                             self.args.copy_env)
+
+        ready_rpipe, ready_wpipe = create_pipe()
+        start_rpipe, start_wpipe = create_pipe()
+        workers = []
+        suites = []
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(ready_rpipe)
+            stack.enter_context(start_wpipe)
+
+            with ready_wpipe, start_rpipe:
+                self.worker_args = [
+                    '--parallel=%s' % parallel,
+                    '--parallel-ready=%s' % ready_wpipe.to_subprocess(),
+                    '--parallel-start=%s' % start_rpipe.to_subprocess()]
+                for cpu in self.cpus[:parallel]:
+                    rpipe, wpipe = create_pipe()
+                    stack.enter_context(rpipe)
+                    with wpipe:
+                        warg = wpipe.to_subprocess()
+                        self.affinity = str(cpu)
+                        cmd = self.worker_cmd(0, 0, warg)
+
+                        kw = {}
+                        if MS_WINDOWS:
+                            kw['close_fds'] = False
+                        else:
+                            kw['pass_fds'] = [wpipe.fd, ready_wpipe.fd,
+                                              start_rpipe.fd]
+
+                        proc = subprocess.Popen(cmd, env=env, **kw)
+                    stack.enter_context(popen_killer(proc))
+                    workers.append((cmd, proc, rpipe))
+
+            # Start all workers at once: closing the pipe makes their
+            # blocking read return
+            self.wait_ready(ready_rpipe, workers)
+            start_wpipe.close()
+
+            for cmd, proc, rpipe in workers:
+                try:
+                    bench_json = rpipe.read_text(timeout=self.args.timeout)
+                    exitcode = proc.wait(timeout=EXIT_TIMEOUT)
+                except TimeoutError as exc:
+                    print(exc)
+                    sys.exit(124)
+
+                if exitcode:
+                    raise RuntimeError("%s failed with exit code %s"
+                                       % (cmd[0], exitcode))
+                suites.append(_load_suite_from_pipe(bench_json))
+
+        return suites
+
+    def create_parallel_bench(self, parallel):
+        # Use about the same number of worker processes for each level
+        nround = max(self.need_nprocess // parallel, 1)
+        for _ in range(nround):
+            for suite in self.spawn_workers(parallel):
+                worker_bench = suite.get_benchmarks()[0]
+                if self.bench is not None:
+                    self.bench.add_runs(worker_bench)
+                else:
+                    self.bench = worker_bench
+                self.display_run(worker_bench, worker_bench._runs[0])
+        return self.bench
+
+    def create_benchmarks(self):
+        old_warmups = self.args.warmups
+        old_loops = self.args.loops
+        if self.args.warmups is None:
+            self.args.warmups = 1
+
+        # calibration runs are stored in the benchmark of the first level
+        self.worker_args = ['--parallel=%s' % self.levels[0]]
+        self.calibrate()
+
+        benchmarks = []
+        for parallel in self.levels:
+            benchmarks.append(self.create_parallel_bench(parallel))
+            self.bench = None
+
+        self.affinity = self.args.affinity
+        self.worker_args = []
+        self.args.warmups = old_warmups
+        self.args.loops = old_loops
+        return benchmarks
@@ -1,4 +1,6 @@
 import collections
+import collections.abc
+import sys
 
 from pyperf._formatter import (format_number, format_seconds, format_filesize,
                                UNIT_FORMATTERS)
@@ -8,10 +10,87 @@ METADATA_VALUE_TYPES = (int, str, float)
 NUMBER_TYPES = (int, float)
 
 
+_MISSING = object()
+
+
+class _SharedMetadata(collections.abc.Mapping):
+    """Read-only metadata of a run.
+
+    Metadata common to the runs of a benchmark are shared by all runs,
+    overridden by the metadata specific to the run.
+    """
+
+    __slots__ = ('_common', '_own')
+
+    def __init__(self, common, own=None):
+        self._common = common
+        self._own = own or {}
+
+    def __getitem__(self, key):
+        own = self._own
+        if key in own:
+            return own[key]
+        return self._common[key]
+
+    def get(self, key, default=None):
+        value = self._own.get(key, _MISSING)
+        if value is _MISSING:
+            return self._common.get(key, default)
+        return value
+
+    def __contains__(self, key):
+        return (key in self._own or key in self._common)
+
+    def __iter__(self):
+        own = self._own
+        for key in self._common:
+            if key not in own:
+                yield key
+        yield from own
+
+    def __len__(self):
+        common = self._common
+        return len(common) + sum(1 for key in self._own if key not in common)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+def _shared_metadata(common, own):
+    # Create the metadata of a run: common and own must already be parsed
+    if not common:
+        return own or {}
+    return _SharedMetadata(common, own)
+
+
 def _common_metadata(metadatas):
     if not metadatas:
         return {}
 
+    common = metadatas[0]
+    if (isinstance(common, _SharedMetadata)
+       and all(isinstance(metadata, _SharedMetadata)
+               and metadata._common is common._common
+               for metadata in metadatas)):
+        # Fast path: runs share the same common metadata, only compare
+        # metadata specific to each run
+        common = common._common
+        keys = set()
+        for run_metadata in metadatas:
+            keys.update(run_metadata._own)
+
+        metadata = dict(common)
+        first = metadatas[0]
+        for key in keys:
+            value = first.get(key, _MISSING)
+            if (value is _MISSING
+               or any(run_metadata.get(key, _MISSING) != value
+                      for run_metadata in metadatas[1:])):
+                metadata.pop(key, None)
+            else:
+                metadata[key] = value
+        return metadata
+
     metadata = dict(metadatas[0])
     for run_metadata in metadatas[1:]:
         for key in set(metadata) - set(run_metadata):
@@ -74,8 +153,10 @@ TAGS = _MetadataInfo(format_generic, (list,), is_tags, 'tag')
 METADATA = {
     'loops': LOOPS,
     'inner_loops': LOOPS,
+    'parallel': LOOPS,
 
     'duration': SECONDS,
+    'host_calibration': SECONDS,
     'uptime': SECONDS,
     'load_avg_1min': _MetadataInfo(format_system_load, NUMBER_TYPES, is_positive, None),
 
@@ -127,11 +208,21 @@ def parse_metadata(metadata):
                                  "in metadata values: %r" % value)
             if not value:
                 raise ValueError("metadata %r value is empty" % name)
+            # metadata are repeated in runs and benchmarks: share strings
+            value = sys.intern(value)
         check_metadata(name, value)
-        result[name] = value
+        result[sys.intern(name)] = value
     return result
 
 
+def _trusted_metadata(metadata):
+    # Metadata written by pyperf: skip checks of parse_metadata(),
+    # only share strings
+    intern = sys.intern
+    return {intern(name): (intern(value) if type(value) is str else value)
+            for name, value in metadata.items()}
+
+
 def format_metadata(name, value):
     info = get_metadata_info(name)
     return info.formatter(value)
@@ -168,4 +259,6 @@ def _exclude_common_metadata(metadata, common_metadata):
     if common_metadata:
         metadata = {key: value for key, value in metadata.items()
                     if key not in common_metadata}
+    elif not isinstance(metadata, dict):
+        metadata = dict(metadata)
     return metadata
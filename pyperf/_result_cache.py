@@ -0,0 +1,342 @@
+"""
+Result cache: reuse the runs of unchanged benchmarks (Runner --result-cache
+option).
+
+The cache key of a benchmark is a SHA-256 hash of:
+
+* the benchmark source: bytecode and constants of the benchmarked function
+  (and of nested code objects), timeit statements or command line;
+* the values of the module globals, closure variables, default arguments and
+  arguments used by the benchmarked function, and the code of the functions
+  that it uses;
+* the benchmark name, metadata and inner loops;
+* Runner options which change the measure (--processes, --loops, ...);
+* the interpreter build which runs workers and the host.
+
+The shard (--shard option) doesn't change the measure: cached runs of a
+benchmark are reused by other shard configurations, and their shard metadata
+is replaced with the current shard.
+
+Only values of builtin types (None, bool, int, float, str, bytes, and
+containers of them) are hashed: a benchmark using another object, like an
+instance of a class, is not cached, since its repr() is not stable. Modules,
+classes, builtin functions and functions of the standard library and of
+installed packages are hashed by name. Entries older than the maximum age
+are removed.
+"""
+import functools
+import hashlib
+import os
+import os.path
+import platform
+import sys
+import time
+import types
+
+import pyperf
+from pyperf._utils import get_cache_dir
+
+
+# Entries are removed after 7 days by default
+DEFAULT_MAX_AGE = 7 * 24 * 3600
+# Runner options which change results
+KEY_OPTIONS = ('rigorous', 'fast', 'debug_single_value',
+               'processes', 'values', 'warmups', 'loops', 'min_time',
+               'calibrate_loops', 'recalibrate_loops',
+               'calibrate_warmups', 'recalibrate_warmups',
+               'affinity', 'inherit_environ', 'copy_env', 'locale',
+               'tracemalloc', 'track_memory', 'latency', 'parallel',
+               'calibrate_host', 'hook', 'timeout')
+# Types hashed by their repr()
+LITERAL_TYPES = (type(None), bool, int, float, complex, str, bytes,
+                 range, slice, type(Ellipsis))
+
+
+@functools.cache
+def _get_library_paths():
+    import site
+    import sysconfig
+
+    paths = [sysconfig.get_path(name)
+             for name in ('stdlib', 'platstdlib', 'purelib', 'platlib')]
+    if site.ENABLE_USER_SITE:
+        paths.append(site.getusersitepackages())
+    return tuple(os.path.join(os.path.normcase(os.path.abspath(path)), '')
+                 for path in paths if path)
+
+
+def _is_library_function(func):
+    # Function of the standard library or of an installed package
+    filename = os.path.normcase(os.path.abspath(func.__code__.co_filename))
+    return filename.startswith(_get_library_paths())
+
+
+def _get_global_names(code, names):
+    names.update(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            _get_global_names(const, names)
+
+
+class _KeyHasher:
+    """Hash values which have a stable hash.
+
+    update_value() raises a ValueError if a value has no stable hash.
+    """
+
+    def __init__(self):
+        self._hasher = hashlib.sha256()
+        # id() of mutable containers and functions already hashed:
+        # they can be recursive
+        self._seen = set()
+
+    def hexdigest(self):
+        return self._hasher.hexdigest()
+
+    def update(self, *items):
+        # items must be literals
+        self._hasher.update(repr(items).encode('utf-8', 'backslashreplace'))
+        self._hasher.update(b'\0')
+
+    def _update_code(self, code):
+        self.update('code', code.co_code, code.co_names, code.co_varnames)
+        for const in code.co_consts:
+            if isinstance(const, types.CodeType):
+                self._update_code(const)
+            else:
+                self.update_value(const)
+
+    def _update_function(self, func):
+        self.update('function', func.__module__, func.__qualname__)
+        if _is_library_function(func):
+            # hashed by name, as modules
+            return
+
+        code = func.__code__
+        self._update_code(code)
+        self.update_value(func.__defaults__)
+        self.update_value(func.__kwdefaults__)
+        for cell in func.__closure__ or ():
+            try:
+                value = cell.cell_contents
+            except ValueError:
+                # empty cell
+                value = None
+            self.update_value(value)
+
+        # module globals used by the function and its nested functions
+        names = set()
+        _get_global_names(code, names)
+        namespace = func.__globals__
+        for name in sorted(names):
+            if name in namespace:
+                self.update('global', name)
+                self.update_value(namespace[name])
+
+    def _update_namespace(self, namespace):
+        # timeit namespace: ignore __builtins__, __name__, etc.
+        for name, value in sorted(namespace.items()):
+            if name.startswith('__') and name.endswith('__'):
+                continue
+            self.update('name', name)
+            self.update_value(value)
+
+    def _update_method(self, method):
+        from pyperf._timeit import Timer
+
+        owner = method.__self__
+        if isinstance(owner, Timer):
+            # timeit: hash the statements and namespaces, not the Timer
+            self.update('timeit', owner.src)
+            self._update_namespace(owner.global_ns)
+            self._update_namespace(owner.local_ns)
+        else:
+            self.update('method')
+            self.update_value(method.__func__)
+            self.update_value(owner)
+
+    def _update_set(self, value):
+        # the iteration order of a set depends on the hash seed
+        digests = []
+        for item in value:
+            hasher = _KeyHasher()
+            hasher._seen = self._seen
+            hasher.update_value(item)
+            digests.append(hasher.hexdigest())
+        self.update(type(value).__name__, sorted(digests))
+
+    def update_value(self, value):
+        if isinstance(value, LITERAL_TYPES):
+            self.update(type(value).__name__, value)
+            return
+
+        if not isinstance(value, (tuple, frozenset)):
+            if id(value) in self._seen:
+                self.update('seen')
+                return
+            self._seen.add(id(value))
+
+        if isinstance(value, (tuple, list)):
+            self.update(type(value).__name__, len(value))
+            for item in value:
+                self.update_value(item)
+        elif isinstance(value, dict):
+            self.update('dict', len(value))
+            for key, item in value.items():
+                self.update_value(key)
+                self.update_value(item)
+        elif isinstance(value, (set, frozenset)):
+            self._update_set(value)
+        elif isinstance(value, types.FunctionType):
+            self._update_function(value)
+        elif isinstance(value, functools.partial):
+            self.update('partial')
+            self.update_value(value.func)
+            self.update_value(value.args)
+            self.update_value(value.keywords)
+        elif isinstance(value, types.MethodType):
+            self._update_method(value)
+        elif isinstance(value, types.ModuleType):
+            self.update('module', value.__name__)
+        elif isinstance(value, type):
+            self.update('type', value.__module__, value.__qualname__)
+        elif isinstance(value, types.BuiltinFunctionType):
+            self.update('builtin', value.__module__, value.__qualname__)
+            owner = value.__self__
+            if owner is not None and not isinstance(owner, types.ModuleType):
+                # builtin method like list.append
+                self.update_value(owner)
+        else:
+            raise ValueError("cannot hash %s object"
+                             % type(value).__qualname__)
+
+
+def _interpreter_fingerprint(python):
+    # A rebuilt Python has a different size or modification time
+    try:
+        st = os.stat(os.path.realpath(python))
+        build = (st.st_size, st.st_mtime_ns)
+    except OSError:
+        build = None
+    if python == sys.executable:
+        version = sys.version
+    else:
+        version = None
+    return (python, build, version)
+
+
+@functools.cache
+def _host_fingerprint():
+    from pyperf._collect_metadata import collect_cpu_model
+
+    metadata = {}
+    collect_cpu_model(metadata)
+    return (platform.node(), platform.machine(), platform.platform(),
+            os.cpu_count(), sorted(metadata.items()))
+
+
+def get_cache_key(task, args):
+    """Get the cache key of a task, or None if the task cannot be cached.
+
+    Raise a ValueError if the benchmark uses a value which has no stable
+    hash.
+    """
+    if task.cache_source is None:
+        return None
+
+    hasher = _KeyHasher()
+    hasher.update(pyperf.__version__, task.name, task.inner_loops)
+    hasher.update_value(dict(sorted(task.metadata.items())))
+    hasher.update_value(task.cache_source)
+    hasher.update_value([(name, getattr(args, name, None))
+                         for name in KEY_OPTIONS])
+    hasher.update(_interpreter_fingerprint(args.python))
+    hasher.update(_host_fingerprint())
+    return hasher.hexdigest()
+
+
+def _replace_shard(bench, shard):
+    if bench.get_metadata().get('shard') == shard:
+        return bench
+
+    runs = []
+    for run in bench.get_runs():
+        metadata = run.get_metadata()
+        metadata.pop('shard', None)
+        if shard is not None:
+            metadata['shard'] = shard
+        # Run._replace() doesn't support calibration runs (no value)
+        runs.append(pyperf.Run._trusted(run._values, run.warmups, metadata,
+                                        run.latency))
+    return pyperf.Benchmark._trusted(runs)
+
+
+class ResultCache:
+    """Directory of benchmark results: one JSON file per cache key."""
+
+    def __init__(self, directory=None, max_age=DEFAULT_MAX_AGE):
+        if directory is None:
+            directory = os.path.join(get_cache_dir(), 'results')
+        self.directory = directory
+        self.max_age = max_age
+
+    def _get_filename(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def _is_expired(self, filename, now):
+        try:
+            mtime = os.stat(filename).st_mtime
+        except OSError:
+            return True
+        return not (0 <= now - mtime <= self.max_age)
+
+    def evict(self):
+        """Remove entries older than max_age."""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        now = time.time()
+        for name in names:
+            if not name.endswith(('.json', '.tmp')):
+                continue
+            filename = os.path.join(self.directory, name)
+            if self._is_expired(filename, now):
+                try:
+                    os.unlink(filename)
+                except OSError:
+                    pass
+
+    def get(self, key, shard=None):
+        """Get the cached Benchmark of key, or None.
+
+        Set the shard metadata of runs to shard (formatted shard string),
+        or remove it if shard is None.
+        """
+        filename = self._get_filename(key)
+        if not os.path.exists(filename):
+            return None
+        if self._is_expired(filename, time.time()):
+            try:
+                os.unlink(filename)
+            except OSError:
+                pass
+            return None
+        try:
+            bench = pyperf.Benchmark.load(filename)
+        except (OSError, ValueError):
+            # corrupted entry: measure again
+            return None
+        return _replace_shard(bench, shard)
+
+    def put(self, key, bench):
+        # Write a temporary file and rename it to not write a truncated file
+        filename = self._get_filename(key)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = '%s.%s.tmp' % (filename, os.getpid())
+            bench.dump(tmp, replace=True)
+            os.replace(tmp, filename)
+        except OSError:
+            # the cache is an optimization
+            pass
@@ -0,0 +1,144 @@
+"""
+Results log: append-only file of benchmark results, one benchmark suite
+encoded to compact JSON per line ("JSON lines").
+
+Appending results only writes a new line, instead of loading and rewriting
+the whole file. Writers take an exclusive lock on the file, so concurrent
+writers don't corrupt it. Runs of the same benchmark are merged when the
+log is loaded. The "pyperf compact" command folds a log into a single
+benchmark suite.
+"""
+import contextlib
+import json
+import os
+import sys
+
+
+@contextlib.contextmanager
+def lock_file(fp, exclusive=True):
+    try:
+        import fcntl
+    except ImportError:
+        fcntl = None
+
+    fd = fp.fileno()
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    elif sys.platform == 'win32':
+        import msvcrt
+
+        # msvcrt only supports exclusive locks: lock the first byte.
+        # Writes in append mode go to the end of the file anyway.
+        pos = fp.tell()
+        fp.seek(0)
+        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+        fp.seek(pos)
+        try:
+            yield
+        finally:
+            pos = fp.tell()
+            fp.seek(0)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+            fp.seek(pos)
+    else:
+        yield
+
+
+def _encode(result):
+    from pyperf._bench import Benchmark, BenchmarkSuite
+
+    if isinstance(result, Benchmark):
+        result = BenchmarkSuite([result])
+    elif not isinstance(result, BenchmarkSuite):
+        raise TypeError("expect Benchmark or BenchmarkSuite, got %s"
+                        % type(result).__name__)
+    line = json.dumps(result._as_json(), sort_keys=True,
+                      separators=(',', ':'))
+    return (line + '\n').encode('utf-8')
+
+
+def append(filename, result):
+    """Append a Benchmark or a BenchmarkSuite to the log filename."""
+    data = _encode(result)
+    with open(filename, 'ab') as fp:
+        with lock_file(fp):
+            fp.write(data)
+            fp.flush()
+
+
+def _parse(filename, content, names=None, trusted=False):
+    from pyperf._bench import BenchmarkSuite
+
+    lines = content.split(b'\n')
+    if lines[-1]:
+        # Ignore the last line if it is incomplete: a writer was interrupted
+        # before writing the newline
+        del lines[-1]
+
+    # name => Benchmark
+    benchmarks = {}
+    for lineno, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line.decode('utf-8'))
+        except ValueError as exc:
+            raise ValueError("%s: invalid line %s: %s"
+                             % (filename, lineno, exc))
+
+        for bench in BenchmarkSuite._json_load_benchmarks(data, names,
+                                                          trusted):
+            name = bench.get_name()
+            existing = benchmarks.get(name)
+            if existing is not None:
+                existing.add_runs(bench)
+            else:
+                benchmarks[name] = bench
+    return list(benchmarks.values())
+
+
+def load(filename, names=None, trusted=False):
+    """Load the log filename: return the list of merged benchmarks.
+
+    Only load benchmarks called names if names is set. If trusted is true,
+    don't validate values and metadata written by pyperf.
+    """
+    with open(filename, 'rb') as fp:
+        with lock_file(fp, exclusive=False):
+            content = fp.read()
+    return _parse(filename, content, names, trusted)
+
+
+def compact(filename, output=None):
+    """Fold the log filename into a single benchmark suite.
+
+    If output is set, write the suite into output (any file format).
+    Otherwise, replace the content of the log with a single line.
+
+    Return the benchmark suite.
+    """
+    from pyperf._bench import BenchmarkSuite
+
+    if output is not None:
+        suite = BenchmarkSuite.load(filename)
+        suite.dump(output)
+        return suite
+
+    # Rewrite the file in place while holding the lock: writers waiting for
+    # the lock append to the same file, not to a replaced file
+    with open(filename, 'r+b') as fp:
+        with lock_file(fp):
+            content = fp.read()
+            benchmarks = _parse(filename, content)
+            suite = BenchmarkSuite._from_loaded(filename, benchmarks, None)
+            data = _encode(suite)
+            fp.seek(0)
+            fp.write(data)
+            fp.truncate()
+            fp.flush()
+            os.fsync(fp.fileno())
+    return suite
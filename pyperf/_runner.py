@@ -1,20 +1,23 @@
 import functools
+import itertools
 import os
 import sys
 import time
 
 import pyperf
-from pyperf._cli import (format_benchmark, format_checks,
+from pyperf._cli import (format_benchmark, format_checks, format_throughput,
                          multiline_output, display_title, format_result_value,
                          catch_broken_pipe_error)
 from pyperf._cpu_utils import (format_cpu_list, parse_cpu_list,
-                               get_isolated_cpus, set_cpu_affinity,
-                               set_highest_priority)
+                               get_isolated_cpus, get_usable_cpus,
+                               set_cpu_affinity, set_highest_priority)
 from pyperf._formatter import format_timedelta
 from pyperf._hooks import get_hook_names
 from pyperf._utils import (MS_WINDOWS, abs_executable,
-                           WritePipe, get_python_names,
+                           ReadPipe, WritePipe, get_python_names,
                            merge_profile_stats)
+from pyperf._shard import (ShardSelector, format_shard, load_durations,
+                           parse_shard)
 from pyperf._system import OS_LINUX
 from pyperf._worker import WorkerProcessTask
 
@@ -44,6 +47,56 @@ def comma_separated(values):
     return list(filter(None, values))
 
 
+def parse_parallel(value):
+    levels = sorted(set(strictly_positive(level)
+                        for level in comma_separated(value)))
+    if not levels:
+        raise ValueError("empty list of parallelism levels")
+    return levels
+
+
+def parallel_benchmark_name(name, parallel):
+    return '%s[parallel=%s]' % (name, parallel)
+
+
+def _param_metadata(value):
+    if isinstance(value, (int, float, str)) and not isinstance(value, bool):
+        return value
+    return str(value)
+
+
+def param_benchmarks(name, params):
+    """
+    Generate (name, params, metadata) tuples for parametrized benchmarks:
+    one tuple per point of the cartesian product of params values.
+    """
+    if not params:
+        raise ValueError("params must be a non-empty dict")
+    keys = list(params)
+    values = [list(params[key]) for key in keys]
+    for key, key_values in zip(keys, values):
+        if not key_values:
+            raise ValueError("empty list of values for parameter %r" % key)
+
+    for point in itertools.product(*values):
+        point = dict(zip(keys, point))
+        suffix = ','.join('%s=%s' % item for item in point.items())
+        metadata = {'param_%s' % key: _param_metadata(value)
+                    for key, value in point.items()}
+        yield ('%s[%s]' % (name, suffix), point, metadata)
+
+
+def default_parallel_levels(ncpu):
+    # powers of 2, and the number of CPUs: 1, 2, 4, ..., ncpu
+    levels = []
+    level = 1
+    while level < ncpu:
+        levels.append(level)
+        level *= 2
+    levels.append(ncpu)
+    return levels
+
+
 def parse_python_names(names):
     parts = names.split(':')
     if len(parts) != 2:
@@ -51,6 +104,75 @@ def parse_python_names(names):
     return parts
 
 
+def func_timer(func):
+    """
+    Create a task function measuring the elapsed time of loops calls
+    to func().
+    """
+    def task_func(_, loops):
+        # use fast local variables
+        local_timer = time.perf_counter
+        local_func = func
+        if loops != 1:
+            range_it = range(loops)
+
+            t0 = local_timer()
+            for _ in range_it:
+                local_func()
+            dt = local_timer() - t0
+        else:
+            t0 = local_timer()
+            local_func()
+            dt = local_timer() - t0
+
+        return dt
+
+    return task_func
+
+
+def func_latency_timer(func):
+    """
+    Create a task function measuring the elapsed time of loops calls
+    to func(), and recording the latency of each call (--latency option).
+
+    With inner_loops, func() runs inner_loops times the benchmarked code:
+    the latency of a call is divided by inner_loops.
+    """
+    def task_func(task, loops):
+        # use fast local variables
+        local_timer = time.perf_counter_ns
+        local_func = func
+        histogram = task.latency_recorder
+        inner_loops = task.inner_loops or 1
+        total = 0
+        if histogram is not None and inner_loops != 1:
+            record = histogram.record
+            for _ in range(loops):
+                t0 = local_timer()
+                local_func()
+                dt = local_timer() - t0
+                record(dt // inner_loops)
+                total += dt
+        elif histogram is not None:
+            record = histogram.record
+            for _ in range(loops):
+                t0 = local_timer()
+                local_func()
+                dt = local_timer() - t0
+                record(dt)
+                total += dt
+        else:
+            # warmup: use the same timer to have the same overhead
+            for _ in range(loops):
+                t0 = local_timer()
+                local_func()
+                total += local_timer() - t0
+
+        return total * 1e-9
+
+    return task_func
+
+
 def profiling_wrapper(func):
     """
     Wrap a function to collect profiling.
@@ -117,6 +239,16 @@ class Runner:
         # see the --worker-task command line option
         self._worker_task = 0
 
+        # ShardSelector of the --shard option, only set in the manager
+        self._shard = None
+
+        # ResultCache of the --result-cache option, only set in the manager
+        self._result_cache = None
+
+        # Python executable => host calibration of --calibrate-host,
+        # measured by the manager before spawning workers
+        self._host_calibrations = {}
+
         # Set used to check that benchmark names are unique
         self._bench_names = set()
 
@@ -242,6 +374,53 @@ class Runner:
                                  'PYTHON as CHANGED_NAME '
                                  'and REF_PYTHON as REF_NAME in results')
 
+        parser.add_argument('--latency', action="store_true",
+                            help='Time each function call individually and '
+                                 'store the latency distribution, to compute '
+                                 'high percentiles like p99 '
+                                 '(bench_func() and bench_parallel_func())')
+        parser.add_argument('--parallel', metavar='LEVELS',
+                            type=parse_parallel,
+                            help='Comma-separated list of numbers of worker '
+                                 'processes run simultaneously by '
+                                 'bench_parallel_func() (default: 1, 2, 4, '
+                                 '..., number of CPUs)')
+        parser.add_argument('--parallel-ready', type=int, metavar='FD',
+                            help='Pipe FD written by the worker when it is '
+                                 'ready to run the benchmark')
+        parser.add_argument('--parallel-start', type=int, metavar='FD',
+                            help='Pipe FD closed by the manager to start '
+                                 'all parallel workers at once')
+
+        parser.add_argument('--calibrate-host', action="store_true",
+                            help='Store the speed of the host measured by '
+                                 'a reference workload (cached per host) '
+                                 'in the host_calibration metadata')
+        parser.add_argument('--host-calibration', type=float,
+                            metavar='SECONDS',
+                            help='Host calibration measured by the manager, '
+                                 'stored by workers in the host_calibration '
+                                 'metadata')
+        parser.add_argument('--shard', metavar='I/N', type=parse_shard,
+                            help='Only run the benchmarks of the shard I '
+                                 'of N (1-based), the other benchmarks '
+                                 'are skipped')
+        parser.add_argument('--shard-durations', metavar='FILENAME',
+                            help='JSON file of a previous run used to '
+                                 'balance shards by benchmark duration')
+        parser.add_argument('--result-cache', action="store_true",
+                            help='Reuse the results of unchanged benchmarks '
+                                 'stored in the result cache, and store '
+                                 'new results')
+        parser.add_argument('--result-cache-dir', metavar='DIRECTORY',
+                            help='Directory of the result cache '
+                                 '(default: "results" subdirectory of the '
+                                 'pyperf cache directory)')
+        parser.add_argument('--result-cache-max-age', metavar='DAYS',
+                            type=float,
+                            help='Maximum age of cached results in days '
+                                 '(default: 7 days)')
+
         parser.add_argument('--profile',
                             type=str,
                             help='Collect profile data using cProfile '
@@ -273,6 +452,71 @@ class Runner:
         if not self.args.worker:
             raise CLIError("option %s requires --worker" % option)
 
+    def _process_parallel_args(self):
+        args = self.args
+        if args.parallel_ready is None and args.parallel_start is None:
+            return
+        self._only_in_worker("--parallel-ready and --parallel-start")
+        if args.parallel_ready is None or args.parallel_start is None:
+            raise CLIError("--parallel-ready and --parallel-start "
+                           "must be used together")
+
+    def _process_latency_args(self):
+        args = self.args
+        if args.latency and (args.tracemalloc or args.track_memory):
+            raise CLIError('--latency cannot be used with --tracemalloc '
+                           'or --track-memory')
+
+    def _process_shard_args(self):
+        args = self.args
+        if args.shard_durations:
+            if not args.shard:
+                raise CLIError("--shard-durations requires --shard")
+            if args.worker:
+                raise CLIError("--shard-durations cannot be used "
+                               "with --worker")
+        if not args.shard or args.worker or args.worker_task is not None:
+            return
+
+        durations = None
+        if args.shard_durations:
+            try:
+                durations = load_durations(args.shard_durations)
+            except (OSError, ValueError) as exc:
+                raise CLIError("unable to load --shard-durations "
+                               "file %s: %s"
+                               % (args.shard_durations, exc))
+        self._shard = ShardSelector(args.shard, durations)
+
+    def _process_result_cache_args(self):
+        args = self.args
+        if not args.result_cache:
+            if (args.result_cache_dir is not None
+               or args.result_cache_max_age is not None):
+                raise CLIError("--result-cache-dir and --result-cache-max-age "
+                               "require --result-cache")
+            return
+
+        if args.worker:
+            raise CLIError("--result-cache cannot be used with --worker")
+        for option in ('compare_to', 'profile'):
+            if getattr(args, option):
+                raise CLIError("--result-cache is incompatible "
+                               "with --%s option"
+                               % option.replace('_', '-'))
+
+        # Use lazy import to limit imports on 'import pyperf'
+        from pyperf._result_cache import DEFAULT_MAX_AGE, ResultCache
+
+        if args.result_cache_max_age is not None:
+            if args.result_cache_max_age <= 0:
+                raise CLIError("--result-cache-max-age must be > 0")
+            max_age = args.result_cache_max_age * 24 * 3600
+        else:
+            max_age = DEFAULT_MAX_AGE
+        self._result_cache = ResultCache(args.result_cache_dir, max_age)
+        self._result_cache.evict()
+
     def _process_args_impl(self):
         args = self.args
 
@@ -340,6 +584,12 @@ class Runner:
         if args.worker_task:
             self._only_in_worker("--worker-task")
 
+        self._process_shard_args()
+
+        self._process_result_cache_args()
+
+        self._process_parallel_args()
+
         if args.tracemalloc:
             if getattr(args, 'action', None) == 'command':
                 raise CLIError('--tracemalloc cannot be used with pyperf command')
@@ -348,6 +598,8 @@ class Runner:
             except ImportError as exc:
                 raise CLIError("fail to import tracemalloc: %s" % exc)
 
+        self._process_latency_args()
+
         if args.track_memory:
             if MS_WINDOWS:
                 from pyperf._win_memory import check_tracking_memory
@@ -435,18 +687,36 @@ class Runner:
         if not set_highest_priority():
             print("WARNING: unable to increase process priority")
 
+    def _wait_parallel_start(self):
+        args = self.args
+        if args.parallel_start is None:
+            return
+
+        # Notify the manager that the worker is ready, and then block
+        # until the manager closes the start pipe
+        with WritePipe.from_subprocess(args.parallel_ready) as wpipe:
+            os.write(wpipe.fd, b'.')
+        with ReadPipe.from_subprocess(args.parallel_start) as rpipe:
+            os.read(rpipe.fd, 1)
+
     def _worker(self, task):
         self._cpu_affinity()
         self._process_priority()
+        self._wait_parallel_start()
         run = task.create_run()
         bench = pyperf.Benchmark((run,))
         self._display_result(bench, checks=False)
         return bench
 
-    def _check_worker_task(self):
+    def _check_worker_task(self, name):
         args = self.parse_args()
 
         if args.worker_task is None:
+            if self._shard is not None and name.strip() not in self._shard:
+                # Skip the benchmark if it belongs to another shard, but
+                # count it to keep worker task identifiers consistent
+                self._worker_task += 1
+                return False
             return True
 
         if args.worker_task != self._worker_task:
@@ -456,7 +726,7 @@ class Runner:
 
         return True
 
-    def _main(self, task):
+    def _main(self, task, parallel=False):
         if task.name in self._bench_names:
             raise ValueError("duplicated benchmark name: %r" % task.name)
         self._bench_names.add(task.name)
@@ -465,11 +735,13 @@ class Runner:
         try:
             if args.worker:
                 bench = self._worker(task)
+            elif parallel:
+                bench = self._parallel_manager()
             elif args.compare_to:
                 self._compare_to()
                 bench = None
             else:
-                bench = self._manager()
+                bench = self._manager(task)
         except KeyboardInterrupt:
             what = "Benchmark worker" if args.worker else "Benchmark"
             print("%s interrupted: exit" % what, file=sys.stderr)
@@ -478,6 +750,27 @@ class Runner:
         self._worker_task += 1
         return bench
 
+    def _no_latency(self, method):
+        if not self.args.latency:
+            return
+        print("ERROR: --latency is not supported by %s()" % method)
+        sys.exit(1)
+
+    def _no_parallel(self, method):
+        if not self.args.parallel:
+            return
+        print("ERROR: --parallel is not supported by %s()" % method)
+        sys.exit(1)
+
+    def _func_task(self, name, func, metadata):
+        if self.args.latency:
+            task = WorkerProcessTask(self, name, func_latency_timer(func),
+                                     metadata)
+            task.record_latency = True
+        else:
+            task = WorkerProcessTask(self, name, func_timer(func), metadata)
+        return task
+
     @staticmethod
     def _no_keyword_argument(kwargs):
         if not kwargs:
@@ -491,8 +784,10 @@ class Runner:
         metadata = kwargs.pop('metadata', None)
         self._no_keyword_argument(kwargs)
 
-        if not self._check_worker_task():
+        if not self._check_worker_task(name):
             return None
+        self._no_latency('bench_time_func')
+        self._no_parallel('bench_time_func')
 
         if self.args.profile:
             profiler, time_func = profiling_wrapper(time_func)
@@ -501,6 +796,7 @@ class Runner:
             return time_func(loops, *args)
 
         task = WorkerProcessTask(self, name, task_func, metadata)
+        task.cache_source = (time_func, args)
 
         task.inner_loops = inner_loops
         result = self._main(task)
@@ -515,10 +811,25 @@ class Runner:
 
         inner_loops = kwargs.pop('inner_loops', None)
         metadata = kwargs.pop('metadata', None)
+        params = kwargs.pop('params', None)
         self._no_keyword_argument(kwargs)
 
-        if not self._check_worker_task():
+        if params is not None:
+            # one benchmark per parameter point: func(*args, **point)
+            results = []
+            for bench_name, point, param_metadata in param_benchmarks(name,
+                                                                      params):
+                point_func = functools.partial(func, *args, **point)
+                point_metadata = dict(metadata or {}, **param_metadata)
+                result = self.bench_func(bench_name, point_func,
+                                         inner_loops=inner_loops,
+                                         metadata=point_metadata)
+                results.append(result)
+            return results
+
+        if not self._check_worker_task(name):
             return None
+        self._no_parallel('bench_func')
 
         if args:
             func = functools.partial(func, *args)
@@ -526,27 +837,44 @@ class Runner:
         if self.args.profile:
             profiler, func = profiling_wrapper(func)
 
-        def task_func(_, loops):
-            # use fast local variables
-            local_timer = time.perf_counter
-            local_func = func
-            if loops != 1:
-                range_it = range(loops)
+        task = self._func_task(name, func, metadata)
+        task.cache_source = func
+        task.inner_loops = inner_loops
+        result = self._main(task)
 
-                t0 = local_timer()
-                for _ in range_it:
-                    local_func()
-                dt = local_timer() - t0
+        if self.args.profile:
+            merge_profile_stats(profiler, self.args.profile)
+
+        return result
+
+    def bench_parallel_func(self, name, func, *args, **kwargs):
+        """Benchmark func(*args) in multiple processes run in parallel."""
+
+        inner_loops = kwargs.pop('inner_loops', None)
+        metadata = kwargs.pop('metadata', None)
+        self._no_keyword_argument(kwargs)
+
+        if not self._check_worker_task(name):
+            return None
+
+        if args:
+            func = functools.partial(func, *args)
+
+        if self.args.worker:
+            # The manager passes a single parallelism level to workers
+            if self.args.parallel:
+                parallel = self.args.parallel[0]
             else:
-                t0 = local_timer()
-                local_func()
-                dt = local_timer() - t0
+                parallel = 1
+            name = parallel_benchmark_name(name, parallel)
+            metadata = dict(metadata or {}, parallel=parallel)
 
-            return dt
+        if self.args.profile:
+            profiler, func = profiling_wrapper(func)
 
-        task = WorkerProcessTask(self, name, task_func, metadata)
+        task = self._func_task(name, func, metadata)
         task.inner_loops = inner_loops
-        result = self._main(task)
+        result = self._main(task, parallel=True)
 
         if self.args.profile:
             merge_profile_stats(profiler, self.args.profile)
@@ -561,8 +889,10 @@ class Runner:
         loop_factory = kwargs.pop('loop_factory', None)
         self._no_keyword_argument(kwargs)
 
-        if not self._check_worker_task():
+        if not self._check_worker_task(name):
             return None
+        self._no_latency('bench_async_func')
+        self._no_parallel('bench_async_func')
 
         if args:
             func = functools.partial(func, *args)
@@ -613,6 +943,7 @@ class Runner:
             return dt
 
         task = WorkerProcessTask(self, name, task_func, metadata)
+        task.cache_source = func
         task.inner_loops = inner_loops
         result = self._main(task)
 
@@ -622,15 +953,33 @@ class Runner:
         return result
 
     def timeit(self, name, stmt=None, setup="pass", teardown="pass",
-               inner_loops=None, duplicate=None, metadata=None, globals=None):
-
-        if not self._check_worker_task():
-            return None
+               inner_loops=None, duplicate=None, metadata=None, globals=None,
+               params=None):
 
         if stmt is None:
             # timeit(stmt) behaves as timeit(stmt, stmt)
             stmt = name
 
+        if params is not None:
+            # one benchmark per parameter point, parameters are variables
+            # of the global namespace
+            results = []
+            for bench_name, point, param_metadata in param_benchmarks(name,
+                                                                      params):
+                result = self.timeit(bench_name, stmt, setup, teardown,
+                                     inner_loops=inner_loops,
+                                     duplicate=duplicate,
+                                     metadata=dict(metadata or {},
+                                                   **param_metadata),
+                                     globals=dict(globals or {}, **point))
+                results.append(result)
+            return results
+
+        if not self._check_worker_task(name):
+            return None
+        self._no_latency('timeit')
+        self._no_parallel('timeit')
+
         # Use lazy import to limit imports on 'import pyperf'
         from pyperf._timeit import bench_timeit
         return bench_timeit(self, name, stmt,
@@ -655,13 +1004,27 @@ class Runner:
                 with catch_broken_pipe_error(wfile):
                     bench.dump(wfile)
         else:
-            lines = format_benchmark(bench,
-                                     checks=checks,
-                                     metadata=args.metadata,
-                                     dump=args.dump,
-                                     stats=args.stats,
-                                     hist=args.hist,
-                                     show_name=self._show_name)
+            if isinstance(bench, pyperf.BenchmarkSuite):
+                # Runner.bench_parallel_func(): one benchmark per level
+                benchmarks = bench.get_benchmarks()
+                lines = []
+                for item in benchmarks:
+                    lines.extend(format_benchmark(item,
+                                                  checks=checks,
+                                                  metadata=args.metadata,
+                                                  dump=args.dump,
+                                                  stats=args.stats,
+                                                  hist=args.hist,
+                                                  show_name=True))
+                format_throughput(benchmarks, lines=lines)
+            else:
+                lines = format_benchmark(bench,
+                                         checks=checks,
+                                         metadata=args.metadata,
+                                         dump=args.dump,
+                                         stats=args.stats,
+                                         hist=args.hist,
+                                         show_name=self._show_name)
             for line in lines:
                 print(line)
 
@@ -676,18 +1039,81 @@ class Runner:
             else:
                 bench.dump(args.output)
 
-    def _manager(self):
+    def _manager(self, task=None):
         # Use lazy import to limit imports on 'import pyperf'
         from pyperf._manager import Manager
 
+        cache_key = None
+        if self._result_cache is not None and task is not None:
+            from pyperf._result_cache import get_cache_key
+            try:
+                cache_key = get_cache_key(task, self.args)
+            except ValueError as exc:
+                if self.args.verbose:
+                    print("Don't cache the result of %s: %s"
+                          % (task.name, exc))
+        if cache_key is not None:
+            shard = format_shard(self.args.shard) if self.args.shard else None
+            bench = self._result_cache.get(cache_key, shard)
+            if bench is not None:
+                if self.args.verbose:
+                    print("Use cached result of %s" % task.name)
+                self._display_result(bench)
+                return bench
+
         if self.args.verbose and self._worker_task > 0:
             print()
         bench = Manager(self).create_bench()
         if not self.args.quiet:
             print()
         self._display_result(bench)
+        if cache_key is not None:
+            self._result_cache.put(cache_key, bench)
         return bench
 
+    def _parallel_cpus(self):
+        args = self.args
+        if args.affinity:
+            cpus = parse_cpu_list(args.affinity)
+        else:
+            cpus = get_isolated_cpus() or get_usable_cpus()
+        if not cpus:
+            raise CLIError("unable to get the list of CPUs")
+
+        if args.parallel:
+            levels = args.parallel
+            if levels[-1] > len(cpus):
+                raise CLIError("cannot run %s worker processes in parallel "
+                               "on %s CPUs (%s)"
+                               % (levels[-1], len(cpus),
+                                  format_cpu_list(cpus)))
+        else:
+            levels = default_parallel_levels(len(cpus))
+        return (levels, cpus)
+
+    def _parallel_manager(self):
+        # Use lazy import to limit imports on 'import pyperf'
+        from pyperf._manager import ParallelManager
+
+        if self.args.compare_to:
+            print("ERROR: --compare-to is not supported by "
+                  "bench_parallel_func()")
+            sys.exit(1)
+        try:
+            levels, cpus = self._parallel_cpus()
+        except CLIError as exc:
+            print("ERROR: %s" % str(exc))
+            sys.exit(1)
+
+        if self.args.verbose and self._worker_task > 0:
+            print()
+        benchmarks = ParallelManager(self, levels, cpus).create_benchmarks()
+        if not self.args.quiet:
+            print()
+        suite = pyperf.BenchmarkSuite(benchmarks)
+        self._display_result(suite)
+        return suite
+
     def _compare_to(self):
         # Use lazy import to limit imports on 'import pyperf'
         from pyperf._compare import timeit_compare_benchs
@@ -737,9 +1163,27 @@ class Runner:
             print()
         timeit_compare_benchs(name_ref, benchs[0], name_changed, benchs[1], args)
 
-    def bench_command(self, name, command):
-        if not self._check_worker_task():
+    def bench_command(self, name, command, cache=None, cache_files=None):
+        if not self._check_worker_task(name):
             return None
+        self._no_latency('bench_command')
+        self._no_parallel('bench_command')
+
+        # Use lazy import to limit imports on 'import pyperf'
+        from pyperf._command import BenchCommandTask, CommandCache
+
+        old_loops = self.args.loops
+        if cache is not None:
+            cache = CommandCache(cache, cache_files)
+            if cache.mode == 'cold':
+                # only the first loop iteration would run with a cold cache
+                if not self.args.loops:
+                    self.args.loops = 1
+                elif self.args.loops != 1:
+                    print("ERROR: the cold cache mode requires --loops=1")
+                    sys.exit(1)
+        elif cache_files:
+            raise ValueError("cache_files requires a cache mode")
 
         if self.args.profile:
             command.extend(["--profile", self.args.profile])
@@ -748,7 +1192,11 @@ class Runner:
             for hook in self.args.hook:
                 command.extend(["--hook", hook])
 
-        # Use lazy import to limit imports on 'import pyperf'
-        from pyperf._command import BenchCommandTask
-        task = BenchCommandTask(self, name, command)
-        return self._main(task)
+        task = BenchCommandTask(self, name, command, cache)
+        task.cache_source = command
+        try:
+            return self._main(task)
+        finally:
+            # the cold cache mode only forces --loops=1 for this command,
+            # the next benchmarks are calibrated
+            self.args.loops = old_loops
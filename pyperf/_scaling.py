@@ -0,0 +1,185 @@
+"""
+"pyperf scaling" command: fit the complexity of parametrized benchmarks.
+"""
+import collections
+import math
+
+from pyperf._metadata import NUMBER_TYPES
+
+
+PARAM_PREFIX = 'param_'
+DEFAULT_THRESHOLD = 0.5
+
+# (name, function of the size n)
+COMPLEXITY_MODELS = (
+    ('O(1)', lambda n: 1.0),
+    ('O(log n)', lambda n: math.log(n)),
+    ('O(n)', lambda n: n),
+    ('O(n log n)', lambda n: n * math.log(n)),
+    ('O(n^2)', lambda n: n * n),
+)
+
+Fit = collections.namedtuple('Fit', 'model coef error exponent nsize')
+
+
+def get_params(bench):
+    metadata = bench.get_metadata()
+    return {key[len(PARAM_PREFIX):]: value
+            for key, value in metadata.items()
+            if key.startswith(PARAM_PREFIX)}
+
+
+def _fit_model(func, sizes, times):
+    # Fit times = coef * func(size) minimizing the relative error, since
+    # sizes and times usually span multiple orders of magnitude
+    ratios = [func(size) / time for size, time in zip(sizes, times)]
+    norm = math.fsum(ratio * ratio for ratio in ratios)
+    if not norm:
+        return (0.0, math.inf)
+    coef = math.fsum(ratios) / norm
+    error = math.sqrt(math.fsum((1.0 - coef * ratio) ** 2
+                                for ratio in ratios) / len(ratios))
+    return (coef, error)
+
+
+def fit_exponent(sizes, times):
+    """Slope of log(time) as a function of log(size): time ~ size ** k."""
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(time) for time in times]
+    x_mean = math.fsum(xs) / len(xs)
+    y_mean = math.fsum(ys) / len(ys)
+    var = math.fsum((x - x_mean) ** 2 for x in xs)
+    if not var:
+        raise ValueError("need at least two different sizes")
+    cov = math.fsum((x - x_mean) * (y - y_mean) for x, y in zip(xs, ys))
+    return cov / var
+
+
+def fit_complexity(sizes, times):
+    """Get the complexity model which fits best times as a function of sizes.
+
+    Return a Fit object.
+    """
+    exponent = fit_exponent(sizes, times)
+
+    best = None
+    for model, func in COMPLEXITY_MODELS:
+        coef, error = _fit_model(func, sizes, times)
+        if best is None or error < best[2]:
+            best = (model, coef, error)
+    model, coef, error = best
+    return Fit(model, coef, error, exponent, len(set(sizes)))
+
+
+def group_benchmarks(suite, param=None):
+    """Group benchmarks of a suite by parameters other than the size.
+
+    Return a dict: name => list of (size, bench) sorted by size.
+    """
+    groups = {}
+    for bench in suite:
+        params = get_params(bench)
+        if not params:
+            continue
+
+        if param is None:
+            numeric = [key for key, value in params.items()
+                       if isinstance(value, NUMBER_TYPES)]
+            if not numeric:
+                continue
+            if len(numeric) > 1:
+                raise ValueError("benchmark %r has multiple numeric "
+                                 "parameters (%s): use --param"
+                                 % (bench.get_name(), ', '.join(numeric)))
+            key = numeric[0]
+        else:
+            key = param
+            if key not in params:
+                continue
+
+        size = params.pop(key)
+        if not isinstance(size, NUMBER_TYPES) or size <= 0:
+            raise ValueError("benchmark %r: parameter %s=%r is not "
+                             "a number > 0" % (bench.get_name(), key, size))
+
+        name = bench.get_name().partition('[')[0]
+        if params:
+            suffix = ','.join('%s=%s' % item for item in sorted(params.items()))
+            name = '%s[%s]' % (name, suffix)
+        groups.setdefault(name, []).append((size, bench))
+
+    for benchmarks in groups.values():
+        benchmarks.sort(key=lambda item: item[0])
+    return groups
+
+
+def fit_groups(suite, param=None):
+    # name => Fit, or None if there are not enough sizes
+    fits = {}
+    for name, benchmarks in group_benchmarks(suite, param).items():
+        sizes = [size for size, bench in benchmarks]
+        if len(set(sizes)) < 2:
+            fits[name] = None
+            continue
+        times = [bench.mean() for size, bench in benchmarks]
+        fits[name] = fit_complexity(sizes, times)
+    return fits
+
+
+def format_fit(fit):
+    return ("%s (exponent: %.2f, error: %.0f%%, %s sizes)"
+            % (fit.model, fit.exponent, fit.error * 100, fit.nsize))
+
+
+def compare_fits(ref, changed, threshold=DEFAULT_THRESHOLD):
+    """Compare two Fit objects: return (text, changed)."""
+    delta = changed.exponent - ref.exponent
+    if ref.model != changed.model:
+        model = '%s -> %s' % (ref.model, changed.model)
+    else:
+        model = ref.model
+    text = ('%s (exponent: %.2f -> %.2f)'
+            % (model, ref.exponent, changed.exponent))
+    flagged = (abs(delta) >= threshold)
+    if flagged:
+        text = '%s: exponent changed (%+.2f)' % (text, delta)
+    return (text, flagged)
+
+
+def cmd_scaling(args, data):
+    try:
+        fits = [fit_groups(suite, args.param) for suite in data.suites]
+    except ValueError as exc:
+        print("ERROR: %s" % exc)
+        return 1
+
+    if not any(fits):
+        print("ERROR: no parametrized benchmark found")
+        return 1
+
+    if len(fits) == 1:
+        for name, fit in sorted(fits[0].items()):
+            if fit is None:
+                print("%s: need at least 2 sizes" % name)
+            else:
+                print("%s: %s" % (name, format_fit(fit)))
+        return 0
+
+    ref_fits, changed_fits = fits
+    nchanged = 0
+    for name in sorted(set(ref_fits) | set(changed_fits)):
+        ref = ref_fits.get(name)
+        changed = changed_fits.get(name)
+        if ref is None or changed is None:
+            print("%s: cannot compare, need at least 2 sizes in both files"
+                  % name)
+            continue
+        text, flagged = compare_fits(ref, changed, args.threshold)
+        if flagged:
+            nchanged += 1
+        print("%s: %s" % (name, text))
+
+    if nchanged:
+        print()
+        print("Complexity changed in %s benchmark(s)" % nchanged)
+    return 0
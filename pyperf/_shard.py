@@ -0,0 +1,196 @@
+"""
+Sharded execution: split the benchmarks of a script over multiple jobs with
+the --shard option of Runner, and merge the results of the shards with the
+"pyperf merge" command.
+"""
+import os.path
+import sys
+import zlib
+
+
+# Metadata which must be the same in all shards
+MERGE_CHECKED_METADATA = ('python_implementation', 'python_version')
+
+
+def parse_shard(value):
+    # "2/8" => (2, 8)
+    index, sep, count = value.partition('/')
+    try:
+        if not sep:
+            raise ValueError
+        index = int(index)
+        count = int(count)
+    except ValueError:
+        raise ValueError("invalid shard %r: expected I/N" % value)
+    if not (count >= 1 and 1 <= index <= count):
+        raise ValueError("invalid shard %r: I must be in the range 1..N"
+                         % value)
+    return (index, count)
+
+
+def format_shard(shard):
+    return '%s/%s' % shard
+
+
+def hash_shard(name, count):
+    """Get the shard (1..count) of a benchmark from its name.
+
+    Use CRC32 rather than hash(): str hash is randomized.
+    """
+    return zlib.crc32(name.encode('utf-8')) % count + 1
+
+
+def balance_shards(durations, count):
+    """Assign benchmarks to shards balanced by their duration.
+
+    durations is a dict: name => duration in seconds. Greedy algorithm:
+    the longest benchmarks first, each one into the shard with the lowest
+    total duration. Return a dict: name => shard (1..count).
+    """
+    loads = [0.0] * count
+    shards = {}
+    for name, duration in sorted(durations.items(),
+                                 key=lambda item: (-item[1], item[0])):
+        index = min(range(count), key=lambda index: (loads[index], index))
+        loads[index] += duration
+        shards[name] = index + 1
+    return shards
+
+
+def load_durations(filename):
+    # Get the duration of benchmarks of a previous result file
+    import pyperf
+
+    suite = pyperf.BenchmarkSuite.load(filename)
+    durations = {}
+    for bench in suite:
+        duration = bench.get_total_duration()
+        if duration:
+            durations[bench.get_name()] = duration
+    return durations
+
+
+class ShardSelector:
+    """Select the benchmarks of a shard.
+
+    Benchmarks of the durations dict are balanced by duration, other
+    benchmarks are assigned by a hash of their name.
+    """
+
+    def __init__(self, shard, durations=None):
+        self.index, self.count = shard
+        if durations:
+            self._shards = balance_shards(durations, self.count)
+        else:
+            self._shards = {}
+
+    def get_shard(self, name):
+        shard = self._shards.get(name)
+        if shard is None:
+            shard = hash_shard(name, self.count)
+        return shard
+
+    def __contains__(self, name):
+        return self.get_shard(name) == self.index
+
+
+def merge_suites(suites):
+    """Merge benchmark suites of shards.
+
+    Return (suite, warnings). Raise a ValueError if a benchmark is in
+    multiple files, if files come from different numbers of shards, if a
+    shard is in multiple files, or if MERGE_CHECKED_METADATA are different.
+    """
+    import pyperf
+
+    benchmarks = []
+    # name => filename
+    names = {}
+    # shard => filename
+    shards = {}
+    counts = set()
+    unsharded = []
+    # metadata name => (value, filename)
+    checked = {}
+    for suite in suites:
+        filename = suite.filename
+        suite_shards = set()
+        for bench in suite:
+            name = bench.get_name()
+            if name in names:
+                raise ValueError("benchmark %r is in %s and %s"
+                                 % (name, names[name], filename))
+            names[name] = filename
+
+            metadata = bench.get_metadata()
+            for key in MERGE_CHECKED_METADATA:
+                value = metadata.get(key)
+                if value is None:
+                    continue
+                if key not in checked:
+                    checked[key] = (value, filename)
+                elif checked[key][0] != value:
+                    raise ValueError("metadata %s is different: %s in %s, "
+                                     "%s in %s"
+                                     % (key, checked[key][0], checked[key][1],
+                                        value, filename))
+
+            shard = metadata.get('shard')
+            if shard is not None:
+                suite_shards.add(parse_shard(shard))
+            benchmarks.append(bench)
+
+        if not suite_shards:
+            unsharded.append(filename)
+        for shard in suite_shards:
+            if shard in shards and shards[shard] != filename:
+                raise ValueError("shard %s is in %s and %s"
+                                 % (format_shard(shard), shards[shard],
+                                    filename))
+            shards[shard] = filename
+            counts.add(shard[1])
+
+    if len(counts) > 1:
+        raise ValueError("files come from different numbers of shards: %s"
+                         % ', '.join(map(str, sorted(counts))))
+    warnings = []
+    if counts:
+        if unsharded:
+            raise ValueError("%s has no shard metadata" % unsharded[0])
+        count = counts.pop()
+        missing = [format_shard((index, count))
+                   for index in range(1, count + 1)
+                   if (index, count) not in shards]
+        if missing:
+            warnings.append("missing shards (empty or not merged): %s"
+                            % ', '.join(missing))
+    return (pyperf.BenchmarkSuite(benchmarks), warnings)
+
+
+def cmd_merge(args):
+    import pyperf
+
+    if os.path.exists(args.output):
+        print("ERROR: The file %r already exists" % args.output)
+        sys.exit(1)
+
+    suites = []
+    for filename in args.filenames:
+        try:
+            suites.append(pyperf.BenchmarkSuite.load(filename))
+        except (OSError, ValueError) as exc:
+            print("ERROR: failed to load %s: %s" % (filename, exc))
+            sys.exit(1)
+
+    try:
+        suite, warnings = merge_suites(suites)
+    except ValueError as exc:
+        print("ERROR: %s" % exc)
+        sys.exit(1)
+    for warning in warnings:
+        print("WARNING: %s" % warning)
+
+    suite.dump(args.output)
+    nrun = sum(bench.get_nrun() for bench in suite)
+    print("Merged %s benchmarks (%s runs) of %s files into %s"
+          % (len(suite), nrun, len(suites), args.output))
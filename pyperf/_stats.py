@@ -0,0 +1,136 @@
+import array
+import math
+import statistics
+import sys
+from fractions import Fraction
+
+from pyperf._utils import sort_values
+
+
+# Number of bits of the integer square root needed to round correctly
+_SQRT_BIT_WIDTH = 2 * sys.float_info.mant_dig + 3
+
+
+def _isqrt_frac_rto(n, m):
+    # Square root of n/m, rounded to odd
+    a = math.isqrt(n // m)
+    return a | (a * a * m != n)
+
+
+if sys.version_info >= (3, 11):
+    # Correctly rounded square root of a fraction, as statistics.stdev()
+    # of Python 3.11 and newer
+    def _sqrt_frac(value):
+        n = value.numerator
+        m = value.denominator
+        q = (n.bit_length() - m.bit_length() - _SQRT_BIT_WIDTH) // 2
+        if q >= 0:
+            return float(_isqrt_frac_rto(n, m << 2 * q) << q)
+        return _isqrt_frac_rto(n << -2 * q, m) / (1 << -q)
+else:
+    def _sqrt_frac(value):
+        return math.sqrt(float(value))
+
+
+class RunningStats:
+    """Statistics of values updated incrementally.
+
+    Keep the exact sum and the exact sum of squares of values, as
+    statistics.mean() and statistics.stdev() compute them, so results
+    are the same. Sorted values are updated by merging new values.
+
+    Adding values costs O(len(values)). The mean and the standard deviation
+    are computed in O(1), the median merges values added since the
+    previous call.
+    """
+
+    __slots__ = ('_count', '_sx', '_sxx', '_all_int', '_exact',
+                 '_sorted', '_pending')
+
+    def __init__(self, values=()):
+        self._count = 0
+        # denominator => sum of numerators of values and of squared values
+        self._sx = {}
+        self._sxx = {}
+        self._all_int = True
+        # False if a value is not finite
+        self._exact = True
+        self._sorted = []
+        # sequences of values not merged into _sorted yet
+        self._pending = []
+        self.add(values)
+
+    def add(self, values):
+        sx = self._sx
+        sxx = self._sxx
+        for value in values:
+            if type(value) is not int:
+                self._all_int = False
+            try:
+                n, d = value.as_integer_ratio()
+            except (OverflowError, ValueError):
+                self._exact = False
+                continue
+            sx[d] = sx.get(d, 0) + n
+            sxx[d] = sxx.get(d, 0) + n * n
+        self._count += len(values)
+        if values:
+            self._pending.append(values)
+
+    def __len__(self):
+        return self._count
+
+    def is_exact(self):
+        return self._exact
+
+    def _sum(self):
+        return sum(Fraction(n, d) for d, n in self._sx.items())
+
+    def mean(self):
+        if not self._count:
+            raise statistics.StatisticsError('mean requires at least one '
+                                             'data point')
+        mean = self._sum() / self._count
+        if self._all_int and mean.denominator == 1:
+            return int(mean)
+        return float(mean)
+
+    def stdev(self):
+        count = self._count
+        if count < 2:
+            raise statistics.StatisticsError('stdev requires at least two '
+                                             'data points')
+        sx = self._sum()
+        sxx = sum(Fraction(n, d * d) for d, n in self._sxx.items())
+        ssd = (count * sxx - sx * sx) / count
+        return _sqrt_frac(ssd / (count - 1))
+
+    def sorted_values(self):
+        pending = self._pending
+        if pending:
+            if all(isinstance(values, array.array) for values in pending):
+                values = array.array('d')
+            else:
+                values = []
+            for chunk in pending:
+                values.extend(chunk)
+            self._pending = []
+
+            if self._sorted:
+                if type(self._sorted) is not type(values):
+                    values = list(values)
+                    self._sorted = list(self._sorted)
+                # Timsort finds the sorted run: only new values are sorted
+                values = self._sorted + values
+            self._sorted = sort_values(values)
+        return self._sorted
+
+    def median(self):
+        data = self.sorted_values()
+        n = len(data)
+        if not n:
+            raise statistics.StatisticsError("no median for empty data")
+        if n % 2 == 1:
+            return data[n // 2]
+        index = n // 2
+        return (data[index - 1] + data[index]) / 2
@@ -0,0 +1,319 @@
+"""
+History store: SQLite database of benchmark results.
+
+"pyperf ingest" normalizes benchmark suites into indexed tables: suites,
+benchmarks with a summary of their values, common metadata, runs and
+values. "pyperf history" reads the summaries of a benchmark from the index,
+without loading result files.
+"""
+import collections
+import datetime
+import hashlib
+import json
+import sys
+
+from pyperf._formatter import DEFAULT_UNIT, format_datetime, format_values
+
+
+# Version of the database schema, stored in PRAGMA user_version
+_SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE suite (
+    id INTEGER PRIMARY KEY,
+    filename TEXT,
+    -- SHA-256 of the suite encoded to JSON: a suite is only ingested once
+    checksum TEXT NOT NULL UNIQUE,
+    ingest_date TEXT NOT NULL
+);
+
+CREATE TABLE benchmark (
+    id INTEGER PRIMARY KEY,
+    suite_id INTEGER NOT NULL REFERENCES suite(id),
+    name TEXT NOT NULL,
+    -- date of the first run
+    date TEXT,
+    unit TEXT NOT NULL,
+    nrun INTEGER NOT NULL,
+    nvalue INTEGER NOT NULL,
+    mean REAL,
+    stdev REAL,
+    median REAL,
+    min REAL,
+    max REAL
+);
+CREATE INDEX benchmark_name_date ON benchmark(name, date);
+
+-- Metadata common to all runs of a benchmark. A list (ex: tags) is stored
+-- as one row per item.
+CREATE TABLE metadata (
+    benchmark_id INTEGER NOT NULL REFERENCES benchmark(id),
+    name TEXT NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE INDEX metadata_benchmark ON metadata(benchmark_id);
+CREATE INDEX metadata_name_value ON metadata(name, value);
+
+CREATE TABLE run (
+    id INTEGER PRIMARY KEY,
+    benchmark_id INTEGER NOT NULL REFERENCES benchmark(id),
+    date TEXT,
+    duration REAL,
+    loops INTEGER
+);
+CREATE INDEX run_benchmark ON run(benchmark_id);
+
+CREATE TABLE value (
+    run_id INTEGER NOT NULL REFERENCES run(id),
+    value REAL NOT NULL
+);
+CREATE INDEX value_run ON value(run_id);
+"""
+
+HistoryEntry = collections.namedtuple('HistoryEntry',
+                                      'benchmark_id date unit nrun nvalue '
+                                      'mean stdev median min max')
+
+
+def suite_checksum(suite):
+    data = json.dumps(suite._as_json(), sort_keys=True,
+                      separators=(',', ':'))
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def _metadata_rows(benchmark_id, metadata):
+    for name, value in sorted(metadata.items()):
+        if isinstance(value, list):
+            for item in value:
+                yield (benchmark_id, name, item)
+        else:
+            yield (benchmark_id, name, value)
+
+
+class HistoryStore:
+    def __init__(self, filename):
+        # Use lazy import to limit imports on 'import pyperf'
+        import sqlite3
+
+        self.filename = filename
+        self._db = sqlite3.connect(filename)
+        try:
+            self._create_schema()
+        except Exception:
+            self._db.close()
+            raise
+
+    def _create_schema(self):
+        version = self._db.execute('PRAGMA user_version').fetchone()[0]
+        if version == _SCHEMA_VERSION:
+            return
+        if version:
+            raise ValueError("%s: unsupported history database version %s"
+                             % (self.filename, version))
+        with self._db:
+            self._db.executescript(_SCHEMA)
+            self._db.execute('PRAGMA user_version = %s' % _SCHEMA_VERSION)
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _insert_benchmark(self, suite_id, bench):
+        db = self._db
+        nvalue = bench.get_nvalue()
+        if nvalue:
+            values = bench.percentiles((0, 100))
+            summary = (bench.mean(),
+                       bench.stdev() if nvalue >= 2 else None,
+                       bench.median(),
+                       values[0], values[1])
+        else:
+            # only calibration runs
+            summary = (None,) * 5
+        dates = bench.get_dates()
+        if dates:
+            date = format_datetime(dates[0], microsecond=False)
+        else:
+            date = None
+
+        cursor = db.execute('INSERT INTO benchmark (suite_id, name, date, '
+                            'unit, nrun, nvalue, mean, stdev, median, '
+                            'min, max) '
+                            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                            (suite_id, bench.get_name(), date,
+                             bench.get_unit(), bench.get_nrun(), nvalue)
+                            + summary)
+        benchmark_id = cursor.lastrowid
+
+        db.executemany('INSERT INTO metadata (benchmark_id, name, value) '
+                       'VALUES (?, ?, ?)',
+                       _metadata_rows(benchmark_id, bench.get_metadata()))
+
+        for run in bench.get_runs():
+            metadata = run._metadata
+            cursor = db.execute('INSERT INTO run (benchmark_id, date, '
+                                'duration, loops) VALUES (?, ?, ?, ?)',
+                                (benchmark_id, metadata.get('date'),
+                                 metadata.get('duration'),
+                                 metadata.get('loops')))
+            run_id = cursor.lastrowid
+            db.executemany('INSERT INTO value (run_id, value) VALUES (?, ?)',
+                           [(run_id, value) for value in run._values])
+
+    def ingest(self, suite, filename=None):
+        """Insert the benchmark suite.
+
+        Return the number of inserted benchmarks, or None if the suite was
+        already ingested.
+        """
+        checksum = suite_checksum(suite)
+        db = self._db
+        with db:
+            row = db.execute('SELECT id FROM suite WHERE checksum=?',
+                             (checksum,)).fetchone()
+            if row is not None:
+                return None
+
+            ingest_date = format_datetime(datetime.datetime.now(),
+                                          microsecond=False)
+            cursor = db.execute('INSERT INTO suite (filename, checksum, '
+                                'ingest_date) VALUES (?, ?, ?)',
+                                (filename, checksum, ingest_date))
+            suite_id = cursor.lastrowid
+            for bench in suite:
+                self._insert_benchmark(suite_id, bench)
+        return len(suite)
+
+    def history(self, name, metadata=None):
+        """Get the list of HistoryEntry of the benchmark name sorted by date.
+
+        If metadata is set, only get benchmarks which have these metadata
+        (dict: name => value).
+        """
+        sql = ['SELECT id, date, unit, nrun, nvalue, mean, stdev, median, '
+               'min, max FROM benchmark WHERE name=?']
+        params = [name]
+        for key, value in sorted((metadata or {}).items()):
+            sql.append('AND EXISTS (SELECT 1 FROM metadata '
+                       'WHERE benchmark_id=benchmark.id '
+                       'AND name=? AND value=?)')
+            params.extend((key, value))
+        sql.append('ORDER BY date, id')
+        cursor = self._db.execute(' '.join(sql), params)
+        return [HistoryEntry._make(row) for row in cursor]
+
+    def get_benchmark_names(self):
+        cursor = self._db.execute('SELECT DISTINCT name FROM benchmark '
+                                  'ORDER BY name')
+        return [row[0] for row in cursor]
+
+    def get_metadata(self, benchmark_id):
+        metadata = {}
+        cursor = self._db.execute('SELECT name, value FROM metadata '
+                                  'WHERE benchmark_id=? ORDER BY rowid',
+                                  (benchmark_id,))
+        for name, value in cursor:
+            if name in metadata:
+                if not isinstance(metadata[name], list):
+                    metadata[name] = [metadata[name]]
+                metadata[name].append(value)
+            else:
+                metadata[name] = value
+        return metadata
+
+    def get_values(self, benchmark_id):
+        cursor = self._db.execute('SELECT value.value FROM value '
+                                  'JOIN run ON run.id=value.run_id '
+                                  'WHERE run.benchmark_id=? '
+                                  'ORDER BY value.rowid',
+                                  (benchmark_id,))
+        return [row[0] for row in cursor]
+
+
+def parse_metadata_filter(text):
+    # "key1=value1,key2=value2" => dict
+    metadata = {}
+    for item in text.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        key, sep, value = item.partition('=')
+        if not sep:
+            raise ValueError("invalid metadata %r: expected KEY=VALUE"
+                             % item)
+        metadata[key.strip()] = value.strip()
+    return metadata
+
+
+def cmd_ingest(args):
+    import pyperf
+
+    with HistoryStore(args.db) as store:
+        for filename in args.filenames:
+            try:
+                suite = pyperf.BenchmarkSuite.load(filename, trusted=True)
+            except (OSError, ValueError) as exc:
+                print("ERROR: failed to load %s: %s" % (filename, exc))
+                sys.exit(1)
+
+            nbench = store.ingest(suite, filename)
+            if nbench is None:
+                print("%s: already ingested" % filename)
+            else:
+                print("%s: ingested %s benchmarks" % (filename, nbench))
+
+
+def _normalize_entries(store, entries):
+    from pyperf._host_calibration import normalize_history
+
+    calibrations = []
+    for entry in entries:
+        value = store.get_metadata(entry.benchmark_id).get('host_calibration')
+        if value is None:
+            print("ERROR: result of %s has no host_calibration metadata: "
+                  "run benchmarks with --calibrate-host"
+                  % (entry.date or '(no date)'))
+            sys.exit(1)
+        calibrations.append(float(value))
+    return normalize_history(entries, calibrations)
+
+
+def cmd_history(args):
+    if args.metadata:
+        try:
+            metadata = parse_metadata_filter(args.metadata)
+        except ValueError as exc:
+            print("ERROR: %s" % exc)
+            sys.exit(1)
+    else:
+        metadata = None
+
+    with HistoryStore(args.db) as store:
+        entries = store.history(args.name, metadata)
+        if not entries:
+            print("ERROR: no result found for the benchmark %r in %s"
+                  % (args.name, args.db))
+            sys.exit(1)
+
+        if args.normalize_host:
+            entries = _normalize_entries(store, entries)
+
+        for entry in entries:
+            date = entry.date or '(no date)'
+            if not entry.nvalue:
+                print("%s: (no value)" % date)
+                continue
+
+            unit = entry.unit or DEFAULT_UNIT
+            if entry.stdev is not None:
+                mean, stdev = format_values(unit, (entry.mean, entry.stdev))
+                text = "%s +- %s" % (mean, stdev)
+            else:
+                text = format_values(unit, (entry.mean,))[0]
+            print("%s: Mean +- std dev: %s (%s runs, %s values)"
+                  % (date, text, entry.nrun, entry.nvalue))
@@ -227,9 +227,10 @@ def bench_timeit(runner, name, stmt, setup, teardown,
     timer = None
     try:
         timer = create_timer(stmt, setup, teardown, globals)
-        runner.bench_time_func(name, timer.time_func, **kwargs)
+        bench = runner.bench_time_func(name, timer.time_func, **kwargs)
     except SystemExit:
         raise
     except:   # noqa: E722
         display_error(timer, orig_stmt, setup, teardown)
         sys.exit(1)
+    return bench
@@ -1,15 +1,41 @@
 """
 "pyperf timeit" microbenchmark command based on the Python timeit module.
 """
+import ast
+import sys
+
 from pyperf._runner import Runner
-from pyperf._timeit import bench_timeit
 
 
 DEFAULT_NAME = 'timeit'
 
 
+def parse_param(value):
+    # "NAME=VALUE1,VALUE2,..." => (name, [value1, value2, ...])
+    name, sep, values = value.partition('=')
+    name = name.strip()
+    if not sep or not name.isidentifier():
+        raise ValueError("invalid parameter %r: expect NAME=VALUE1,VALUE2,..."
+                         % value)
+
+    def parse_value(text):
+        text = text.strip()
+        try:
+            return ast.literal_eval(text)
+        except (ValueError, SyntaxError):
+            return text
+
+    values = [parse_value(item) for item in values.split(',')
+              if item.strip()]
+    if not values:
+        raise ValueError("parameter %r has no value" % name)
+    return (name, values)
+
+
 def add_cmdline_args(cmd, args):
     cmd.extend(('--name', args.name))
+    for param in args.param:
+        cmd.extend(('--param', param))
     if args.inner_loops:
         cmd.extend(('--inner-loops', str(args.inner_loops)))
     for setup in args.setup:
@@ -48,18 +74,38 @@ class TimeitRunner(Runner):
                          help='duplicate statements to reduce the overhead of '
                               'the outer loop and multiply inner_loops '
                               'by DUPLICATE')
+        cmd.add_argument('--param', action='append', default=[],
+                         metavar='NAME=VALUES',
+                         help='Run one benchmark per value of the parameter '
+                              'NAME, VALUES is a comma-separated list of '
+                              'values. The parameter is a variable of the '
+                              'setup and statements. Can be specified '
+                              'multiple times.')
         cmd.add_argument('stmt', nargs='+', help='executed statements')
 
     def _process_args(self):
         Runner._process_args(self)
         args = self.args
 
-        self._show_name = bool(args.name)
+        self._show_name = bool(args.name or args.param)
         if not args.name:
             args.name = DEFAULT_NAME
 
 
 def main(runner):
     args = runner.args
-    bench_timeit(runner, args.name, args.stmt, args.setup, args.teardown,
-                 args.inner_loops, args.duplicate)
+
+    params = None
+    if args.param:
+        params = {}
+        for param in args.param:
+            try:
+                name, values = parse_param(param)
+            except ValueError as exc:
+                print("ERROR: %s" % exc)
+                sys.exit(1)
+            params[name] = values
+
+    runner.timeit(args.name, args.stmt, args.setup, args.teardown,
+                  inner_loops=args.inner_loops, duplicate=args.duplicate,
+                  params=params)
@@ -1,3 +1,5 @@
+import array
+import bisect
 import contextlib
 import math
 import os
@@ -121,6 +123,247 @@ def is_significant(sample1, sample2):
     return (abs(t_score) >= critical_value, t_score)
 
 
+# Confidence level and number of resamples of bootstrap confidence intervals
+BOOTSTRAP_CONFIDENCE = 0.95
+BOOTSTRAP_RESAMPLES = 2000
+
+
+# _bootstrap_ratios_numpy() and _bootstrap_ratios() use different random
+# number generators: results are reproducible, but depend on NumPy being
+# installed (up to the resampling noise).
+
+def _bootstrap_ratios_numpy(numpy, sample1, sample2, resamples, statistic,
+                            seed):
+    rng = numpy.random.default_rng(seed)
+    func = numpy.mean if statistic == 'mean' else numpy.median
+    stats = []
+    for sample in (sample1, sample2):
+        sample = numpy.asarray(sample, dtype=float)
+        indexes = rng.integers(0, len(sample), size=(resamples, len(sample)))
+        stats.append(func(sample[indexes], axis=1))
+    return (stats[1] / stats[0]).tolist()
+
+
+def _bootstrap_ratios(sample1, sample2, resamples, statistic, seed):
+    import random
+
+    choices = random.Random(seed).choices
+    n1 = len(sample1)
+    n2 = len(sample2)
+    ratios = []
+    if statistic == 'mean':
+        for _ in range(resamples):
+            mean1 = sum(choices(sample1, k=n1)) / n1
+            mean2 = sum(choices(sample2, k=n2)) / n2
+            ratios.append(mean2 / mean1)
+    else:
+        median = statistics.median
+        for _ in range(resamples):
+            median1 = median(choices(sample1, k=n1))
+            median2 = median(choices(sample2, k=n2))
+            ratios.append(median2 / median1)
+    return ratios
+
+
+def bootstrap_ratio_test(sample1, sample2, confidence=BOOTSTRAP_CONFIDENCE,
+                         resamples=BOOTSTRAP_RESAMPLES, statistic='mean',
+                         seed=0):
+    """Bootstrap test of the ratio statistic(sample2) / statistic(sample1),
+    where statistic is 'mean' or 'median'.
+
+    Samples can have different lengths and are not assumed to be normally
+    distributed. Use NumPy, if available, to resample values. A fixed seed
+    is used to get reproducible results, but results with and without NumPy
+    differ by the resampling noise.
+
+    Returns:
+        (low, high, pvalue) where (low, high) are the bounds of the
+        percentile confidence interval, and pvalue is the two-sided p-value
+        of the ratio being equal to 1.0.
+    """
+    if statistic not in ('mean', 'median'):
+        raise ValueError("statistic must be 'mean' or 'median'")
+    if not sample1 or not sample2:
+        raise ValueError("empty sample")
+
+    try:
+        import numpy
+    except ImportError:
+        ratios = _bootstrap_ratios(sample1, sample2, resamples, statistic,
+                                   seed)
+    else:
+        ratios = _bootstrap_ratios_numpy(numpy, sample1, sample2, resamples,
+                                         statistic, seed)
+    return _bootstrap_ratios_test(ratios, confidence)
+
+
+def _bootstrap_ratios_test(ratios, confidence):
+    # Compute (low, high, pvalue) from bootstrap resamples of a ratio
+    ratios = sort_values(ratios)
+    alpha = (1.0 - confidence) / 2
+    low, high = percentiles(ratios, (alpha, 1.0 - alpha), is_sorted=True)
+
+    below = bisect.bisect_left(ratios, 1.0)
+    above = len(ratios) - bisect.bisect_right(ratios, 1.0)
+    equal = len(ratios) - below - above
+    count = 2 * min(below + equal, above + equal)
+    pvalue = min(1.0, (count + 1) / (len(ratios) + 1))
+    return (low, high, pvalue)
+
+
+def stratified_bootstrap_ratio_test(strata, confidence=BOOTSTRAP_CONFIDENCE,
+                                    resamples=BOOTSTRAP_RESAMPLES, seed=0):
+    """Stratified bootstrap test of the geometric mean of the ratios
+    mean(sample2) / mean(sample1) of each stratum.
+
+    strata is a list of (sample1, sample2): for example, the values measured
+    on each host. Values are only resampled within their stratum, so strata
+    are compared like-for-like.
+
+    Returns:
+        (low, high, pvalue): see bootstrap_ratio_test().
+    """
+    if not strata:
+        raise ValueError("no stratum")
+
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+
+    sum_logs = [0.0] * resamples
+    for index, (sample1, sample2) in enumerate(strata):
+        if not sample1 or not sample2:
+            raise ValueError("empty sample")
+        # strata are independent: use a different seed per stratum
+        if numpy is not None:
+            ratios = _bootstrap_ratios_numpy(numpy, sample1, sample2,
+                                             resamples, 'mean', seed + index)
+        else:
+            ratios = _bootstrap_ratios(sample1, sample2, resamples, 'mean',
+                                       seed + index)
+        for resample, ratio in enumerate(ratios):
+            sum_logs[resample] += math.log(ratio)
+
+    nstrata = len(strata)
+    ratios = [math.exp(value / nstrata) for value in sum_logs]
+    return _bootstrap_ratios_test(ratios, confidence)
+
+
+def bootstrap_ratio(sample1, sample2, confidence=BOOTSTRAP_CONFIDENCE,
+                    resamples=BOOTSTRAP_RESAMPLES, statistic='mean', seed=0):
+    """Bootstrap confidence interval of the ratio statistic(sample2) /
+    statistic(sample1): see bootstrap_ratio_test().
+
+    Returns:
+        (low, high) bounds of the percentile confidence interval.
+    """
+    return bootstrap_ratio_test(sample1, sample2, confidence, resamples,
+                                statistic, seed)[:2]
+
+
+def mann_whitney_u(sample1, sample2):
+    """Mann-Whitney U test: non-parametric test of whether values of one
+    sample tend to be larger than values of the other sample.
+
+    Samples can have different lengths. The p-value is computed with the
+    normal approximation, corrected for ties and with a continuity
+    correction.
+
+    Returns:
+        (u, pvalue) where u is the U statistic of sample1 and pvalue is the
+        two-sided p-value.
+    """
+    n1 = len(sample1)
+    n2 = len(sample2)
+    if not n1 or not n2:
+        raise ValueError("empty sample")
+
+    # rank values, tied values get the average of their ranks
+    items = sorted([(value, 0) for value in sample1]
+                   + [(value, 1) for value in sample2])
+    n = n1 + n2
+    rank_sum1 = 0.0
+    ties = 0
+    start = 0
+    while start < n:
+        end = start
+        while end + 1 < n and items[end + 1][0] == items[start][0]:
+            end += 1
+        count = end - start + 1
+        rank = (start + end) / 2 + 1
+        rank_sum1 += rank * sum(1 for item in items[start:end + 1]
+                                if item[1] == 0)
+        ties += count ** 3 - count
+        start = end + 1
+
+    u1 = rank_sum1 - n1 * (n1 + 1) / 2
+    mean = n1 * n2 / 2
+    variance = n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1)))
+    if variance <= 0:
+        # all values are equal
+        return (u1, 1.0)
+    z = max(abs(u1 - mean) - 0.5, 0.0) / math.sqrt(variance)
+    pvalue = 2 * statistics.NormalDist().cdf(-z)
+    return (u1, min(pvalue, 1.0))
+
+
+def permutation_test(sample1, sample2, permutations=BOOTSTRAP_RESAMPLES,
+                     seed=0):
+    """Permutation test of the difference of means of two samples.
+
+    Samples can have different lengths. A fixed seed is used to get
+    reproducible results.
+
+    Returns:
+        The two-sided p-value.
+    """
+    import random
+
+    n1 = len(sample1)
+    n2 = len(sample2)
+    if not n1 or not n2:
+        raise ValueError("empty sample")
+
+    observed = abs(math.fsum(sample2) / n2 - math.fsum(sample1) / n1)
+    # tolerate rounding errors on sums of the same values
+    observed -= observed * 1e-9
+    values = list(sample1) + list(sample2)
+    rng = random.Random(seed)
+    count = 0
+    for _ in range(permutations):
+        rng.shuffle(values)
+        diff = abs(sum(values[n1:]) / n2 - sum(values[:n1]) / n1)
+        if diff >= observed:
+            count += 1
+    return (count + 1) / (permutations + 1)
+
+
+def adjust_pvalues(pvalues, method):
+    """Adjust p-values for multiple comparisons.
+
+    method is 'holm' (Holm-Bonferroni, controls the family-wise error rate)
+    or 'bh' (Benjamini-Hochberg, controls the false discovery rate).
+    """
+    count = len(pvalues)
+    order = sorted(range(count), key=pvalues.__getitem__)
+    adjusted = [None] * count
+    if method == 'holm':
+        running = 0.0
+        for rank, index in enumerate(order):
+            running = max(running, min(1.0, (count - rank) * pvalues[index]))
+            adjusted[index] = running
+    elif method == 'bh':
+        running = 1.0
+        for rank in range(count, 0, -1):
+            index = order[rank - 1]
+            running = min(running, pvalues[index] * count / rank)
+            adjusted[index] = running
+    else:
+        raise ValueError("unknown correction method: %r" % method)
+    return adjusted
+
+
 def parse_run_list(run_list):
     run_list = run_list.strip()
 
@@ -265,6 +508,8 @@ def create_environ(inherit_environ, locale, copy_all):
                 # Pyperf specific variables
                 "PYPERF_PERF_RECORD_DATA_DIR", "PYPERF_PERF_RECORD_EXTRA_OPTS",
                 "PYPERF_TACHYON_OPTS",
+                # Cache directory, see get_cache_dir()
+                "PYPERF_CACHE_DIR", "XDG_CACHE_HOME", "LOCALAPPDATA",
                 ]
     if locale:
         copy_env.extend(('LANG', 'LC_ADDRESS', 'LC_ALL', 'LC_COLLATE',
@@ -282,6 +527,7 @@ def create_environ(inherit_environ, locale, copy_all):
 
 class _Pipe:
     _OPEN_MODE = "r"
+    _OS_OPEN_FLAGS = os.O_RDONLY
 
     def __init__(self, fd):
         self._fd = fd
@@ -304,6 +550,24 @@ class _Pipe:
         elif fd is not None:
             os.close(fd)
 
+    def to_subprocess(self):
+        if MS_WINDOWS:
+            os.set_handle_inheritable(self._handle, True)
+            arg = self._handle
+        else:
+            os.set_inheritable(self._fd, True)
+            arg = self._fd
+        return str(arg)
+
+    @classmethod
+    def from_subprocess(cls, arg):
+        arg = int(arg)
+        if MS_WINDOWS:
+            fd = msvcrt.open_osfhandle(arg, cls._OS_OPEN_FLAGS)
+        else:
+            fd = arg
+        return cls(fd)
+
     def __enter__(self):
         return self
 
@@ -349,23 +613,8 @@ class ReadPipe(_Pipe):
 
 
 class WritePipe(_Pipe):
-    def to_subprocess(self):
-        if MS_WINDOWS:
-            os.set_handle_inheritable(self._handle, True)
-            arg = self._handle
-        else:
-            os.set_inheritable(self._fd, True)
-            arg = self._fd
-        return str(arg)
-
-    @classmethod
-    def from_subprocess(cls, arg):
-        arg = int(arg)
-        if MS_WINDOWS:
-            fd = msvcrt.open_osfhandle(arg, os.O_WRONLY)
-        else:
-            fd = arg
-        return cls(fd)
+    _OPEN_MODE = "w"
+    _OS_OPEN_FLAGS = os.O_WRONLY
 
     def open_text(self):
         file = open(self._fd, "w", encoding="utf8")
@@ -373,6 +622,20 @@ class WritePipe(_Pipe):
         return file
 
 
+def get_cache_dir():
+    # Directory of pyperf caches: PYPERF_CACHE_DIR environment variable,
+    # or a "pyperf" subdirectory of the user cache directory
+    path = os.environ.get('PYPERF_CACHE_DIR')
+    if path:
+        return path
+    if MS_WINDOWS:
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = (os.environ.get('XDG_CACHE_HOME')
+                or os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(base, 'pyperf')
+
+
 def create_pipe():
     rfd, wfd = os.pipe()
     rpipe = ReadPipe(rfd)
@@ -386,23 +649,63 @@ def median_abs_dev(values):
     return statistics.median([abs(median - sample) for sample in values])
 
 
-def percentile(values, p):
-    if not isinstance(p, float) or not (0.0 <= p <= 1.0):
-        raise ValueError("p must be a float in the range [0.0; 1.0]")
+# Minimum number of values to sort them with NumPy, if available
+_NUMPY_SORT_MIN = 10000
+
+
+def sort_values(values):
+    """Get values sorted: array of doubles if values is an array of doubles,
+    list otherwise.
+
+    Use NumPy, if available, to sort a large array of doubles.
+    """
+    if not (isinstance(values, array.array) and values.typecode == 'd'):
+        return sorted(values)
+
+    result = array.array('d')
+    if len(values) >= _NUMPY_SORT_MIN:
+        try:
+            import numpy
+        except ImportError:
+            pass
+        else:
+            result.frombytes(numpy.sort(numpy.frombuffer(values)).tobytes())
+            return result
+    result.extend(sorted(values))
+    return result
+
 
-    values = sorted(values)
+def percentiles(values, ps, is_sorted=False):
+    """Compute multiple percentiles, values are only sorted once.
+
+    ps is a sequence of floats in the range [0.0; 1.0]. If is_sorted is true,
+    values must already be sorted.
+    """
+    for p in ps:
+        if not isinstance(p, float) or not (0.0 <= p <= 1.0):
+            raise ValueError("p must be a float in the range [0.0; 1.0]")
+
+    if not is_sorted:
+        values = sort_values(values)
     if not values:
         raise ValueError("no value")
 
-    k = (len(values) - 1) * p
-    f = math.floor(k)
-    c = math.ceil(k)
-    if f != c:
-        d0 = values[f] * (c - k)
-        d1 = values[c] * (k - f)
-        return d0 + d1
-    else:
-        return values[int(k)]
+    results = []
+    for p in ps:
+        k = (len(values) - 1) * p
+        f = math.floor(k)
+        c = math.ceil(k)
+        if f != c:
+            d0 = values[f] * (c - k)
+            d1 = values[c] * (k - f)
+            results.append(d0 + d1)
+        else:
+            results.append(values[int(k)])
+    return results
+
+
+def percentile(values, p):
+    return percentiles(values, (p,))[0]
 
 
 if hasattr(statistics, 'geometric_mean'):
@@ -428,18 +731,37 @@ def geometric_mean(data):
 def merge_profile_stats(profiler, dst):
     """
     Save pstats by merging into an existing file.
+
+    The file is locked while stats are merged: worker processes run in
+    parallel by bench_parallel_func() write into the same file.
     """
+    import marshal
     import pstats
-    if os.path.isfile(dst):
-        try:
-            src_stats = pstats.Stats(profiler)
-        except TypeError:
-            # If no actual stats were collected, a TypeError is raised
-            # and we don't need to merge anything into the output.
-            return
-
-        dst_stats = pstats.Stats(dst)
-        dst_stats.add(src_stats)
-        dst_stats.dump_stats(dst)
-    else:
-        profiler.dump_stats(dst)
+    from pyperf._resultlog import lock_file
+
+    with open(dst, 'a+b') as fp:
+        with lock_file(fp):
+            # read and write through fp: on Windows, the lock denies access
+            # using other file descriptors
+            fp.seek(0)
+            data = fp.read()
+            if data:
+                try:
+                    stats = pstats.Stats(profiler)
+                except TypeError:
+                    # If no actual stats were collected, a TypeError is raised
+                    # and we don't need to merge anything into the output.
+                    return
+
+                dst_stats = pstats.Stats()
+                dst_stats.stats = marshal.loads(data)
+                dst_stats.get_top_level_stats()
+                stats.add(dst_stats)
+            else:
+                profiler.create_stats()
+                stats = profiler
+
+            fp.seek(0)
+            fp.truncate()
+            marshal.dump(stats.stats, fp)
+            fp.flush()
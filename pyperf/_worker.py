@@ -7,7 +7,8 @@ import pyperf
 from pyperf._formatter import (format_number, format_value, format_values,
                                format_timedelta)
 from pyperf._hooks import instantiate_selected_hooks
-from pyperf._utils import MS_WINDOWS, percentile, median_abs_dev
+from pyperf._shard import format_shard
+from pyperf._utils import MS_WINDOWS, percentiles, median_abs_dev
 from pyperf._system import OS_LINUX
 
 
@@ -44,6 +45,16 @@ class WorkerTask:
         self.warmups = None
         self.values = ()
 
+        # Source of the benchmark hashed by the --result-cache option:
+        # None if results must not be cached
+        self.cache_source = None
+
+        # --latency: if true, task_func records the latency of each call
+        # into self.latency_recorder (None when computing warmups)
+        self.record_latency = False
+        self.latency = None
+        self.latency_recorder = None
+
     def _compute_values(self, values, nvalue,
                         is_warmup=False,
                         calibrate_loops=False,
@@ -70,6 +81,10 @@ class WorkerTask:
         inner_loops = self.inner_loops
         if not inner_loops:
             inner_loops = 1
+        if is_warmup:
+            self.latency_recorder = None
+        else:
+            self.latency_recorder = self.latency
         while True:
             if index > nvalue:
                 break
@@ -114,6 +129,7 @@ class WorkerTask:
 
             index += 1
 
+        self.latency_recorder = None
         for hook in hook_managers.values():
             hook.teardown(self.metadata)
 
@@ -129,8 +145,7 @@ class WorkerTask:
 
         # test if the first value is an outlier
         values = sample1[1:] + sample2
-        q1 = percentile(values, 0.25)
-        q3 = percentile(values, 0.75)
+        q1, q3 = percentiles(values, (0.25, 0.75))
         iqr = q3 - q1
         outlier_max = (q3 + 1.5 * iqr)
         # only check maximum, not minimum
@@ -140,10 +155,8 @@ class WorkerTask:
         mean2 = statistics.mean(sample2)
         mean_diff = (mean1 - mean2) / float(mean2)
 
-        s1_q1 = percentile(sample1, 0.25)
-        s2_q1 = percentile(sample2, 0.25)
-        s1_q3 = percentile(sample1, 0.75)
-        s2_q3 = percentile(sample2, 0.75)
+        s1_q1, s1_q3 = percentiles(sample1, (0.25, 0.75))
+        s2_q1, s2_q3 = percentiles(sample2, (0.25, 0.75))
         q1_diff = (s1_q1 - s2_q1) / float(s2_q1)
         q3_diff = (s1_q3 - s2_q3) / float(s2_q3)
 
@@ -281,6 +294,9 @@ class WorkerTask:
             self.metadata['inner_loops'] = self.inner_loops
         self.warmups = []
         self.values = []
+        if self.record_latency:
+            from pyperf._latency import LatencyHistogram
+            self.latency = LatencyHistogram()
 
         if args.calibrate_warmups or args.recalibrate_warmups:
             self.calibrate_warmups()
@@ -293,6 +309,14 @@ class WorkerTask:
         metadata2 = self.collect_metadata()
         metadata2.update(self.metadata)
         self.metadata = metadata2
+        if args.host_calibration is not None:
+            # measured by the manager
+            self.metadata['host_calibration'] = args.host_calibration
+        elif args.calibrate_host:
+            from pyperf._host_calibration import get_host_calibration
+            self.metadata['host_calibration'] = get_host_calibration()
+        if args.shard:
+            self.metadata['shard'] = format_shard(args.shard)
 
         self.metadata['loops'] = self.loops
 
@@ -301,10 +325,16 @@ class WorkerTask:
         self.compute()
         self.metadata['duration'] = time.monotonic() - start_time
 
+        latency = self.latency
+        if latency is not None and not latency.get_count():
+            # calibration run
+            latency = None
+
         return pyperf.Run(self.values,
                           warmups=self.warmups,
                           metadata=self.metadata,
-                          collect_metadata=False)
+                          collect_metadata=False,
+                          latency=latency)
 
     def _set_memory_value(self, value):
         is_calibration = (not self.values)
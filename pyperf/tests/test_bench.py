@@ -1,12 +1,16 @@
+import array
 import datetime
 import errno
 import gzip
+import json
+import os.path
 import unittest
 
 import pyperf
 from pyperf import tests
 
 
+TELCO = os.path.join(os.path.dirname(__file__), 'telco.json')
 NUMBER_TYPES = (int, float)
 
 
@@ -85,6 +89,41 @@ class RunTests(unittest.TestCase):
             self.assertEqual(run.warmups, ((4, 3),))
             self.assertIsInstance(run.warmups[0][1], number_type)
 
+    def test_values_buffer(self):
+        run = pyperf.Run([1.5, 2.5], warmups=[(2, 0.5)],
+                         collect_metadata=False)
+        self.assertEqual(run.values, (1.5, 2.5))
+        self.assertEqual(run.warmups, ((2, 0.5),))
+        self.assertIsInstance(run.warmups[0][0], int)
+
+        buf = run.get_values_buffer()
+        self.assertEqual(buf.format, 'd')
+        self.assertTrue(buf.readonly)
+        self.assertEqual(buf.tolist(), [1.5, 2.5])
+
+        # int values are converted to float
+        run = pyperf.Run([1, 2], collect_metadata=False)
+        self.assertEqual(run.get_values_buffer().tolist(), [1.0, 2.0])
+
+        bench = pyperf.Benchmark([create_run([1.0, 2.0]),
+                                  create_run([3.0])])
+        self.assertEqual(bench.get_values(), (1.0, 2.0, 3.0))
+        self.assertEqual(bench.get_values_buffer().tolist(), [1.0, 2.0, 3.0])
+
+    def test_values_cache(self):
+        run = create_run([1.0, 2.0])
+        self.assertIs(run.values, run.values)
+
+        bench = pyperf.Benchmark([run])
+        values = bench.get_values()
+        self.assertIs(bench.get_values(), values)
+
+        # the cache is invalidated when runs are modified
+        bench.add_run(create_run([3.0]))
+        self.assertEqual(bench.get_values(), (1.0, 2.0, 3.0))
+        bench._filter_runs(False, [0])
+        self.assertEqual(bench.get_values(), (3.0,))
+
     def test_get_date(self):
         date = datetime.datetime.now().isoformat(' ')
         run = pyperf.Run([1.0], metadata={'date': date},
@@ -233,6 +272,84 @@ class BenchmarkTests(unittest.TestCase):
 
         self.check_benchmarks_equal(bench, bench2)
 
+    def test_compression(self):
+        import bz2
+        import lzma
+
+        codecs = [('.xz', lzma), ('.bz2', bz2)]
+        try:
+            from compression import zstd
+        except ImportError:
+            pass
+        else:
+            codecs.append(('.zst', zstd))
+
+        bench = self.create_dummy_benchmark()
+        expected = tests.benchmark_as_json(bench)
+        for suffix, module in codecs:
+            with tests.temporary_file(suffix='.json' + suffix) as tmp_name:
+                bench.dump(tmp_name)
+                with module.open(tmp_name, 'rt', encoding='utf-8') as fp:
+                    self.assertEqual(fp.read(), expected)
+                bench2 = pyperf.Benchmark.load(tmp_name)
+            self.check_benchmarks_equal(bench, bench2)
+
+            # binary format
+            with tests.temporary_file(suffix='.pyperf' + suffix) as tmp_name:
+                bench.dump(tmp_name)
+                with module.open(tmp_name, 'rb') as fp:
+                    self.assertEqual(fp.read(6), b'PYPERF')
+                bench2 = pyperf.Benchmark.load(tmp_name)
+            self.check_benchmarks_equal(bench, bench2)
+
+    def test_incremental_stats(self):
+        import statistics
+
+        runs = [create_run([1.5, 0.25, 3.0]),
+                create_run([2.0, 1e-9]),
+                create_run([7.0, 0.125, 5.5])]
+        bench = pyperf.Benchmark(runs[:1])
+        for run in runs[1:]:
+            bench.mean()
+            bench.median()
+            bench.add_run(run)
+
+            # statistics are updated by add_run(), results must be the same
+            values = bench.get_values()
+            self.assertEqual(bench.mean(), statistics.mean(values))
+            self.assertEqual(bench.stdev(), statistics.stdev(values))
+            self.assertEqual(bench.median(), statistics.median(values))
+
+        values = bench.get_values()
+        self.assertEqual(bench.median_abs_dev(),
+                         statistics.median([abs(value - bench.median())
+                                            for value in values]))
+        # sorted values are stored as an array of doubles
+        self.assertIsInstance(bench._get_stats().sorted_values(), array.array)
+
+        # int values
+        bench = pyperf.Benchmark([create_run([1, 2])])
+        bench.mean()
+        bench.add_run(create_run([3, 6]))
+        self.assertEqual(bench.mean(), 3)
+        self.assertIsInstance(bench.mean(), int)
+
+    def test_percentiles(self):
+        bench = pyperf.Benchmark([create_run([4.0, 6.0, 9.0, 7.0, 5.0]),
+                                  create_run([8.0, 3.0, 0.5, 1.0, 2.0])])
+        self.assertEqual(bench.percentiles((0, 25, 50, 100)),
+                         [0.5, 2.25, 4.5, 9.0])
+        self.assertEqual(bench.percentile(75), 6.75)
+        self.assertEqual(bench.get_sorted_values(),
+                         (0.5, 1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0, 9.0))
+
+        # the sorted values are updated by add_run()
+        bench.add_run(create_run([10.0]))
+        self.assertEqual(bench.percentiles((0, 100)), [0.5, 10.0])
+        self.assertEqual(bench.get_sorted_values()[-2:], (9.0, 10.0))
+        with self.assertRaises(ValueError):
+            bench.percentiles((50, 101))
+
     def test_add_runs(self):
         values1 = (1.0, 2.0, 3.0)
         bench = pyperf.Benchmark([create_run(values1)])
@@ -401,6 +518,122 @@ class BenchmarkTests(unittest.TestCase):
         self.assertEqual(bench.median_abs_dev(), 0.0)
 
 
+class LatencyTests(unittest.TestCase):
+    def test_buckets(self):
+        from pyperf._latency import bucket_index, bucket_range
+
+        for value in (0, 1, 255, 256, 1000, 12345, 10 ** 9, 2 ** 40 + 3):
+            lowest, highest = bucket_range(bucket_index(value))
+            self.assertLessEqual(lowest, value)
+            self.assertLessEqual(value, highest)
+            # relative error smaller than 1%
+            self.assertLess(highest - lowest, max(value, 1) / 100)
+
+    def test_percentiles(self):
+        latency = pyperf.LatencyHistogram()
+        for value in range(1, 101):
+            latency.record(value * 1000)
+        self.assertEqual(latency.get_count(), 100)
+
+        p50, p99, p100 = latency.percentiles((50, 99, 100))
+        self.assertAlmostEqual(p50, 50e-6, delta=50e-6 / 100)
+        self.assertAlmostEqual(p99, 99e-6, delta=99e-6 / 100)
+        self.assertAlmostEqual(p100, 100e-6, delta=100e-6 / 100)
+        self.assertAlmostEqual(latency.min(), 1e-6)
+        with self.assertRaises(ValueError):
+            latency.percentile(101)
+
+    def test_benchmark(self):
+        hist1 = pyperf.LatencyHistogram()
+        hist1.record(1000)
+        hist2 = pyperf.LatencyHistogram()
+        hist2.record(3000)
+        hist2.record(3000)
+        runs = [pyperf.Run([1e-6], metadata={'name': 'bench'},
+                           collect_metadata=False, latency=hist1),
+                pyperf.Run([3e-6], metadata={'name': 'bench'},
+                           collect_metadata=False, latency=hist2)]
+        bench = pyperf.Benchmark(runs)
+        self.assertEqual(bench.get_latency().get_count(), 3)
+
+        with tests.temporary_file() as tmp_name:
+            bench.dump(tmp_name)
+            bench2 = pyperf.Benchmark.load(tmp_name)
+        self.assertEqual([run.latency for run in bench2.get_runs()],
+                         [hist1, hist2])
+        self.assertAlmostEqual(bench2.get_latency().percentile(50), 3e-6,
+                               delta=3e-8)
+
+        # benchmark without latency
+        bench = pyperf.Benchmark([pyperf.Run([1.0], metadata={'name': 'b'},
+                                             collect_metadata=False)])
+        self.assertIsNone(bench.get_latency())
+
+    def test_compare_zero_latency(self):
+        from pyperf._compare import CompareData, CompareResult
+
+        def create_bench(latency):
+            hist = pyperf.LatencyHistogram()
+            for _ in range(3):
+                hist.record(latency)
+            run = pyperf.Run([1e-6, 1.1e-6], metadata={'name': 'bench'},
+                             collect_metadata=False, latency=hist)
+            return pyperf.Benchmark([run])
+
+        # the reference percentiles fall in the 0 ns bucket
+        # (coarse clock resolution)
+        result = CompareResult(CompareData('ref', create_bench(0)),
+                               CompareData('changed', create_bench(1000)))
+        self.assertEqual(result.format_latency(),
+                         ['p50: 0.00 ns -> 1.00 us: n/a',
+                          'p99: 0.00 ns -> 1.00 us: n/a',
+                          'p99.9: 0.00 ns -> 1.00 us: n/a'])
+
+
+class TestBenchmarkGroup(unittest.TestCase):
+    def create_bench(self, hostname, values, name='bench'):
+        runs = [pyperf.Run([value],
+                           metadata={'name': name, 'hostname': hostname},
+                           collect_metadata=False)
+                for value in values]
+        return pyperf.Benchmark(runs)
+
+    def test_strata(self):
+        group = pyperf.BenchmarkGroup([self.create_bench('a', [1.0, 3.0]),
+                                       self.create_bench('b', [4.0, 6.0, 8.0])])
+        group.add_benchmark(self.create_bench('a', [2.0]))
+
+        self.assertEqual(group.get_name(), 'bench')
+        self.assertEqual(group.get_hosts(), ['a', 'b'])
+        self.assertEqual(group.get_stratum('a').get_values(), (1.0, 3.0, 2.0))
+        self.assertEqual(group.get_nrun(), 6)
+        self.assertEqual(group.get_nvalue(), 6)
+        # each host has the same weight
+        self.assertEqual(group.mean(), 4.0)
+
+        within, between = group.variance_components()
+        self.assertEqual(within, 2.5)
+        # variance of host means (8.0) minus within / n
+        self.assertAlmostEqual(between, 8.0 - 2.5 / 3)
+        self.assertAlmostEqual(group.stdev() ** 2, within + between)
+
+        group = group.select_hosts(['b'])
+        self.assertEqual(group.get_hosts(), ['b'])
+        self.assertEqual(group.variance_components(), (4.0, 0.0))
+
+    def test_incompatible(self):
+        group = pyperf.BenchmarkGroup([self.create_bench('a', [1.0])])
+        with self.assertRaises(ValueError):
+            group.add_benchmark(self.create_bench('b', [1.0], name='other'))
+
+        # runs of the same host must be compatible
+        run = pyperf.Run([1.0], metadata={'name': 'bench', 'hostname': 'a',
+                                          'python_version': '3.14'},
+                         collect_metadata=False)
+        with self.assertRaises(ValueError):
+            group.add_run(run)
+
+
 class TestBenchmarkSuite(unittest.TestCase):
     def benchmark(self, name):
         run = pyperf.Run([1.0, 1.5, 2.0],
@@ -442,6 +675,176 @@ class TestBenchmarkSuite(unittest.TestCase):
 
         self.check_dummy_suite(suite)
 
+    def test_binary(self):
+        suite = pyperf.BenchmarkSuite.load(TELCO)
+        # run mixing int and float values, and integer warmups
+        run = pyperf.Run([1, 2.5], warmups=[(1, 3)],
+                         metadata={'name': 'mixed', 'unit': 'integer',
+                                   'tags': ['a', 'b']},
+                         collect_metadata=False)
+        suite.add_benchmark(pyperf.Benchmark([run]))
+
+        with tests.temporary_file(suffix='.pyperf') as filename:
+            suite.dump(filename)
+            with open(filename, 'rb') as fp:
+                self.assertEqual(fp.read(8), b'PYPERF\x00\x01')
+            suite2 = pyperf.BenchmarkSuite.load(filename)
+            self.assertEqual(suite2._as_json(), suite._as_json())
+
+            # only load selected benchmarks
+            suite3 = pyperf.BenchmarkSuite.load(filename, names=['mixed'])
+            self.assertEqual(suite3.get_benchmark_names(), ['mixed'])
+            self.assertEqual(suite3.get_benchmark('mixed').get_runs()[0].values,
+                             (1, 2.5))
+            with self.assertRaises(KeyError):
+                pyperf.BenchmarkSuite.load(filename, names=['unknown'])
+
+    def test_load_names(self):
+        suite = self.create_dummy_suite()
+
+        with tests.temporary_file() as filename:
+            suite.dump(filename)
+            suite = pyperf.BenchmarkSuite.load(filename, names=['go'])
+
+        self.assertEqual(suite.get_benchmark_names(), ['go'])
+
+    def test_load_shared_metadata(self):
+        runs = [create_run([1.0 + index],
+                           metadata={'name': 'bench', 'hostname': 'host',
+                                     'duration': 1.0 + index % 2})
+                for index in range(3)]
+        suite = pyperf.BenchmarkSuite([pyperf.Benchmark(runs)])
+
+        for suffix in ('.json', '.pyperf'):
+            with tests.temporary_file(suffix=suffix) as filename:
+                suite.dump(filename)
+                suite2 = pyperf.BenchmarkSuite.load(filename)
+
+            bench = suite2.get_benchmark('bench')
+            loaded = bench.get_runs()
+            # runs share the metadata common to the benchmark
+            self.assertIs(loaded[0]._metadata._common,
+                          loaded[1]._metadata._common)
+            for run, run2 in zip(runs, loaded):
+                self.assertEqual(run2.get_metadata(), run.get_metadata())
+            self.assertEqual(bench.get_metadata(),
+                             {'name': 'bench', 'hostname': 'host'})
+
+    def test_load_trusted(self):
+        runs = [create_run([1.0 + index], warmups=[(1, 0.5)],
+                           metadata={'name': 'bench', 'hostname': 'host',
+                                     'duration': 1.0 + index % 2})
+                for index in range(3)]
+        suite = pyperf.BenchmarkSuite([pyperf.Benchmark(runs)])
+
+        for suffix in ('.json', '.pyperf', '.jsonl'):
+            with tests.temporary_file(suffix=suffix) as filename:
+                suite.dump(filename)
+                suite2 = pyperf.BenchmarkSuite.load(filename, trusted=True)
+
+            bench = suite2.get_benchmark('bench')
+            self.assertEqual(bench.get_values(), (1.0, 2.0, 3.0))
+            for run, run2 in zip(runs, bench.get_runs()):
+                self.assertEqual(run2.warmups, run.warmups)
+                self.assertEqual(run2.get_metadata(), run.get_metadata())
+            self.assertEqual(bench.get_metadata(),
+                             {'name': 'bench', 'hostname': 'host'})
+
+        # trusted files are not validated
+        data = suite._as_json()
+        data['benchmarks'][0]['runs'][0]['values'] = [-1.0]
+        with tests.temporary_file() as filename:
+            with open(filename, 'w', encoding='utf-8') as fp:
+                json.dump(data, fp)
+            with self.assertRaises(ValueError):
+                pyperf.BenchmarkSuite.load(filename)
+            suite2 = pyperf.BenchmarkSuite.load(filename, trusted=True)
+            self.assertEqual(suite2.get_benchmark('bench').get_values(),
+                             (-1.0, 2.0, 3.0))
+
+            # but files written by older pyperf versions are
+            data['version'] = 6
+            with open(filename, 'w', encoding='utf-8') as fp:
+                json.dump(data, fp)
+            with self.assertRaises(ValueError):
+                pyperf.BenchmarkSuite.load(filename, trusted=True)
+
+        # each line of a results log is checked
+        data['version'] = '1.0'
+        with tests.temporary_file(suffix='.jsonl') as filename:
+            with open(filename, 'w', encoding='utf-8') as fp:
+                for version in ('1.0', 6):
+                    data['version'] = version
+                    fp.write(json.dumps(data) + '\n')
+            with self.assertRaises(ValueError):
+                pyperf.BenchmarkSuite.load(filename, trusted=True)
+
+    def test_load_trusted_binary(self):
+        from pyperf._binary import MAGIC, _HEADER_SIZE
+
+        run = create_run([1.0], metadata={'name': 'bench'})
+        suite = pyperf.BenchmarkSuite([pyperf.Benchmark([run])])
+
+        def write_binary(filename, version):
+            suite.dump(filename, replace=True)
+            with open(filename, 'rb') as fp:
+                content = fp.read()
+            start = len(MAGIC) + _HEADER_SIZE.size
+            size, = _HEADER_SIZE.unpack(content[len(MAGIC):start])
+            header = json.loads(content[start:start + size])
+            # invalid value stored in the header
+            header['benchmarks'][0]['runs'][0]['values'] = [-1.0]
+            if version is None:
+                del header['version']
+            else:
+                header['version'] = version
+            header = json.dumps(header).encode('utf-8')
+            with open(filename, 'wb') as fp:
+                fp.write(MAGIC + _HEADER_SIZE.pack(len(header)) + header
+                         + content[start + size:])
+
+        with tests.temporary_file(suffix='.pyperf') as filename:
+            write_binary(filename, '1.0')
+            suite2 = pyperf.BenchmarkSuite.load(filename, trusted=True)
+            self.assertEqual(suite2.get_benchmark('bench').get_values(),
+                             (-1.0,))
+
+            # files written by other versions are validated
+            for version in (None, '0.9'):
+                write_binary(filename, version)
+                with self.assertRaises(ValueError):
+                    pyperf.BenchmarkSuite.load(filename, trusted=True)
+
+    def test_results_log(self):
+        with tests.temporary_file(suffix='.jsonl') as filename:
+            for values in ((1.0, 2.0), (3.0,)):
+                run = create_run(values, metadata={'name': 'bench'})
+                pyperf.add_runs(filename, pyperf.Benchmark([run]))
+            pyperf.add_runs(filename, self.create_dummy_suite())
+
+            with open(filename, 'rb') as fp:
+                self.assertEqual(len(fp.readlines()), 3)
+            # an interrupted writer leaves an incomplete last line
+            with open(filename, 'ab') as fp:
+                fp.write(b'{"version":')
+
+            suite = pyperf.BenchmarkSuite.load(filename)
+            self.assertEqual(suite.get_benchmark_names(),
+                             ['bench', 'telco', 'go'])
+            self.assertEqual(suite.get_benchmark('bench').get_values(),
+                             (1.0, 2.0, 3.0))
+
+            suite = pyperf.BenchmarkSuite.load(filename, names=['go'])
+            self.assertEqual(suite.get_benchmark_names(), ['go'])
+
+            from pyperf._resultlog import compact
+            compact(filename)
+            with open(filename, 'rb') as fp:
+                self.assertEqual(len(fp.readlines()), 1)
+            suite = pyperf.BenchmarkSuite.load(filename)
+            self.assertEqual(suite.get_benchmark('bench').get_values(),
+                             (1.0, 2.0, 3.0))
+
     def test_dump_replace(self):
         suite = self.create_dummy_suite()
 
@@ -456,6 +859,80 @@ class TestBenchmarkSuite(unittest.TestCase):
             # ok if replace is true
             suite.dump(tmp_name, replace=True)
 
+    def test_name_index(self):
+        telco = self.benchmark('telco')
+        go = self.benchmark('go')
+        suite = pyperf.BenchmarkSuite([telco, go])
+        self.assertIs(suite.get_benchmark('go'), go)
+        with self.assertRaises(ValueError):
+            suite.add_benchmark(go)
+        with self.assertRaises(ValueError):
+            suite.add_benchmark(self.benchmark('go'))
+
+        # the index is updated when a benchmark is renamed
+        go.update_metadata({'name': 'go2'})
+        self.assertIs(suite.get_benchmark('go2'), go)
+        with self.assertRaises(KeyError):
+            suite.get_benchmark('go')
+
+        suite._convert_exclude_benchmark(['telco'])
+        with self.assertRaises(KeyError):
+            suite.get_benchmark('telco')
+        suite.add_benchmark(telco)
+        self.assertEqual(suite.get_benchmark_names(), ['go2', 'telco'])
+
+    def test_load_suite_worker(self):
+        import pickle
+        from pyperf._bench import _load_suite_worker, _unpack_suite
+
+        filename = os.path.join(os.path.dirname(__file__),
+                                'mult_list_py36.json')
+        expected = pyperf.BenchmarkSuite.load(filename)
+        data = pickle.loads(pickle.dumps(_load_suite_worker(filename)))
+        suite = _unpack_suite(data)
+        self.assertEqual(suite.filename, filename)
+        self.assertEqual(suite._as_json(), expected._as_json())
+        for bench, bench2 in zip(suite, expected):
+            self.assertEqual(bench.mean(), bench2.mean())
+            self.assertEqual(bench.stdev(), bench2.stdev())
+            self.assertEqual(bench.percentile(90), bench2.percentile(90))
+
+        # integer values, calibration run without values
+        runs = [create_run(warmups=[(1, 1.0)], values=(),
+                           metadata={'calibrate_loops': 1}),
+                create_run(values=(10, 12))]
+        bench = pyperf.Benchmark(runs)
+        data = pickle.loads(pickle.dumps(bench._pack()))
+        bench2 = pyperf.Benchmark._unpack(data)
+        self.assertEqual(bench2.get_values(), (10, 12))
+        self.assertEqual([run.warmups for run in bench2.get_runs()],
+                         [((1, 1.0),), ()])
+        self.assertEqual(bench2.get_metadata(), bench.get_metadata())
+
+    def test_name_index_other_suite(self):
+        go = self.benchmark('go')
+        suite = pyperf.BenchmarkSuite([go])
+        telco = self.benchmark('telco')
+        suite2 = pyperf.BenchmarkSuite([telco])
+        index2 = suite2._get_index()
+
+        # renaming a benchmark only invalidates the index of its suites
+        go.update_metadata({'name': 'go2'})
+        self.assertIsNone(suite._index)
+        self.assertIs(suite2._get_index(), index2)
+        self.assertIs(suite.get_benchmark('go2'), go)
+
+        # a benchmark outside suites has no suite to notify
+        bench = self.benchmark('bench')
+        bench.update_metadata({'name': 'bench2'})
+        self.assertIsNone(bench._suites)
+
+        # the benchmark can be pickled
+        import pickle
+        go2 = pickle.loads(pickle.dumps(go))
+        self.assertEqual(go2.get_name(), 'go2')
+        self.assertIsNone(go2._suites)
+
     def test_add_runs(self):
         # bench 1
         values = (1.0, 2.0, 3.0)
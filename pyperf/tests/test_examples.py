@@ -58,6 +58,11 @@ class ExampleTests(unittest.TestCase):
         args = ['-p2', '-w1', '--min-time=0.001']
         self.check_command(script, args)
 
+    def test_bench_parallel_func(self):
+        script = 'bench_parallel_func.py'
+        args = ['-p2', '-w1', '--min-time=0.001', '--parallel=1']
+        self.check_command(script, args)
+
     def test_bench_time_func(self):
         script = 'bench_time_func.py'
         args = ['-p2', '-w1', '--min-time=0.001']
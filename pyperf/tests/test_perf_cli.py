@@ -1,4 +1,6 @@
+import json
 import os
+import re
 import sys
 import textwrap
 import unittest
@@ -9,6 +11,8 @@ from pyperf import tests
 
 TESTDIR = os.path.dirname(__file__)
 TELCO = os.path.join(TESTDIR, 'telco.json')
+# Bootstrap confidence interval, ex: "[1.05x-1.09x]"
+INTERVAL_REGEX = re.compile(r'\[([0-9.]+)x-([0-9.]+)x\]')
 
 
 class BaseTestCase:
@@ -27,6 +31,20 @@ class BaseTestCase:
             runs.append(run)
         return pyperf.Benchmark(runs)
 
+    def assertOutputEqual(self, output, expected, delta=0.02):
+        # Bootstrap intervals depend on NumPy being installed: compare
+        # their bounds with a tolerance
+        self.assertEqual(INTERVAL_REGEX.sub('[interval]', output),
+                         INTERVAL_REGEX.sub('[interval]', expected))
+        bounds = INTERVAL_REGEX.findall(output)
+        expected_bounds = INTERVAL_REGEX.findall(expected)
+        for interval, expected_interval in zip(bounds, expected_bounds):
+            for bound, expected_bound in zip(interval, expected_interval):
+                self.assertAlmostEqual(float(bound), float(expected_bound),
+                                       delta=delta,
+                                       msg="%s != %s"
+                                           % (interval, expected_interval))
+
     def run_command(self, *args, **kwargs):
         cmd = [sys.executable, '-m', 'pyperf']
         cmd.extend(args)
@@ -129,10 +147,20 @@ class TestPerfCLI(BaseTestCase, unittest.TestCase):
         stdout = self.compare('compare_to', ref_result, changed_result, '-v')
 
         expected = ('Mean +- std dev: [ref] 1.50 sec +- 0.50 sec '
-                    '-> [changed] 2.00 sec +- 0.50 sec: 1.33x slower\n'
+                    '-> [changed] 2.00 sec +- 0.50 sec: 1.33x slower '
+                    '[0.91x-2.00x]\n'
                     'Not significant!')
-        self.assertEqual(stdout.rstrip(),
-                         expected)
+        # intervals of 3 values are wide
+        self.assertOutputEqual(stdout.rstrip(), expected, delta=0.2)
+
+    def test_jobs(self):
+        # load files in parallel: the output must be the same
+        filenames = [os.path.join(TESTDIR, 'mult_list_py%s.json' % version)
+                     for version in (36, 37, 38)]
+        for args in (('compare_to',), ('stats',), ('show', '-b', '[1]*1000')):
+            stdout = self.run_command(*args, *filenames)
+            stdout_jobs = self.run_command(*args, '-j', '2', *filenames)
+            self.assertEqual(stdout_jobs, stdout)
 
     def test_compare_to_rest_table(self):
         ref_result = self.create_bench((1.0,),
@@ -206,10 +234,11 @@ class TestPerfCLI(BaseTestCase, unittest.TestCase):
         stdout = self.compare('compare_to', ref_result, changed_result, '-v')
 
         expected = ('Mean +- std dev: [ref] 1.50 sec +- 0.50 sec '
-                    '-> [changed] 2.00 sec +- 0.50 sec: 1.33x slower\n'
+                    '-> [changed] 2.00 sec +- 0.50 sec: 1.33x slower '
+                    '[0.91x-2.00x]\n'
                     'Not significant!')
-        self.assertEqual(stdout.rstrip(),
-                         expected)
+        # intervals of 3 values are wide
+        self.assertOutputEqual(stdout.rstrip(), expected, delta=0.2)
 
     def test_compare_to_same(self):
         values = (1.0, 1.5, 2.0)
@@ -219,14 +248,15 @@ class TestPerfCLI(BaseTestCase, unittest.TestCase):
         stdout = self.compare('compare_to', ref_result, changed_result, '-v')
 
         expected = ('Mean +- std dev: [ref] 1.50 sec +- 0.50 sec '
-                    '-> [changed] 1.50 sec +- 0.50 sec: no change\n'
+                    '-> [changed] 1.50 sec +- 0.50 sec: no change '
+                    '[0.64x-1.57x]\n'
                     'Not significant!')
-        self.assertEqual(stdout.rstrip(),
-                         expected)
+        # intervals of 3 values are wide
+        self.assertOutputEqual(stdout.rstrip(), expected, delta=0.2)
 
     def check_command(self, expected, *args, **kwargs):
         stdout = self.run_command(*args, **kwargs)
-        self.assertEqual(stdout, textwrap.dedent(expected).lstrip())
+        self.assertOutputEqual(stdout, textwrap.dedent(expected).lstrip())
 
     def test_compare_to_cli(self):
         py36 = os.path.join(TESTDIR, 'mult_list_py36.json')
@@ -235,9 +265,9 @@ class TestPerfCLI(BaseTestCase, unittest.TestCase):
 
         # 2 files
         expected = """
-            [1]*1000: Mean +- std dev: [mult_list_py36] 2.13 us +- 0.06 us -> [mult_list_py37] 2.09 us +- 0.04 us: 1.02x faster
-            [1,2]*1000: Mean +- std dev: [mult_list_py36] 3.70 us +- 0.05 us -> [mult_list_py37] 5.28 us +- 0.09 us: 1.42x slower
-            [1,2,3]*1000: Mean +- std dev: [mult_list_py36] 4.61 us +- 0.13 us -> [mult_list_py37] 6.05 us +- 0.11 us: 1.31x slower
+            [1]*1000: Mean +- std dev: [mult_list_py36] 2.13 us +- 0.06 us -> [mult_list_py37] 2.09 us +- 0.04 us: 1.02x faster [1.01x-1.03x]
+            [1,2]*1000: Mean +- std dev: [mult_list_py36] 3.70 us +- 0.05 us -> [mult_list_py37] 5.28 us +- 0.09 us: 1.42x slower [1.42x-1.43x]
+            [1,2,3]*1000: Mean +- std dev: [mult_list_py36] 4.61 us +- 0.13 us -> [mult_list_py37] 6.05 us +- 0.11 us: 1.31x slower [1.30x-1.32x]
 
             Geometric mean: 1.22x slower
         """
@@ -246,11 +276,11 @@ class TestPerfCLI(BaseTestCase, unittest.TestCase):
         # 2 files grouped by speed
         expected = """
             Slower (2):
-            - [1,2]*1000: 3.70 us +- 0.05 us -> 5.28 us +- 0.09 us: 1.42x slower
-            - [1,2,3]*1000: 4.61 us +- 0.13 us -> 6.05 us +- 0.11 us: 1.31x slower
+            - [1,2]*1000: 3.70 us +- 0.05 us -> 5.28 us +- 0.09 us: 1.42x slower [1.42x-1.43x]
+            - [1,2,3]*1000: 4.61 us +- 0.13 us -> 6.05 us +- 0.11 us: 1.31x slower [1.30x-1.32x]
 
             Faster (1):
-            - [1]*1000: 2.13 us +- 0.06 us -> 2.09 us +- 0.04 us: 1.02x faster
+            - [1]*1000: 2.13 us +- 0.06 us -> 2.09 us +- 0.04 us: 1.02x faster [1.01x-1.03x]
 
             Geometric mean: 1.22x slower
         """
@@ -259,8 +289,8 @@ class TestPerfCLI(BaseTestCase, unittest.TestCase):
         # 2 files grouped by speed (with not significant)
         expected = """
             Faster (2):
-            - [1,2]*1000: 3.70 us +- 0.05 us -> 3.18 us +- 0.08 us: 1.16x faster
-            - [1,2,3]*1000: 4.61 us +- 0.13 us -> 4.17 us +- 0.11 us: 1.11x faster
+            - [1,2]*1000: 3.70 us +- 0.05 us -> 3.18 us +- 0.08 us: 1.16x faster [1.16x-1.17x]
+            - [1,2,3]*1000: 4.61 us +- 0.13 us -> 4.17 us +- 0.11 us: 1.11x faster [1.09x-1.12x]
 
             Benchmark hidden because not significant (1): [1]*1000
 
@@ -273,21 +303,21 @@ class TestPerfCLI(BaseTestCase, unittest.TestCase):
             [1]*1000
             ========
 
-            Mean +- std dev: [mult_list_py36] 2.13 us +- 0.06 us -> [mult_list_py37] 2.09 us +- 0.04 us: 1.02x faster
-            Mean +- std dev: [mult_list_py36] 2.13 us +- 0.06 us -> [mult_list_py38] 2.13 us +- 0.03 us: 1.00x slower
+            Mean +- std dev: [mult_list_py36] 2.13 us +- 0.06 us -> [mult_list_py37] 2.09 us +- 0.04 us: 1.02x faster [1.01x-1.03x]
+            Mean +- std dev: [mult_list_py36] 2.13 us +- 0.06 us -> [mult_list_py38] 2.13 us +- 0.03 us: 1.00x slower [0.99x-1.01x]
             Not significant!
 
             [1,2]*1000
             ==========
 
-            Mean +- std dev: [mult_list_py36] 3.70 us +- 0.05 us -> [mult_list_py37] 5.28 us +- 0.09 us: 1.42x slower
-            Mean +- std dev: [mult_list_py36] 3.70 us +- 0.05 us -> [mult_list_py38] 3.18 us +- 0.08 us: 1.16x faster
+            Mean +- std dev: [mult_list_py36] 3.70 us +- 0.05 us -> [mult_list_py37] 5.28 us +- 0.09 us: 1.42x slower [1.42x-1.43x]
+            Mean +- std dev: [mult_list_py36] 3.70 us +- 0.05 us -> [mult_list_py38] 3.18 us +- 0.08 us: 1.16x faster [1.16x-1.17x]
 
             [1,2,3]*1000
             ============
 
-            Mean +- std dev: [mult_list_py36] 4.61 us +- 0.13 us -> [mult_list_py37] 6.05 us +- 0.11 us: 1.31x slower
-            Mean +- std dev: [mult_list_py36] 4.61 us +- 0.13 us -> [mult_list_py38] 4.17 us +- 0.11 us: 1.11x faster
+            Mean +- std dev: [mult_list_py36] 4.61 us +- 0.13 us -> [mult_list_py37] 6.05 us +- 0.11 us: 1.31x slower [1.30x-1.32x]
+            Mean +- std dev: [mult_list_py36] 4.61 us +- 0.13 us -> [mult_list_py38] 4.17 us +- 0.11 us: 1.11x faster [1.09x-1.12x]
 
             Geometric mean
             ==============
@@ -338,25 +368,25 @@ class TestPerfCLI(BaseTestCase, unittest.TestCase):
             Benchmarks with tag 'bar':
             ==========================
 
-            [1,2]*1000: Mean +- std dev: [mult_list_py36_tags] 3.70 us +- 0.05 us -> [mult_list_py37_tags] 5.28 us +- 0.09 us: 1.42x slower
-            [1,2,3]*1000: Mean +- std dev: [mult_list_py36_tags] 4.61 us +- 0.13 us -> [mult_list_py37_tags] 6.05 us +- 0.11 us: 1.31x slower
+            [1,2]*1000: Mean +- std dev: [mult_list_py36_tags] 3.70 us +- 0.05 us -> [mult_list_py37_tags] 5.28 us +- 0.09 us: 1.42x slower [1.42x-1.43x]
+            [1,2,3]*1000: Mean +- std dev: [mult_list_py36_tags] 4.61 us +- 0.13 us -> [mult_list_py37_tags] 6.05 us +- 0.11 us: 1.31x slower [1.30x-1.32x]
 
             Geometric mean: 1.37x slower
 
             Benchmarks with tag 'foo':
             ==========================
 
-            [1]*1000: Mean +- std dev: [mult_list_py36_tags] 2.13 us +- 0.06 us -> [mult_list_py37_tags] 2.09 us +- 0.04 us: 1.02x faster
-            [1,2]*1000: Mean +- std dev: [mult_list_py36_tags] 3.70 us +- 0.05 us -> [mult_list_py37_tags] 5.28 us +- 0.09 us: 1.42x slower
+            [1]*1000: Mean +- std dev: [mult_list_py36_tags] 2.13 us +- 0.06 us -> [mult_list_py37_tags] 2.09 us +- 0.04 us: 1.02x faster [1.01x-1.03x]
+            [1,2]*1000: Mean +- std dev: [mult_list_py36_tags] 3.70 us +- 0.05 us -> [mult_list_py37_tags] 5.28 us +- 0.09 us: 1.42x slower [1.42x-1.43x]
 
             Geometric mean: 1.18x slower
 
             All benchmarks:
             ===============
 
-            [1]*1000: Mean +- std dev: [mult_list_py36_tags] 2.13 us +- 0.06 us -> [mult_list_py37_tags] 2.09 us +- 0.04 us: 1.02x faster
-            [1,2]*1000: Mean +- std dev: [mult_list_py36_tags] 3.70 us +- 0.05 us -> [mult_list_py37_tags] 5.28 us +- 0.09 us: 1.42x slower
-            [1,2,3]*1000: Mean +- std dev: [mult_list_py36_tags] 4.61 us +- 0.13 us -> [mult_list_py37_tags] 6.05 us +- 0.11 us: 1.31x slower
+            [1]*1000: Mean +- std dev: [mult_list_py36_tags] 2.13 us +- 0.06 us -> [mult_list_py37_tags] 2.09 us +- 0.04 us: 1.02x faster [1.01x-1.03x]
+            [1,2]*1000: Mean +- std dev: [mult_list_py36_tags] 3.70 us +- 0.05 us -> [mult_list_py37_tags] 5.28 us +- 0.09 us: 1.42x slower [1.42x-1.43x]
+            [1,2,3]*1000: Mean +- std dev: [mult_list_py36_tags] 4.61 us +- 0.13 us -> [mult_list_py37_tags] 6.05 us +- 0.11 us: 1.31x slower [1.30x-1.32x]
 
             Geometric mean: 1.22x slower
         """
@@ -406,6 +436,289 @@ class TestPerfCLI(BaseTestCase, unittest.TestCase):
         """
         self.check_command(expected, 'compare_to', '--table', py36, py37)
 
+    def test_compare_to_test_correction(self):
+        py36 = os.path.join(TESTDIR, 'mult_list_py36.json')
+        py38 = os.path.join(TESTDIR, 'mult_list_py38.json')
+
+        expected = """
+            Faster (2):
+            - [1,2]*1000: 3.70 us +- 0.05 us -> 3.18 us +- 0.08 us: 1.16x faster [1.16x-1.17x]
+            - [1,2,3]*1000: 4.61 us +- 0.13 us -> 4.17 us +- 0.11 us: 1.11x faster [1.09x-1.12x]
+
+            Benchmark hidden because not significant (1): [1]*1000
+
+            Geometric mean: 1.09x faster
+
+            Significance: permutation test of the difference of means, Holm-Bonferroni correction over 3 comparisons (alpha=0.05)
+        """
+        self.check_command(expected, 'compare_to', '--group-by-speed',
+                           '--test', 'permutation', '--correction', 'holm',
+                           py36, py38)
+
+    def create_many_suites(self, nbench, slow):
+        # two suites of nbench benchmarks: benchmarks of the slow list are
+        # 2x slower in the second suite
+        import random
+
+        rng = random.Random(0)
+        suites = ([], [])
+        for index in range(nbench):
+            name = 'bench%03d' % index
+            for suite, factor in zip(suites, (1.0, 2.0)):
+                if name not in slow:
+                    factor = 1.0
+                values = [rng.gauss(1.0, 0.01) * factor for _ in range(20)]
+                suite.append(self.create_bench(values,
+                                               metadata={'name': name}))
+        return [pyperf.BenchmarkSuite(benchmarks) for benchmarks in suites]
+
+    def test_compare_to_correction_many(self):
+        # p-values of resampling tests cannot be smaller than 1/2001:
+        # a Holm correction over 150 comparisons uses Mann-Whitney p-values
+        with tests.temporary_directory() as tmpdir:
+            filenames = []
+            for index, suite in enumerate(self.create_many_suites(150, ['bench007'])):
+                filename = os.path.join(tmpdir, 'suite%s.json' % index)
+                suite.dump(filename)
+                filenames.append(filename)
+
+            stdout = self.run_command('compare_to', '-q', '--correction',
+                                      'holm', *filenames)
+            lines = stdout.splitlines()
+            self.assertTrue(lines[0].startswith('bench007: Mean +- std dev: '),
+                            lines[0])
+            self.assertIn(': 2.00x slower [', lines[0])
+            self.assertEqual(lines[-1],
+                             'Significance: Mann-Whitney U test, '
+                             'Holm-Bonferroni correction over 150 '
+                             'comparisons (alpha=0.05)')
+
+            cmd = [sys.executable, '-m', 'pyperf', 'compare_to',
+                   '--test', 'permutation', '--correction', 'holm',
+                   *filenames]
+            proc = tests.get_output(cmd)
+            self.assertEqual(proc.returncode, 1)
+            self.assertEqual(proc.stderr.rstrip(),
+                             'ERROR: p-values of resampling tests cannot be '
+                             'smaller than 1/2001: no change can be '
+                             'significant after a correction over 150 '
+                             'comparisons, use --test=mannwhitney')
+
+    def test_compare_to_matrix(self):
+        py36 = os.path.join(TESTDIR, 'mult_list_py36.json')
+        py37 = os.path.join(TESTDIR, 'mult_list_py37.json')
+        py38 = os.path.join(TESTDIR, 'mult_list_py38.json')
+
+        expected = """
+            [1]*1000
+            ========
+
+            |                | mult_list_py36  | mult_list_py37 | mult_list_py38  |
+            |----------------|:---------------:|:--------------:|:---------------:|
+            | mult_list_py36 | -               | 1.02x faster   | not significant |
+            | mult_list_py37 | 1.02x slower    | -              | 1.02x slower    |
+            | mult_list_py38 | not significant | 1.02x faster   | -               |
+
+            [1,2]*1000
+            ==========
+
+            |                | mult_list_py36 | mult_list_py37 | mult_list_py38 |
+            |----------------|:--------------:|:--------------:|:--------------:|
+            | mult_list_py36 | -              | 1.42x slower   | 1.16x faster   |
+            | mult_list_py37 | 1.42x faster   | -              | 1.66x faster   |
+            | mult_list_py38 | 1.16x slower   | 1.66x slower   | -              |
+
+            Geometric mean
+            ==============
+
+            |                | mult_list_py36 | mult_list_py37 | mult_list_py38 |
+            |----------------|:--------------:|:--------------:|:--------------:|
+            | mult_list_py36 | -              | 1.18x slower   | 1.08x faster   |
+            | mult_list_py37 | 1.18x faster   | -              | 1.28x faster   |
+            | mult_list_py38 | 1.08x slower   | 1.28x slower   | -              |
+
+            Ranking (fastest first):
+
+            1. mult_list_py38
+            2. mult_list_py36: 1.08x slower than #1 (confidence 85.6%)
+            3. mult_list_py37: 1.18x slower than #2 (confidence 76.4%)
+        """
+        self.check_command(expected, 'compare_to', '--matrix',
+                           '--table-format', 'md',
+                           '-b', '[1]*1000', '-b', '[1,2]*1000',
+                           py36, py37, py38)
+
+    def test_compare_to_by_host(self):
+        with tests.temporary_directory() as tmpdir:
+            def dump(name, hostname, mean1, mean2):
+                benchmarks = [self.create_bench((mean * 0.99, mean, mean * 1.01),
+                                                metadata={'name': bench_name,
+                                                          'hostname': hostname})
+                              for bench_name, mean in (('bench1', mean1),
+                                                       ('bench2', mean2))]
+                filename = os.path.join(tmpdir, name + '.json')
+                pyperf.BenchmarkSuite(benchmarks).dump(filename)
+                return filename
+
+            # the host 'b' is 2x slower than the host 'a' and the host 'c' is
+            # 2x faster: bench1 becomes 10% slower on the host 'b'
+            ref = '%s,%s' % (dump('ref_a', 'a', 1.0, 2.0),
+                             dump('ref_b', 'b', 2.0, 4.0))
+            changed = '%s,%s' % (dump('new_b', 'b', 2.2, 4.0),
+                                 dump('new_c', 'c', 0.5, 1.0))
+            stdout = self.run_command('compare_to', '--by-host', ref, changed)
+
+        expected = textwrap.dedent("""
+            bench1: Mean +- std dev: [ref_a,ref_b] 2.00 sec +- 0.02 sec -> [new_b,new_c] 2.20 sec +- 0.02 sec: 1.10x slower [1.09x-1.11x] (1 host)
+
+            Benchmark hidden because not significant (1): bench2
+
+            Geometric mean: 1.05x slower
+
+            Ignored host a of ref_a,ref_b (2 benchmarks)
+            Ignored host c of new_b,new_c (2 benchmarks)
+        """).lstrip()
+        self.assertEqual(stdout, expected)
+
+    def test_merge(self):
+        with tests.temporary_directory() as tmpdir:
+            def dump(name, shard, names):
+                benchmarks = [self.create_bench((1.0, 1.5, 2.0),
+                                                metadata={'name': bench_name,
+                                                          'shard': shard})
+                              for bench_name in names]
+                filename = os.path.join(tmpdir, name + '.json')
+                pyperf.BenchmarkSuite(benchmarks).dump(filename)
+                return filename
+
+            shard1 = dump('shard1', '1/3', ('bench1', 'bench2'))
+            shard3 = dump('shard3', '3/3', ('bench3',))
+            output = os.path.join(tmpdir, 'merged.json')
+            stdout = self.run_command('merge', '-o', output, shard1, shard3)
+            self.assertEqual(stdout,
+                             'WARNING: missing shards (empty or not merged): '
+                             '2/3\n'
+                             'Merged 3 benchmarks (9 runs) of 2 files into %s\n'
+                             % output)
+            suite = pyperf.BenchmarkSuite.load(output)
+            self.assertEqual(suite.get_benchmark_names(),
+                             ['bench1', 'bench2', 'bench3'])
+
+            # a benchmark cannot be in two shards
+            dup = dump('dup', '2/3', ('bench3',))
+            cmd = [sys.executable, '-m', 'pyperf', 'merge',
+                   '-o', os.path.join(tmpdir, 'merged2.json'), shard3, dup]
+            proc = tests.get_output(cmd)
+            self.assertEqual(proc.returncode, 1)
+            self.assertEqual(proc.stdout.rstrip(),
+                             "ERROR: benchmark 'bench3' is in %s and %s"
+                             % (shard3, dup))
+
+            # shards of a different number of shards
+            other = dump('other', '2/4', ('bench4',))
+            cmd = [sys.executable, '-m', 'pyperf', 'merge',
+                   '-o', os.path.join(tmpdir, 'merged3.json'), shard1, other]
+            proc = tests.get_output(cmd)
+            self.assertEqual(proc.returncode, 1)
+            self.assertEqual(proc.stdout.rstrip(),
+                             'ERROR: files come from different numbers '
+                             'of shards: 3, 4')
+
+    def test_check_budget(self):
+        py36 = os.path.join(TESTDIR, 'mult_list_py36.json')
+        py37 = os.path.join(TESTDIR, 'mult_list_py37.json')
+
+        with tests.temporary_directory() as tmpdir:
+            budget = os.path.join(tmpdir, 'budget.json')
+            with open(budget, 'w', encoding='utf-8') as fp:
+                json.dump({'default': '+50%',
+                           'benchmarks': {'[1,2]*1000': '+40%'}}, fp)
+
+            cmd = [sys.executable, '-m', 'pyperf', 'check-budget',
+                   '--budget', budget, py36, py37]
+            proc = tests.get_output(cmd)
+            self.assertEqual(proc.returncode, 1)
+            self.assertEqual(proc.stderr.rstrip(),
+                             'ERROR: 1 benchmarks exceed their performance '
+                             'budget: [1,2]*1000')
+
+            report = json.loads(proc.stdout)
+            self.assertEqual(report['violations'], ['[1,2]*1000'])
+            self.assertEqual(report['test'], 'bootstrap')
+            benchmarks = {bench['name']: bench
+                          for bench in report['benchmarks']}
+            self.assertEqual(sorted(benchmarks),
+                             ['[1,2,3]*1000', '[1,2]*1000', '[1]*1000'])
+            bench = benchmarks['[1,2]*1000']
+            self.assertEqual((bench['budget'], bench['budget_source']),
+                             (40.0, 'benchmark'))
+            self.assertAlmostEqual(bench['ratio'], 1.42, places=2)
+            self.assertTrue(bench['significant'])
+            bench = benchmarks['[1,2,3]*1000']
+            self.assertEqual((bench['budget_source'], bench['violation']),
+                             ('default', False))
+
+            # the slowdown is within the budget
+            with open(budget, 'w', encoding='utf-8') as fp:
+                json.dump({'default': 50}, fp)
+            proc = tests.get_output(cmd)
+            self.assertEqual(proc.returncode, 0, proc.stderr)
+            self.assertEqual(json.loads(proc.stdout)['violations'], [])
+
+    def test_compare_to_matrix_correction(self):
+        # a correction over all pairs of 3 files: 180 comparisons
+        with tests.temporary_directory() as tmpdir:
+            ref, changed = self.create_many_suites(60, ['bench007'])
+            filenames = []
+            for index, suite in enumerate((ref, changed, changed)):
+                filename = os.path.join(tmpdir, 'suite%s.json' % index)
+                suite.dump(filename)
+                filenames.append(filename)
+
+            stdout = self.run_command('compare_to', '--matrix',
+                                      '--correction', 'holm', *filenames)
+            matrix = stdout.split('bench007\n========\n', 1)[1]
+            matrix = matrix.split('\n\n', 1)[0]
+            self.assertIn('| suite0 | -            | 2.00x slower    '
+                          '| 2.00x slower    |', matrix)
+            self.assertEqual(stdout.splitlines()[-1],
+                             'Significance: Mann-Whitney U test, '
+                             'Holm-Bonferroni correction over 180 '
+                             'comparisons (alpha=0.05)')
+
+    def test_check_budget_correction(self):
+        # a correction over 120 benchmarks still reports a clear violation:
+        # bootstrap p-values (>= 1/2001) would not be significant
+        with tests.temporary_directory() as tmpdir:
+            filenames = []
+            for index, suite in enumerate(self.create_many_suites(120, ['bench007'])):
+                filename = os.path.join(tmpdir, 'suite%s.json' % index)
+                suite.dump(filename)
+                filenames.append(filename)
+            budget = os.path.join(tmpdir, 'budget.json')
+            with open(budget, 'w', encoding='utf-8') as fp:
+                json.dump({'default': '+5%'}, fp)
+
+            cmd = [sys.executable, '-m', 'pyperf', 'check-budget',
+                   '--budget', budget, '--correction', 'holm', *filenames]
+            proc = tests.get_output(cmd)
+            self.assertEqual(proc.returncode, 1)
+            self.assertEqual(proc.stderr.rstrip(),
+                             'ERROR: 1 benchmarks exceed their performance '
+                             'budget: bench007')
+            report = json.loads(proc.stdout)
+            self.assertEqual(report['correction'], 'holm')
+            self.assertEqual(report['test'], 'mannwhitney')
+            self.assertEqual(report['violations'], ['bench007'])
+            self.assertEqual(len(report['benchmarks']), 120)
+
+            # invalid budget file: different exit code
+            with open(budget, 'w', encoding='utf-8') as fp:
+                json.dump({'default': 'fast'}, fp)
+            proc = tests.get_output(cmd)
+            self.assertEqual(proc.returncode, 2)
+            self.assertIn("invalid budget threshold: 'fast'", proc.stderr)
+
     def test_compare_to_cli_min_speed(self):
         py36 = os.path.join(TESTDIR, 'mult_list_py36.json')
         py37 = os.path.join(TESTDIR, 'mult_list_py37.json')
@@ -413,8 +726,8 @@ class TestPerfCLI(BaseTestCase, unittest.TestCase):
 
         # 2 files, min-speed=10
         expected = """
-            [1,2]*1000: Mean +- std dev: [mult_list_py36] 3.70 us +- 0.05 us -> [mult_list_py37] 5.28 us +- 0.09 us: 1.42x slower
-            [1,2,3]*1000: Mean +- std dev: [mult_list_py36] 4.61 us +- 0.13 us -> [mult_list_py37] 6.05 us +- 0.11 us: 1.31x slower
+            [1,2]*1000: Mean +- std dev: [mult_list_py36] 3.70 us +- 0.05 us -> [mult_list_py37] 5.28 us +- 0.09 us: 1.42x slower [1.42x-1.43x]
+            [1,2,3]*1000: Mean +- std dev: [mult_list_py36] 4.61 us +- 0.13 us -> [mult_list_py37] 6.05 us +- 0.11 us: 1.31x slower [1.30x-1.32x]
 
             Benchmark hidden because not significant (1): [1]*1000
 
@@ -424,7 +737,7 @@ class TestPerfCLI(BaseTestCase, unittest.TestCase):
 
         # 2 files, min-speed=40
         expected = """
-            [1,2]*1000: Mean +- std dev: [mult_list_py36] 3.70 us +- 0.05 us -> [mult_list_py37] 5.28 us +- 0.09 us: 1.42x slower
+            [1,2]*1000: Mean +- std dev: [mult_list_py36] 3.70 us +- 0.05 us -> [mult_list_py37] 5.28 us +- 0.09 us: 1.42x slower [1.42x-1.43x]
 
             Benchmark hidden because not significant (2): [1]*1000, [1,2,3]*1000
 
@@ -481,6 +794,17 @@ class TestPerfCLI(BaseTestCase, unittest.TestCase):
         """)
         self.check_command(expected, 'hist', TELCO, env=env)
 
+    def test_hist_only_calibration(self):
+        from pyperf._cli import format_histogram
+
+        run = pyperf.Run([], warmups=[(1, 1.0)],
+                         metadata={'name': 'bench', 'calibrate_loops': 1},
+                         collect_metadata=False)
+        bench = pyperf.Benchmark([run])
+        with self.assertRaises(ValueError) as cm:
+            format_histogram([(bench, None)])
+        self.assertEqual(str(cm.exception), "benchmark 'bench' has no value")
+
     def test_show(self):
         expected = ("""
             Mean +- std dev: 22.5 ms +- 0.2 ms
@@ -626,6 +950,220 @@ class TestPerfCLI(BaseTestCase, unittest.TestCase):
         self.assertEqual(stdout.rstrip(),
                          '#1: telco (29.2 sec)')
 
+    def test_compact(self):
+        suite = self.create_suite()
+        with tests.temporary_directory() as tmpdir:
+            log = os.path.join(tmpdir, 'results.jsonl')
+            output = os.path.join(tmpdir, 'results.json')
+            pyperf.add_runs(log, suite)
+            pyperf.add_runs(log, suite)
+
+            stdout = self.run_command('compact', log, '-o', output)
+            self.assertEqual(stdout.rstrip(),
+                             'Compacted 2 benchmarks (12 runs) into %s'
+                             % output)
+            suite2 = pyperf.BenchmarkSuite.load(output)
+            self.assertEqual(suite2.get_benchmark('py36').get_values(),
+                             (1.0, 1.5, 2.0) * 2)
+
+    def test_validate(self):
+        with tests.temporary_directory() as tmpdir:
+            valid = os.path.join(tmpdir, 'valid.json')
+            invalid = os.path.join(tmpdir, 'invalid.json')
+            suite = self.create_suite()
+            suite.dump(valid)
+            data = suite._as_json()
+            data['benchmarks'][0]['runs'][0]['values'] = [-1.0]
+            with open(invalid, 'w', encoding='utf-8') as fp:
+                json.dump(data, fp)
+
+            stdout = self.run_command('validate', valid)
+            self.assertEqual(stdout.rstrip(),
+                             '%s: OK (2 benchmarks, 6 runs)' % valid)
+
+            cmd = [sys.executable, '-m', 'pyperf', 'validate', valid, invalid]
+            proc = tests.get_output(cmd)
+            self.assertEqual(proc.returncode, 1)
+            self.assertEqual(proc.stdout.rstrip().splitlines(),
+                             ['%s: OK (2 benchmarks, 6 runs)' % valid,
+                              'ERROR: %s: values must be a sequence of '
+                              'number > 0.0' % invalid])
+
+    def test_ingest_history(self):
+        suite = self.create_suite()
+        with tests.temporary_directory() as tmpdir:
+            filename = os.path.join(tmpdir, 'bench.json')
+            db = os.path.join(tmpdir, 'history.sqlite')
+            suite.dump(filename)
+
+            stdout = self.run_command('ingest', '--db', db, filename)
+            self.assertEqual(stdout.rstrip(),
+                             '%s: ingested 2 benchmarks' % filename)
+            # a suite is only ingested once
+            stdout = self.run_command('ingest', '--db', db, filename)
+            self.assertEqual(stdout.rstrip(),
+                             '%s: already ingested' % filename)
+
+            stdout = self.run_command('history', '--db', db, 'py36')
+            self.assertEqual(stdout.rstrip(),
+                             '(no date): Mean +- std dev: 1.50 sec +- '
+                             '0.50 sec (3 runs, 3 values)')
+
+            stdout = self.run_command('history', '--db', db,
+                                      '--metadata', 'python_version=2.7',
+                                      'py36')
+            self.assertIn('1.50 sec', stdout)
+
+            cmd = [sys.executable, '-m', 'pyperf', 'history', '--db', db,
+                   '--metadata', 'python_version=3.4', 'py36']
+            proc = tests.get_output(cmd)
+            self.assertEqual(proc.returncode, 1)
+
+    def test_normalize_host(self):
+        # the second host is 2x slower: results are the same once normalized
+        ref = self.create_bench((1.0, 1.5, 2.0),
+                                metadata={'hostname': 'fast',
+                                          'host_calibration': 0.01})
+        changed = self.create_bench((2.0, 3.0, 4.0),
+                                    metadata={'hostname': 'slow',
+                                              'host_calibration': 0.02})
+        with tests.temporary_directory() as tmpdir:
+            ref_filename = os.path.join(tmpdir, 'ref.json')
+            changed_filename = os.path.join(tmpdir, 'changed.json')
+            db = os.path.join(tmpdir, 'history.sqlite')
+            ref.dump(ref_filename)
+            changed.dump(changed_filename)
+
+            stdout = self.run_command('compare_to', ref_filename,
+                                      changed_filename)
+            self.assertIn('2.00x slower', stdout)
+            stdout = self.run_command('compare_to', '--normalize-host',
+                                      ref_filename, changed_filename)
+            self.assertEqual(stdout.rstrip(), 'Benchmark hidden because not '
+                                              'significant (1): bench')
+
+            self.run_command('ingest', '--db', db, changed_filename,
+                             ref_filename)
+            stdout = self.run_command('history', '--db', db,
+                                      '--normalize-host', 'bench')
+            self.assertEqual(stdout.splitlines(),
+                             ['(no date): Mean +- std dev: 1.50 sec +- '
+                              '0.50 sec (3 runs, 3 values)'] * 2)
+
+            # the host calibration is required
+            self.create_bench((1.0, 1.5, 2.0)).dump(changed_filename,
+                                                    replace=True)
+            cmd = [sys.executable, '-m', 'pyperf', 'compare_to',
+                   '--normalize-host', ref_filename, changed_filename]
+            proc = tests.get_output(cmd)
+            self.assertEqual(proc.returncode, 1)
+            self.assertIn('no host_calibration metadata', proc.stderr)
+
+    def test_regressions(self):
+        means = [1.0, 1.02, 0.98, 1.01, 0.99, 1.005,
+                 1.21, 1.19, 1.2, 1.22, 1.18, 1.195]
+        with tests.temporary_directory() as tmpdir:
+            filenames = []
+            for index, mean in enumerate(means, 1):
+                bench = self.create_bench((mean * 0.99, mean, mean * 1.01),
+                                          metadata={'name': 'bench'})
+                filename = os.path.join(tmpdir, 'night%02d.json' % index)
+                bench.dump(filename)
+                filenames.append(filename)
+
+            stdout = self.run_command('regressions', '--permutations', '200',
+                                      *filenames)
+            self.assertRegex(stdout.rstrip(),
+                             r'^bench:\n'
+                             r'- #7 \(night07.json\): 1.00 sec -> 1.20 sec: '
+                             r'1.20x slower \(confidence 9[5-9]\.[0-9]%\)$')
+
+            stdout = self.run_command('regressions', '--permutations', '200',
+                                      '--min-speed', '25', *filenames)
+            self.assertEqual(stdout.rstrip(),
+                             'No change point detected in 1 benchmarks')
+
+            # history database
+            db = os.path.join(tmpdir, 'history.sqlite')
+            self.run_command('ingest', '--db', db, *filenames)
+            stdout = self.run_command('regressions', '--permutations', '200',
+                                      '--db', db)
+            self.assertRegex(stdout.rstrip(),
+                             r'^bench:\n'
+                             r'- #7 \(\(no date\)\): 1.00 sec -> 1.20 sec: '
+                             r'1.20x slower')
+
+    def create_scaling_suite(self, func):
+        benchmarks = []
+        for n in (10, 100, 1000, 10000):
+            bench = self.create_bench([func(n) * 1e-9],
+                                      metadata={'name': 'sort[n=%s]' % n,
+                                                'param_n': n})
+            benchmarks.append(bench)
+        return pyperf.BenchmarkSuite(benchmarks)
+
+    def test_scaling(self):
+        import math
+
+        linear = self.create_scaling_suite(lambda n: 50 + n * 3.0)
+        nlogn = self.create_scaling_suite(lambda n: n * math.log(n))
+        square = self.create_scaling_suite(lambda n: n * n * 1.5)
+
+        with tests.temporary_directory() as tmpdir:
+            filenames = []
+            for name, suite in (('linear', linear), ('nlogn', nlogn),
+                                ('square', square)):
+                filename = os.path.join(tmpdir, '%s.json' % name)
+                suite.dump(filename)
+                filenames.append(filename)
+
+            stdout = self.run_command('scaling', filenames[0])
+            self.assertRegex(stdout, r'^sort: O\(n\) \(exponent: 0\.8[0-9]')
+            stdout = self.run_command('scaling', filenames[1])
+            self.assertRegex(stdout, r'^sort: O\(n log n\) ')
+
+            stdout = self.run_command('scaling', filenames[0], filenames[1])
+            self.assertNotIn('Complexity changed', stdout)
+
+            stdout = self.run_command('scaling', filenames[0], filenames[2])
+            self.assertRegex(stdout,
+                             r'^sort: O\(n\) -> O\(n\^2\) \(exponent: '
+                             r'0\.8[0-9] -> 2\.00\): exponent changed')
+            self.assertIn('Complexity changed in 1 benchmark(s)', stdout)
+
+    def test_importtime(self):
+        with tests.temporary_directory() as tmpdir:
+            filename = os.path.join(tmpdir, 'importtime.json')
+            stdout = self.run_command('importtime', '-p1', '-n2', '-w0',
+                                      '--cumulative', '-o', filename,
+                                      'json')
+            suite = pyperf.BenchmarkSuite.load(filename)
+
+        self.assertRegex(stdout, r'^\.\n')
+        self.assertRegex(stdout, r'\njson: Mean \+- std dev: ')
+        bench = suite.get_benchmark('json')
+        self.assertEqual(bench.get_nvalue(), 2)
+        self.assertEqual(bench.get_metadata()['importtime'], 'cumulative')
+        # modules imported at Python startup are ignored
+        self.assertNotIn('site', suite.get_benchmark_names())
+
+    def test_parse_importtime(self):
+        from pyperf._importtime import MARKER, parse_importtime
+
+        output = textwrap.dedent('''
+            import time: self [us] | cumulative | imported package
+            import time:       120 |        120 | site
+            %s
+            import time:       250 |        250 |     _json
+            import time:       523 |        773 |   json.decoder
+            import time:       311 |       1084 | json
+        ''' % MARKER)
+        self.assertEqual(parse_importtime(output),
+                         {'_json': 250e-6, 'json.decoder': 523e-6,
+                          'json': 311e-6})
+        self.assertEqual(parse_importtime(output, cumulative=True)['json'],
+                         1084e-6)
+
     def test_check_stable(self):
         stdout = self.run_command('check', TELCO)
         self.assertIn(
@@ -729,6 +1267,30 @@ class TestPerfCLI(BaseTestCase, unittest.TestCase):
 
         self._check_track_memory_bench(bench, loops=2)
 
+    def test_command_cache(self):
+        cmd = (sys.executable, '-c', 'pass')
+        with tests.temporary_directory() as tmpdir:
+            input_file = os.path.join(tmpdir, 'input.txt')
+            with open(input_file, 'w') as fp:
+                fp.write('data')
+            tmp_name = os.path.join(tmpdir, 'bench.json')
+            args = ('command',
+                    '--cache=warm', '--cache-file', tmpdir,
+                    '-p1', '-w0', '-l1', '-n2',
+                    '-o', tmp_name,
+                    '--')
+            args += cmd
+            self.run_command(*args)
+            bench = pyperf.Benchmark.load(tmp_name)
+
+        self.assertEqual(bench.get_metadata()['command_cache'], 'warm')
+
+        from pyperf._command import CommandCache
+        with self.assertRaises(ValueError):
+            CommandCache('warm', [])
+        with self.assertRaises(ValueError):
+            CommandCache('hot', [TELCO])
+
     def test_hook(self):
         with tests.temporary_file() as tmp_name:
             self.run_command('timeit',
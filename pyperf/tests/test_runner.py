@@ -1,9 +1,11 @@
 import collections
+import functools
 import os.path
 import pstats
 import sys
 import tempfile
 import textwrap
+import time
 import unittest
 from contextlib import ExitStack
 from unittest import mock
@@ -11,6 +13,9 @@ from unittest import mock
 import pyperf
 from pyperf import tests
 from pyperf._hooks import HookBase
+from pyperf._shard import balance_shards, hash_shard
+from pyperf._runner import (CLIError, default_parallel_levels,
+                            param_benchmarks)
 from pyperf._utils import create_pipe, MS_WINDOWS, shell_quote
 
 
@@ -507,6 +512,25 @@ class TestRunner(unittest.TestCase):
         self.assertEqual(bench.get_metadata()['command'],
                          ' '.join(map(shell_quote, args)))
 
+    @unittest.skipUnless(hasattr(os, 'posix_fadvise'),
+                         'need os.posix_fadvise()')
+    def test_bench_command_cold_loops(self):
+        runner = self.create_runner('-w0 -n1'.split())
+        loops = []
+
+        def fake_main(task, parallel=False):
+            loops.append(runner.args.loops)
+
+        with tempfile.NamedTemporaryFile() as tmp:
+            with mock.patch.object(runner, '_main', fake_main):
+                runner.bench_command('cold', [sys.executable, '-c', 'pass'],
+                                     cache='cold', cache_files=[tmp.name])
+                runner.bench_func('func', lambda: None)
+
+        # --loops=1 is only forced for the cold cache command
+        self.assertEqual(loops, [1, 0])
+        self.assertEqual(runner.args.loops, 0)
+
     def test_hook_command(self):
         args = [sys.executable, '-c', 'pass']
 
@@ -559,6 +583,347 @@ class TestRunner(unittest.TestCase):
         self.assertEqual(s.entered, 1)
         self.assertEqual(s.exited, 1)
 
+    def test_bench_parallel_func_worker(self):
+        runner = self.create_runner(['--worker', '-l1', '-w1',
+                                     '--parallel=2'])
+
+        def func():
+            pass
+
+        with tests.capture_stdout():
+            bench = runner.bench_parallel_func('bench', func)
+
+        self.assertEqual(bench.get_name(), 'bench[parallel=2]')
+        self.assertEqual(bench.get_metadata()['parallel'], 2)
+        self.assertEqual(bench.get_nvalue(), 3)
+
+    def test_profile_parallel_func(self):
+        with tempfile.NamedTemporaryFile('wb+') as tmp:
+            name = tmp.name
+        args = ['--worker', '-l1', '-w1', '--parallel=2', '--profile', name]
+        runner = self.create_runner(args)
+
+        def external():
+            return [1] * 1000
+
+        def func():
+            external()
+
+        with tests.capture_stdout():
+            runner.bench_parallel_func('bench', func)
+
+        try:
+            s = pstats.Stats(name)
+            self.assertIn('external', [key[2] for key in s.stats])
+        finally:
+            if os.path.isfile(name):
+                os.unlink(name)
+
+    def test_parallel_not_supported(self):
+        runner = self.create_runner(['--worker', '-l1', '-w1',
+                                     '--parallel=2'])
+
+        with tests.capture_stdout() as stdout:
+            with self.assertRaises(SystemExit):
+                runner.bench_func('bench', lambda: None)
+        self.assertIn('--parallel is not supported by bench_func()',
+                      stdout.getvalue())
+
+    def test_parallel_levels(self):
+        self.assertEqual(default_parallel_levels(1), [1])
+        self.assertEqual(default_parallel_levels(4),
+                         [1, 2, 4])
+        self.assertEqual(default_parallel_levels(6),
+                         [1, 2, 4, 6])
+
+        runner = self.create_runner(['--affinity=2-3', '--parallel=4,1'])
+        self.assertEqual(runner.args.parallel, [1, 4])
+        with self.assertRaises(CLIError):
+            runner._parallel_cpus()
+
+        runner = self.create_runner(['--affinity=2-5'])
+        self.assertEqual(runner._parallel_cpus(),
+                         ([1, 2, 4], [2, 3, 4, 5]))
+
+    def test_parallel_sync_requires_worker(self):
+        with tests.capture_stdout() as stdout:
+            with self.assertRaises(SystemExit):
+                self.create_runner(['--parallel-ready=3',
+                                    '--parallel-start=4'])
+        self.assertIn('requires --worker', stdout.getvalue())
+
+    def test_bench_func_params(self):
+        calls = []
+
+        def func(n, m=0):
+            calls.append((n, m))
+
+        # worker task 1 is the second parameter point
+        runner = self.create_runner(['--worker', '-l1', '-w0', '-n1',
+                                     '--worker-task=1'])
+        with tests.capture_stdout():
+            results = runner.bench_func('bench', func, 5,
+                                        params={'m': [1, 2, 3]})
+
+        self.assertEqual(results[0], None)
+        self.assertEqual(results[2], None)
+        bench = results[1]
+        self.assertEqual(bench.get_name(), 'bench[m=2]')
+        self.assertEqual(bench.get_metadata()['param_m'], 2)
+        self.assertEqual(set(calls), {(5, 2)})
+
+        names = [name for name, point, metadata
+                 in param_benchmarks('bench', {'n': [10, 100], 'k': ['a']})]
+        self.assertEqual(names, ['bench[n=10,k=a]', 'bench[n=100,k=a]'])
+        with self.assertRaises(ValueError):
+            list(param_benchmarks('bench', {'n': []}))
+
+    def test_latency_worker(self):
+        runner = self.create_runner(['--worker', '-l4', '-w1', '-n3',
+                                     '--latency'])
+
+        def func():
+            pass
+
+        with tests.capture_stdout():
+            bench = runner.bench_func('bench', func)
+
+        latency = bench.get_latency()
+        # warmups are not recorded
+        self.assertEqual(latency.get_count(), 3 * 4)
+
+    def test_latency_inner_loops(self):
+        runner = self.create_runner(['--worker', '-l2', '-w0', '-n1',
+                                     '--latency'])
+
+        # each call takes 1 ms and runs the code 10 times
+        timer = iter(range(0, 10 ** 9, 10 ** 6))
+        with mock.patch('time.perf_counter_ns', lambda: next(timer)):
+            with tests.capture_stdout():
+                bench = runner.bench_func('bench', lambda: None,
+                                          inner_loops=10)
+
+        latency = bench.get_latency()
+        self.assertEqual(latency.get_count(), 2)
+        self.assertAlmostEqual(latency.percentile(50), 100e-6,
+                               delta=100e-6 / 100)
+        self.assertAlmostEqual(bench.mean(), 100e-6)
+
+    def test_calibrate_host_worker(self):
+        runner = self.create_runner(['--worker', '-l1', '-w1', '-n3',
+                                     '--calibrate-host'])
+
+        with tests.temporary_directory() as tmpdir:
+            with mock.patch.dict(os.environ, {'PYPERF_CACHE_DIR': tmpdir}):
+                with mock.patch('pyperf._host_calibration.'
+                                'measure_host_calibration',
+                                return_value=0.25) as measure:
+                    with tests.capture_stdout():
+                        bench = runner.bench_func('bench', lambda: None)
+                        bench2 = runner.bench_func('bench2', lambda: None)
+            self.assertTrue(os.path.exists(os.path.join(tmpdir,
+                                                        'host_calibration.json')))
+
+        # the host calibration is cached
+        measure.assert_called_once_with()
+        for bench in (bench, bench2):
+            self.assertEqual(bench.get_metadata()['host_calibration'], 0.25)
+
+    def test_calibrate_host_manager(self):
+        from pyperf._manager import Manager
+
+        # the manager measures the host calibration once
+        runner = self.create_runner(['--calibrate-host'])
+        with mock.patch('pyperf._host_calibration.get_host_calibration',
+                        return_value=0.5) as get_calibration:
+            for _ in range(2):
+                cmd = Manager(runner).worker_cmd(0, 0, '3')
+                self.assertIn('--host-calibration=0.5', cmd)
+        get_calibration.assert_called_once_with()
+
+        # workers don't measure it
+        runner = self.create_runner(['--worker', '-l1', '-w1', '-n3',
+                                     '--calibrate-host',
+                                     '--host-calibration=0.5'])
+        with mock.patch('pyperf._host_calibration.'
+                        'measure_host_calibration') as measure:
+            with tests.capture_stdout():
+                bench = runner.bench_func('bench', lambda: None)
+        measure.assert_not_called()
+        self.assertEqual(bench.get_metadata()['host_calibration'], 0.5)
+
+    def test_shard(self):
+        names = ['bench%s' % index for index in range(20)]
+        selected = []
+        for index in (1, 2, 3):
+            runner = self.create_runner(['--shard=%s/3' % index])
+            with mock.patch.object(runner, '_manager') as manager:
+                for name in names:
+                    if runner.bench_func(name, lambda: None) is not None:
+                        selected.append(name)
+            # skipped benchmarks keep worker task identifiers consistent
+            self.assertEqual(runner._worker_task, len(names))
+            self.assertEqual(manager.call_count,
+                             sum(1 for name in names
+                                 if hash_shard(name, 3) == index))
+        self.assertEqual(sorted(selected), sorted(names))
+
+    def test_shard_durations(self):
+        self.assertEqual(balance_shards({'a': 10.0, 'b': 6.0, 'c': 5.0,
+                                         'd': 1.0}, 2),
+                         {'a': 1, 'b': 2, 'c': 2, 'd': 1})
+
+        with tests.temporary_directory() as tmpdir:
+            filename = os.path.join(tmpdir, 'previous.json')
+            benchmarks = []
+            for name, duration in (('a', 10.0), ('b', 6.0), ('c', 5.0)):
+                run = pyperf.Run([1.0], metadata={'name': name,
+                                                  'duration': duration},
+                                 collect_metadata=False)
+                benchmarks.append(pyperf.Benchmark([run]))
+            pyperf.BenchmarkSuite(benchmarks).dump(filename)
+
+            runner = self.create_runner(['--shard=2/2',
+                                         '--shard-durations', filename])
+        self.assertNotIn('a', runner._shard)
+        self.assertIn('b', runner._shard)
+        self.assertIn('c', runner._shard)
+        # unknown benchmarks are assigned by a hash of their name
+        self.assertEqual('new' in runner._shard, hash_shard('new', 2) == 2)
+
+    def test_shard_worker(self):
+        runner = self.create_runner(['--worker', '-l1', '-w1', '-n3',
+                                     '--shard=2/3'])
+        with tests.capture_stdout():
+            bench = runner.bench_func('bench', lambda: None)
+        self.assertEqual(bench.get_metadata()['shard'], '2/3')
+
+    def test_result_cache(self):
+        def make_func(expr, **namespace):
+            # functions of installed packages are hashed by name: compile
+            # the function outside this module
+            code = compile("def func():\n    return %s\n" % expr,
+                           "<bench>", "exec")
+            exec(code, namespace)
+            return namespace['func']
+
+        def bench_func(cache_dir, func, *args, inner_loops=None):
+            runner = self.create_runner(['--result-cache',
+                                         '--result-cache-dir', cache_dir,
+                                         *args])
+            run = pyperf.Run([1.0, 1.5, 2.0], metadata={'name': 'bench'},
+                             collect_metadata=False)
+            with mock.patch('pyperf._manager.Manager.create_bench',
+                            return_value=pyperf.Benchmark([run])) as create:
+                with tests.capture_stdout() as stdout:
+                    bench = runner.bench_func('bench', func,
+                                              inner_loops=inner_loops)
+            return (bench, create.call_count, stdout.getvalue())
+
+        with tests.temporary_directory() as tmpdir:
+            bench, ncall, _ = bench_func(tmpdir, make_func('1'))
+            self.assertEqual(ncall, 1)
+            filenames = os.listdir(tmpdir)
+            self.assertEqual(len(filenames), 1)
+
+            # unchanged benchmark: reuse the cached result
+            bench, ncall, _ = bench_func(tmpdir, make_func('1'))
+            self.assertEqual(ncall, 0)
+            self.assertEqual(bench.get_values(), (1.0, 1.5, 2.0))
+
+            # the code, an option or inner loops changed
+            bench, ncall, _ = bench_func(tmpdir, make_func('2'))
+            self.assertEqual(ncall, 1)
+            bench, ncall, _ = bench_func(tmpdir, make_func('1'), '--values=5')
+            self.assertEqual(ncall, 1)
+            bench, ncall, _ = bench_func(tmpdir, make_func('1'),
+                                         inner_loops=1000)
+            self.assertEqual(ncall, 1)
+            self.assertEqual(len(os.listdir(tmpdir)), 4)
+
+            # module globals used by the function are hashed
+            for data, expected in (([1, 2], 1), ([1, 2], 0), ([1, 3], 1)):
+                bench, ncall, _ = bench_func(tmpdir,
+                                             make_func('DATA * 2', DATA=data))
+                self.assertEqual(ncall, expected)
+            self.assertEqual(len(os.listdir(tmpdir)), 6)
+
+            # objects without a stable hash are not cached
+            bench, ncall, stdout = bench_func(tmpdir,
+                                              make_func('OBJ', OBJ=object()),
+                                              '-v')
+            self.assertEqual(ncall, 1)
+            self.assertIn("Don't cache the result of bench: "
+                          "cannot hash object object", stdout)
+            self.assertEqual(len(os.listdir(tmpdir)), 6)
+
+            # entries older than the maximum age are removed
+            old = time.time() - 2 * 24 * 3600
+            filename = os.path.join(tmpdir, filenames[0])
+            os.utime(filename, (old, old))
+            bench, ncall, _ = bench_func(tmpdir, make_func('1'),
+                                         '--result-cache-max-age=1')
+            self.assertEqual(ncall, 1)
+
+    def test_result_cache_key(self):
+        from pyperf._result_cache import get_cache_key
+
+        runner = self.create_runner([])
+
+        def get_key(func, inner_loops=None):
+            task = runner._func_task('bench', func, None)
+            task.cache_source = func
+            task.inner_loops = inner_loops
+            return get_cache_key(task, runner.args)
+
+        # sets are hashed independently of the hash seed
+        key = get_key(functools.partial(len, {'a', 'b', 'c'}))
+        self.assertEqual(key, get_key(functools.partial(len,
+                                                        {'c', 'b', 'a'})))
+        self.assertNotEqual(key, get_key(functools.partial(len, {'a', 'b'})))
+        self.assertNotEqual(get_key(len), get_key(len, inner_loops=1000))
+
+        with self.assertRaises(ValueError):
+            get_key(functools.partial(len, object()))
+
+        # the shard doesn't change the key
+        runner = self.create_runner(['--shard=1/2'])
+        self.assertEqual(get_key(functools.partial(len, {'a', 'b', 'c'})),
+                         key)
+
+    def test_result_cache_shard(self):
+        from pyperf._result_cache import ResultCache
+
+        runs = [pyperf.Run([], warmups=[(1, 1.0)],
+                           metadata={'name': 'bench', 'shard': '1/2',
+                                     'calibrate_loops': 1},
+                           collect_metadata=False),
+                pyperf.Run([1.0, 2.0],
+                           metadata={'name': 'bench', 'shard': '1/2'},
+                           collect_metadata=False)]
+        with tests.temporary_directory() as tmpdir:
+            cache = ResultCache(tmpdir)
+            cache.put('key', pyperf.Benchmark(runs))
+
+            bench = cache.get('key', '1/2')
+            self.assertEqual(bench.get_metadata()['shard'], '1/2')
+            # runs measured by another shard configuration are reused
+            bench = cache.get('key', '2/3')
+            self.assertEqual(bench.get_metadata()['shard'], '2/3')
+            self.assertEqual(bench.get_values(), (1.0, 2.0))
+            self.assertEqual(bench.get_nrun(), 2)
+            bench = cache.get('key')
+            self.assertNotIn('shard', bench.get_metadata())
+
+    def test_latency_not_supported(self):
+        runner = self.create_runner(['--worker', '-l1', '-w1', '--latency'])
+
+        with tests.capture_stdout() as stdout:
+            with self.assertRaises(SystemExit):
+                runner.bench_time_func('bench', lambda loops: 1.0)
+        self.assertIn('--latency is not supported by bench_time_func()',
+                      stdout.getvalue())
+
     def test_single_instance(self):
         runner1 = self.create_runner([])   # noqa
         with self.assertRaises(RuntimeError):
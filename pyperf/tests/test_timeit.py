@@ -259,6 +259,22 @@ class TestTimeit(unittest.TestCase):
         self.assertEqual(bench.get_name(), name)
         self.assertRegex(stdout, re.compile('^%s' % name, flags=re.MULTILINE))
 
+    def test_param(self):
+        args = PERF_TIMEIT + ('--param', 'n=1,3',
+                              '--debug-single-value', '-s', 'x = [0] * n',
+                              'len(x)')
+        with tests.temporary_directory() as tmpdir:
+            filename = os.path.join(tmpdir, 'test.json')
+            stdout = self.run_timeit(args + ('--output', filename))
+            suite = pyperf.BenchmarkSuite.load(filename)
+
+        self.assertEqual(suite.get_benchmark_names(),
+                         ['timeit[n=1]', 'timeit[n=3]'])
+        self.assertEqual([bench.get_metadata()['param_n'] for bench in suite],
+                         [1, 3])
+        self.assertRegex(stdout, re.compile('^timeit\\[n=3\\]: ',
+                                            flags=re.MULTILINE))
+
     def test_inner_loops(self):
         inner_loops = 17
         args = PERF_TIMEIT + ('--inner-loops', str(inner_loops)) + FAST_BENCH_ARGS
@@ -40,6 +40,101 @@ class TestStatistics(unittest.TestCase):
         self.assertTrue(significant)
         self.assertEqual(tscore2, -tscore)
 
+    def test_bootstrap_ratio(self):
+        values1 = [1.0, 1.1, 0.9, 1.05, 0.95] * 4
+        values2 = [2.0, 2.2, 1.8]
+        low, high = utils.bootstrap_ratio(values1, values2)
+        # samples of different lengths
+        self.assertLess(1.0, low)
+        self.assertLess(low, 2.0)
+        self.assertLess(2.0, high)
+        # reproducible
+        self.assertEqual(utils.bootstrap_ratio(values1, values2), (low, high))
+
+        low, high = utils.bootstrap_ratio(values1, values1)
+        self.assertLess(low, 1.0)
+        self.assertLess(1.0, high)
+
+        self.assertEqual(utils.bootstrap_ratio([1.0], [3.0],
+                                               statistic='median'),
+                         (3.0, 3.0))
+        with self.assertRaises(ValueError):
+            utils.bootstrap_ratio(values1, values2, statistic='mode')
+
+    def test_bootstrap_ratios_numpy(self):
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest("need numpy")
+
+        # NumPy and pure Python use different random number generators:
+        # intervals only agree up to the resampling noise
+        values1 = [1.0, 1.1, 0.9, 1.05, 0.95, 1.2] * 5
+        values2 = [2.0, 2.2, 1.8, 2.1, 2.5] * 5
+        for statistic in ('mean', 'median'):
+            with self.subTest(statistic=statistic):
+                ratios = utils._bootstrap_ratios(values1, values2, 2000,
+                                                 statistic, 5)
+                ratios2 = utils._bootstrap_ratios_numpy(numpy, values1,
+                                                        values2, 2000,
+                                                        statistic, 5)
+                self.assertEqual(len(ratios2), len(ratios))
+                low, high, pvalue = utils._bootstrap_ratios_test(ratios, 0.95)
+                low2, high2, pvalue2 = utils._bootstrap_ratios_test(ratios2,
+                                                                    0.95)
+                self.assertAlmostEqual(low, low2, delta=0.05)
+                self.assertAlmostEqual(high, high2, delta=0.05)
+                self.assertEqual(pvalue, pvalue2)
+
+    def test_stratified_bootstrap_ratio_test(self):
+        # host 'b' is 2x slower than host 'a': the change is 10% on each host
+        strata = [([1.0, 1.02, 0.98] * 3, [1.1, 1.12, 1.08] * 3),
+                  ([2.0, 2.04, 1.96] * 3, [2.2, 2.24, 2.16] * 3)]
+        low, high, pvalue = utils.stratified_bootstrap_ratio_test(strata)
+        self.assertLess(1.05, low)
+        self.assertLess(high, 1.15)
+        self.assertLess(pvalue, 0.01)
+        # reproducible
+        self.assertEqual(utils.stratified_bootstrap_ratio_test(strata),
+                         (low, high, pvalue))
+
+        strata = [(values, values) for values, _ in strata]
+        low, high, pvalue = utils.stratified_bootstrap_ratio_test(strata)
+        self.assertLess(low, 1.0)
+        self.assertLess(1.0, high)
+        self.assertGreater(pvalue, 0.05)
+
+        with self.assertRaises(ValueError):
+            utils.stratified_bootstrap_ratio_test([])
+
+    def test_mann_whitney_u(self):
+        u, pvalue = utils.mann_whitney_u([1, 2, 3, 4, 5], [6, 7, 8, 9, 10])
+        self.assertEqual(u, 0.0)
+        self.assertAlmostEqual(pvalue, 0.012185780355344789)
+
+        # ties and samples of different lengths
+        u, pvalue = utils.mann_whitney_u([1, 2, 2, 3], [2, 3, 4])
+        self.assertEqual(u, 2.5)
+        self.assertGreater(pvalue, 0.05)
+
+        self.assertEqual(utils.mann_whitney_u([1, 1], [1, 1, 1]), (3.0, 1.0))
+
+    def test_permutation_test(self):
+        pvalue = utils.permutation_test([1, 2, 3, 4, 5], [6, 7, 8, 9, 10])
+        self.assertLess(pvalue, 0.05)
+        self.assertEqual(utils.permutation_test([1, 2, 3], [1, 2, 3]), 1.0)
+
+    def test_adjust_pvalues(self):
+        pvalues = [0.01, 0.04, 0.03, 0.005]
+        for result, expected in zip(utils.adjust_pvalues(pvalues, 'holm'),
+                                    [0.03, 0.06, 0.06, 0.02]):
+            self.assertAlmostEqual(result, expected)
+        for result, expected in zip(utils.adjust_pvalues(pvalues, 'bh'),
+                                    [0.02, 0.04, 0.04, 0.02]):
+            self.assertAlmostEqual(result, expected)
+        with self.assertRaises(ValueError):
+            utils.adjust_pvalues(pvalues, 'bonferroni')
+
     def test_is_significant_FIXME(self):
         # FIXME: _TScore() division by zero: error=0
         # n = 100
@@ -68,6 +163,14 @@ class TestStatistics(unittest.TestCase):
         self.assertEqual(utils.percentile(values, 0.75), 6.75)
         self.assertEqual(utils.percentile(values, 1.00), 9)
 
+        self.assertEqual(utils.percentiles(values, (0.25, 0.50, 1.00)),
+                         [2.25, 4.5, 9])
+        self.assertEqual(utils.percentiles(sorted(values), (0.75,),
+                                           is_sorted=True),
+                         [6.75])
+        with self.assertRaises(ValueError):
+            utils.percentiles(values, (0.5, 1.5))
+
     def test_geometric_mean(self):
         self.assertEqual(utils.geometric_mean([1.0]), 1.0)
         self.assertAlmostEqual(utils.geometric_mean([54, 24, 36]), 36.0)